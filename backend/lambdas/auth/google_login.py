@@ -13,16 +13,17 @@ import os
 import uuid
 import urllib.request
 import urllib.parse
+import zlib
 
-import boto3
 from boto3.dynamodb.conditions import Key
 
-from utils import ok, bad_request, server_error, create_jwt
+from utils import ok, bad_request, server_error, response, create_jwt, decode_request_body, BodyTooLarge
+from db import resource
 
 GOOGLE_CLIENT_ID = os.environ["GOOGLE_CLIENT_ID"]
 USERS_TABLE = os.environ["USERS_TABLE"]
 
-dynamodb = boto3.resource("dynamodb")
+dynamodb = resource()
 users_table = dynamodb.Table(USERS_TABLE)
 
 GOOGLE_TOKEN_INFO_URL = "https://oauth2.googleapis.com/tokeninfo"
@@ -50,6 +51,12 @@ def handler(event, context):
     if event.get("httpMethod") == "OPTIONS":
         return ok({})
 
+    try:
+        decode_request_body(event)
+    except BodyTooLarge as e:
+        return response(413, {"error": str(e)})
+    except (OSError, EOFError, ValueError, zlib.error):
+        return bad_request("Request body could not be decoded")
     try:
         body = json.loads(event.get("body") or "{}")
     except json.JSONDecodeError:
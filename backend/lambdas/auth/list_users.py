@@ -3,11 +3,11 @@ GET /auth/users
 Admin only. Returns all users in the system.
 """
 import os
-import boto3
 from utils import ok, require_admin
+from db import resource
 
 USERS_TABLE = os.environ["USERS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+dynamodb = resource()
 users_table = dynamodb.Table(USERS_TABLE)
 
 
@@ -3,11 +3,11 @@ GET /auth/me
 Returns the current user's profile from DynamoDB.
 """
 import os
-import boto3
 from utils import ok, not_found, require_auth
+from db import resource
 
 USERS_TABLE = os.environ["USERS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+dynamodb = resource()
 users_table = dynamodb.Table(USERS_TABLE)
 
 
@@ -5,12 +5,15 @@ Body: { "role": "admin|readonly", "status": "active|rejected" }
 """
 import json
 import os
-import boto3
 from utils import ok, bad_request, not_found, require_admin
+from db import resource
+from versions import USERS_COUNTER, bump_counter
 
 USERS_TABLE = os.environ["USERS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 users_table = dynamodb.Table(USERS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
 
 VALID_ROLES = {"admin", "readonly"}
 VALID_STATUSES = {"active", "rejected"}
@@ -68,5 +71,7 @@ def handler(event, context, user=None):
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
     )
+    # Containers re-read user status once they see this (see auth_cache.py)
+    bump_counter(counters_table, USERS_COUNTER)
 
     return ok({"message": "User updated successfully", "user_id": target_user_id})
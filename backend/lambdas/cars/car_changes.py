@@ -0,0 +1,84 @@
+"""
+GET /cars/{car_id}/changes
+What changed on a car since a cursor, for clients that keep a local copy
+of its parts, history and miles log (see shared/changes.py).
+Query params:
+  - since: cursor from the previous response. Without it the response
+           only carries the current cursor: fetch the collections in full,
+           then sync from that cursor.
+  - limit: changes per page (default 500, max 2000); a version's changes
+           are never split, so a page may hold more
+
+Response:
+{
+  "cursor": 42,            // pass as since next time
+  "has_more": false,       // true: call again straight away
+  "reset": false,          // true: since is older than the retained log;
+                           //       refetch everything, then sync from cursor
+  "changes": [
+    {"seq": 41, "entity": "part", "op": "upsert", "id": "...", "item": {...}},
+    {"seq": 41, "entity": "history", "op": "upsert", "id": "...", "item": {...}},
+    {"seq": 42, "entity": "part", "op": "delete", "id": "..."},
+    {"seq": 42, "entity": "part", "op": "add_miles", "id": "<log_id>",
+     "miles": "12.5", "except": []}     // add to every active part not in except
+  ]
+}
+Apply changes in order. An entity changed several times appears once, at
+its last change.
+"""
+import os
+from utils import ok, bad_request, not_found, require_auth
+from versions import car_version_from_item
+from db import resource
+from changes import read, collapse
+
+CARS_TABLE = os.environ["CARS_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+dynamodb = resource()
+cars_table = dynamodb.Table(CARS_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+CHANGE_ATTRS = ("seq", "entity", "op", "id", "item", "miles", "except")
+
+
+@require_auth
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    qp = event.get("queryStringParameters") or {}
+    try:
+        since = int(qp["since"]) if qp.get("since") not in (None, "") else None
+        limit = int(qp.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        return bad_request("since and limit must be integers")
+    if since is not None and since < 0:
+        return bad_request("since must not be negative")
+    if not 1 <= limit <= MAX_LIMIT:
+        return bad_request(f"limit must be between 1 and {MAX_LIMIT}")
+
+    car = cars_table.get_item(
+        Key={"car_id": car_id},
+        ProjectionExpression="car_id, data_version, changes_floor",
+    ).get("Item")
+    version = car_version_from_item(car)
+    if version is None:
+        return not_found("Car not found")
+
+    if since is None or since < int(car.get("changes_floor", 0)) or since > version:
+        return ok({"cursor": version, "has_more": False, "reset": since is not None, "changes": []})
+    if since == version:
+        return ok({"cursor": since, "has_more": False, "reset": False, "changes": []})
+
+    rows, cursor, has_more = read(changes_table, car_id, since, limit)
+    changes = [
+        {**{k: row[k] for k in CHANGE_ATTRS if k in row}, "seq": int(row["seq"])}
+        for row in collapse(rows)
+    ]
+    return ok({"cursor": cursor, "has_more": has_more, "reset": False, "changes": changes})
@@ -0,0 +1,78 @@
+"""
+POST /cars/{car_id}/clone
+Write access required.
+Create every active part of another car on this one, with zero miles -
+e.g. a new season's car (created with POST /cars) from last season's. History, miles and alerts are not copied (see shared/bom.py).
+
+Body:
+{
+  "source_car_id": "<car to copy>",
+  "part_ids": ["..."]   // optional: only these source parts (to finish a run that returned pending)
+}
+
+Writes are paced by a WriteScheduler; source parts not copied before the
+time budget ran out are returned as "pending" ("complete": false,
+Idempotency-Incomplete: true). Send them back as part_ids to copy the
+rest. A source part is copied to a car at most once (its copy's id is
+derived from both), so repeating a clone only adds what is missing.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from utils import ok, bad_request, not_found, require_write
+from db import resource
+from scheduler import WriteScheduler
+import bom
+import idempotency
+
+PARTS_TABLE = os.environ["PARTS_TABLE"]
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
+parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+
+@require_write
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return bad_request("Invalid JSON body")
+
+    source_car_id = body.get("source_car_id")
+    if not source_car_id:
+        return bad_request("source_car_id is required")
+    if source_car_id == car_id:
+        return bad_request("source_car_id must be another car")
+    only = body.get("part_ids")
+    if only is not None and not isinstance(only, list):
+        return bad_request("part_ids must be a list")
+
+    source = cars_table.get_item(Key={"car_id": source_car_id}).get("Item")
+    if not source:
+        return not_found("Source car not found")
+    if not cars_table.get_item(Key={"car_id": car_id}).get("Item"):
+        return not_found("Car not found")
+
+    parts, pending = bom.create_parts(
+        dynamodb, WriteScheduler(context), car_id,
+        bom.car_parts(parts_table, source_car_id, set(only) if only is not None else None),
+        user["email"], datetime.now(timezone.utc).isoformat(),
+    )
+    message = f"Copied {len(parts)} parts from {source.get('name', source_car_id)}"
+    if pending:
+        message += f" ({len(pending)} not copied before the time budget ran out)"
+    return ok({
+        "message": message,
+        "created_count": len(parts),
+        "pending_count": len(pending),
+        "pending": [p["part_id"] for p in pending],
+        "complete": not pending,
+    }, {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
@@ -7,12 +7,15 @@ import json
 import os
 import uuid
 from datetime import datetime, timezone
-import boto3
 from utils import ok, created, bad_request, require_admin
+from versions import bump_counter, CARS_COUNTER
+from db import resource
 
 CARS_TABLE = os.environ["CARS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 cars_table = dynamodb.Table(CARS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
 
 
 @require_admin
@@ -38,4 +41,5 @@ def handler(event, context, user=None):
         "created_by": user["email"],
     }
     cars_table.put_item(Item=car)
+    bump_counter(counters_table, CARS_COUNTER)
     return created({"car": car})
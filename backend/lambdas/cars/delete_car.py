@@ -3,12 +3,15 @@ DELETE /cars/{car_id}
 Admin only. Delete a car.
 """
 import os
-import boto3
 from utils import ok, bad_request, not_found, require_admin
+from versions import bump_counter, CARS_COUNTER
+from db import resource
 
 CARS_TABLE = os.environ["CARS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 cars_table = dynamodb.Table(CARS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
 
 
 @require_admin
@@ -25,4 +28,5 @@ def handler(event, context, user=None):
         return not_found("Car not found")
 
     cars_table.delete_item(Key={"car_id": car_id})
+    bump_counter(counters_table, CARS_COUNTER)
     return ok({"message": "Car deleted", "car_id": car_id})
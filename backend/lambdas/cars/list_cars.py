@@ -4,7 +4,6 @@ Returns all cars in the system.
 """
 import os
 import sys
-import boto3
 
 sys.path.insert(0, "/opt/python")
 sys.path.insert(0, "/var/task")
@@ -18,11 +17,17 @@ import importlib, importlib.util, pathlib
 #_spec.loader.exec_module(_utils)
 #ok = _utils.ok
 #require_auth = _utils.require_auth
-from utils import ok, require_auth
+from utils import ok, require_auth, make_etag, etag_matches, not_modified, cache_headers
+from versions import get_counter, CARS_COUNTER
+from db import resource
 
 CARS_TABLE = os.environ["CARS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 cars_table = dynamodb.Table(CARS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -30,6 +35,14 @@ def handler(event, context, user=None):
     if event.get("httpMethod") == "OPTIONS":
         return ok({})
 
+    etag = make_etag(get_counter(counters_table, CARS_COUNTER), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     resp = cars_table.scan()
     cars = resp.get("Items", [])
-    return ok({"cars": cars})
+    # data_version moves with every parts/miles edit; it is not part of the cars list
+    for car in cars:
+        car.pop("data_version", None)
+        car.pop("data_version_at", None)
+    return ok({"cars": cars}, headers=cache_headers(etag, CACHE_CONTROL))
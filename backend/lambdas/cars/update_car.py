@@ -4,12 +4,15 @@ Admin only. Update car name/description/year.
 """
 import json
 import os
-import boto3
 from utils import ok, bad_request, not_found, require_admin
+from versions import bump_counter, CARS_COUNTER
+from db import resource
 
 CARS_TABLE = os.environ["CARS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 cars_table = dynamodb.Table(CARS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
 
 
 @require_admin
@@ -51,4 +54,5 @@ def handler(event, context, user=None):
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
     )
+    bump_counter(counters_table, CARS_COUNTER)
     return ok({"message": "Car updated", "car_id": car_id})
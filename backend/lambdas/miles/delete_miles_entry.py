@@ -0,0 +1,47 @@
+"""
+DELETE /cars/{car_id}/miles/{log_id}
+Admin only. Remove a logged session and take its miles back off the parts
+that were on the car when it was logged (see shared/miles_log.py).
+
+Returns 409 if the entry was corrected by someone else meanwhile, or if
+it has an unfinished correction (or is still being logged). Parts and
+history rows not reached before the time budget ran out are returned as
+"parts_pending" / "history_pending" ("complete": false,
+Idempotency-Incomplete: true); the session is hidden, and its entry kept
+until they are updated - DELETE it again to finish.
+"""
+from utils import ok, bad_request, not_found, response, require_admin
+from db import resource
+from scheduler import WriteScheduler
+import idempotency
+import miles_log
+
+dynamodb = resource()
+
+
+@require_admin
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    path = event.get("pathParameters") or {}
+    car_id = path.get("car_id")
+    log_id = path.get("log_id")
+    if not car_id or not log_id:
+        return bad_request("car_id and log_id path parameters are required")
+
+    try:
+        result = miles_log.correct_session(dynamodb, WriteScheduler(context), car_id, log_id, None, user["email"])
+    except miles_log.SessionChanged:
+        return response(409, {"error": "The entry was changed meanwhile; reload it and try again"})
+    except miles_log.SessionPending:
+        return response(409, {"error": "The entry has an unfinished change; finish it (send its part_ids) first"})
+    if result is None:
+        return not_found("Miles log entry not found")
+
+    pending = result["parts_pending"] + result["history_pending"]
+    message = f"Removed the session ({result['delta']:+} miles on {result['parts_updated']} parts)"
+    if pending:
+        message += f" ({len(pending)} not updated before the time budget ran out)"
+    return ok({"message": message, **result, "complete": not pending},
+              {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
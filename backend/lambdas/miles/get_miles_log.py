@@ -5,15 +5,25 @@ Query params:
   - limit: max records (default 50)
   - from_date: ISO date string (inclusive)
   - to_date: ISO date string (inclusive)
+  - fields: comma-separated attributes to return (log_id is always included)
 """
 import os
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
-from utils import ok, bad_request, require_auth
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource, parse_fields, projection, trim
+import miles_log
 
 MILES_LOG_TABLE = os.environ["MILES_LOG_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
 miles_table = dynamodb.Table(MILES_LOG_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -25,16 +35,26 @@ def handler(event, context, user=None):
     if not car_id:
         return bad_request("car_id path parameter is required")
 
+    etag = make_etag(get_car_version(cars_table, car_id), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     qp = event.get("queryStringParameters") or {}
     limit = int(qp.get("limit", 50))
     from_date = qp.get("from_date")
     to_date = qp.get("to_date")
+    try:
+        fields = parse_fields(qp.get("fields"))
+    except ValueError as e:
+        return bad_request(str(e))
 
     query_kwargs = {
         "IndexName": "car-miles-index",
         "KeyConditionExpression": Key("car_id").eq(car_id),
         "ScanIndexForward": False,
         "Limit": limit,
+        # miles is always read for total_miles_shown, the rest for incomplete and removed
+        **projection(fields, needed=("log_id", "miles", "pending_miles", "removed")),
     }
 
     if from_date and to_date:
@@ -47,9 +67,11 @@ def handler(event, context, user=None):
         )
 
     resp = miles_table.query(**query_kwargs)
-    items = resp.get("Items", [])
+    # An unfinished session shows as incomplete, not its progress attributes,
+    # and a removed one not at all while its miles are being taken back
+    items = [miles_log.public(item) for item in resp.get("Items", []) if not item.get("removed")]
 
-    # Convert miles string back to float for the response
+    # miles is a number, or a string on entries older than backfill migration 1
     for item in items:
         try:
             item["miles"] = float(item["miles"])
@@ -59,7 +81,7 @@ def handler(event, context, user=None):
     total_miles = sum(item.get("miles", 0) for item in items if isinstance(item.get("miles"), float))
 
     return ok({
-        "log": items,
+        "log": trim(items, fields, keep=("log_id",)),
         "count": len(items),
         "total_miles_shown": round(total_miles, 2),
-    })
+    }, headers=cache_headers(etag, CACHE_CONTROL))
@@ -3,26 +3,42 @@ POST /cars/{car_id}/miles
 Write access required.
 Log a test session's miles. Increments miles_used on ALL active parts for the car.
 
+The per-part updates are paced and retried by a WriteScheduler. If the
+invocation runs out of time first, the response lists the parts that were
+not updated ("complete": false, "parts_pending") rather than failing.
+Send {"log_id", "part_ids": <parts_pending>} to finish the session; parts
+that already have its miles are skipped, so sending it twice is harmless.
+With an Idempotency-Key, the session's log_id is derived from the key and
+an unfinished response is not stored (Idempotency-Incomplete: true), so
+retrying the request with the key finishes the session too.
+
+Parts whose risk score (as in the likely-to-fail report) crossed a level
+because of this session get an alert (see shared/risk_alerts.py); the new
+ones are returned as "alerts" and listed by GET /cars/{car_id}/alerts.
+
 Body:
 {
   "miles": 12.5,
   "note": "Morning test session on track",
   "test_date": "2024-03-15"   // optional, defaults to today UTC
 }
+or, to finish a session that returned "complete": false:
+{
+  "log_id": "<log.log_id>",
+  "part_ids": ["..."]         // optional: its parts_pending
+}
 """
 import json
-import os
 import uuid
 from datetime import datetime, timezone
-import boto3
-from boto3.dynamodb.conditions import Key
-from utils import ok, bad_request, require_write
+from decimal import Decimal
+from utils import ok, bad_request, not_found, get_header, require_write
+from db import resource
+from scheduler import WriteScheduler
+import idempotency
+import miles_log
 
-MILES_LOG_TABLE = os.environ["MILES_LOG_TABLE"]
-PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
-miles_table = dynamodb.Table(MILES_LOG_TABLE)
-parts_table = dynamodb.Table(PARTS_TABLE)
+dynamodb = resource()
 
 
 @require_write
@@ -39,6 +55,16 @@ def handler(event, context, user=None):
     except json.JSONDecodeError:
         return bad_request("Invalid JSON body")
 
+    log_id = body.get("log_id")
+    if log_id is not None:
+        part_ids = body.get("part_ids")
+        if part_ids is not None and not isinstance(part_ids, list):
+            return bad_request("part_ids must be a list")
+        result = miles_log.resume_session(dynamodb, WriteScheduler(context), car_id, str(log_id), part_ids)
+        if result is None:
+            return not_found("Miles log entry not found")
+        return _result(f"Added {result['delta']} miles to {result['parts_updated']} more parts", result)
+
     miles = body.get("miles")
     if miles is None:
         return bad_request("miles is required")
@@ -51,45 +77,26 @@ def handler(event, context, user=None):
 
     note = body.get("note", "")
     test_date = body.get("test_date", datetime.now(timezone.utc).date().isoformat())
-    now = datetime.now(timezone.utc).isoformat()
-
-    # 1. Write the miles log entry
-    log_entry = {
-        "log_id": str(uuid.uuid4()),
-        "car_id": car_id,
-        "miles": str(miles),  # DynamoDB Decimal-safe as string; convert on read
-        "note": note,
-        "test_date": test_date,
-        "logged_at": now,
-        "logged_by": user["email"],
-    }
-    miles_table.put_item(Item=log_entry)
 
-    # 2. Fetch all active parts for this car
-    resp = parts_table.query(
-        IndexName="car-index",
-        KeyConditionExpression=Key("car_id").eq(car_id),
+    # A retry with the same Idempotency-Key logs under the same log_id, which finishes the session
+    key = get_header(event, "Idempotency-Key")
+    log_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"miles:{car_id}:{user['user_id']}:{key}")) if key else str(uuid.uuid4())
+    result = miles_log.log_session(
+        dynamodb, WriteScheduler(context), car_id, Decimal(str(miles)), log_id,
+        note, test_date, user["email"],
     )
-    active_parts = [p for p in resp.get("Items", []) if p.get("active", True)]
-
-    # 3. Increment miles_used on each active part
-    from decimal import Decimal
-    miles_decimal = Decimal(str(miles))
+    if result is None:
+        return bad_request("Idempotency-Key was already used for another car's session")
+    verb = "Finished logging" if result["resumed"] else "Logged"
+    return _result(f"{verb} {result['log']['miles']} miles for {result['parts_updated']} active parts", result)
 
-    for part in active_parts:
-        current_miles = Decimal(str(part.get("miles_used", 0)))
-        new_miles = current_miles + miles_decimal
-        parts_table.update_item(
-            Key={"part_id": part["part_id"]},
-            UpdateExpression="SET miles_used = :m, updated_at = :t",
-            ExpressionAttributeValues={
-                ":m": new_miles,
-                ":t": now,
-            },
-        )
 
+def _result(message: str, result: dict) -> dict:
+    pending = result["parts_pending"] + result.get("history_pending", [])
+    if pending:
+        message += f" ({len(pending)} not updated before the time budget ran out)"
     return ok({
-        "message": f"Logged {miles} miles for {len(active_parts)} active parts",
-        "log": log_entry,
-        "parts_updated": len(active_parts),
-    })
+        "message": message,
+        **result,
+        "complete": not pending,
+    }, {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
@@ -0,0 +1,99 @@
+"""
+PUT /cars/{car_id}/miles/{log_id}
+Write access required.
+Correct a logged session's miles (e.g. 125 typed instead of 12.5).
+
+The difference is added to miles_used of the parts that were on the car
+when the session was logged - not to parts installed since - and to the
+retirement miles of those retired since (see shared/miles_log.py). The
+entry keeps a "corrections" list of {at, by, from, to}.
+
+Body:
+{
+  "miles": 12.5,
+  "note": "Typo: was 125"   // optional, replaces the entry's note
+}
+or, to finish a correction that returned "complete": false:
+{
+  "part_ids": ["..."]       // its parts_pending
+}
+
+Returns 409 if the entry was corrected by someone else meanwhile, or if
+it has an unfinished correction (or is still being logged): finish that
+first, by sending its part_ids or the same miles again. Writes are paced
+by a WriteScheduler; parts (and history rows) not reached before the
+time budget ran out are returned as "parts_pending" / "history_pending"
+("complete": false, Idempotency-Incomplete: true). The entry stays
+incomplete until they are applied.
+"""
+import json
+from decimal import Decimal
+from utils import ok, bad_request, not_found, response, require_write
+from db import resource
+from scheduler import WriteScheduler
+import idempotency
+import miles_log
+
+dynamodb = resource()
+
+
+@require_write
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    path = event.get("pathParameters") or {}
+    car_id = path.get("car_id")
+    log_id = path.get("log_id")
+    if not car_id or not log_id:
+        return bad_request("car_id and log_id path parameters are required")
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return bad_request("Invalid JSON body")
+
+    miles = body.get("miles")
+    if miles is None and "part_ids" in body:
+        part_ids = body["part_ids"]
+        if not isinstance(part_ids, list):
+            return bad_request("part_ids must be a list")
+        result = miles_log.resume_session(dynamodb, WriteScheduler(context), car_id, log_id, part_ids)
+        if result is None:
+            return not_found("Miles log entry not found")
+        return _result(f"Added {result['delta']:+} miles to {result['parts_updated']} more parts", result)
+    if miles is None:
+        return bad_request("miles is required")
+    try:
+        miles = float(miles)
+    except (TypeError, ValueError):
+        return bad_request("miles must be a number")
+    if miles <= 0:
+        return bad_request("miles must be greater than 0 (DELETE the entry to remove the session)")
+    note = body.get("note")
+    if note is not None and not isinstance(note, str):
+        return bad_request("note must be a string")
+
+    try:
+        result = miles_log.correct_session(
+            dynamodb, WriteScheduler(context), car_id, log_id, Decimal(str(miles)), user["email"], note,
+        )
+    except miles_log.SessionChanged:
+        return response(409, {"error": "The entry was changed meanwhile; reload it and try again"})
+    except miles_log.SessionPending:
+        return response(409, {"error": "The entry has an unfinished change; finish it (send its part_ids) first"})
+    if result is None:
+        return not_found("Miles log entry not found")
+    return _result(f"Corrected the session to {miles} miles ({result['delta']:+} on {result['parts_updated']} parts)",
+                   result)
+
+
+def _result(message: str, result: dict) -> dict:
+    pending = result["parts_pending"] + result["history_pending"]
+    if pending:
+        message += f" ({len(pending)} not updated before the time budget ran out)"
+    return ok({
+        "message": message,
+        **result,
+        "complete": not pending,
+    }, {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
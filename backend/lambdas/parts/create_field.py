@@ -14,12 +14,15 @@ import json
 import os
 import uuid
 from datetime import datetime, timezone
-import boto3
 from utils import ok, created, bad_request, require_admin
+from versions import bump_counter, PART_FIELDS_COUNTER
+from db import resource
 
 PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
 
 VALID_TYPES = ["text", "number", "dropdown"]
 
@@ -59,4 +62,5 @@ def handler(event, context, user=None):
         "created_by": user["email"],
     }
     fields_table.put_item(Item=field)
+    bump_counter(counters_table, PART_FIELDS_COUNTER)
     return created({"field": field})
@@ -15,12 +15,27 @@ import json
 import os
 import uuid
 from datetime import datetime, timezone
-import boto3
+from decimal import Decimal
 from utils import ok, created, bad_request, require_write
+from versions import bump_car_version
+from db import resource
+import changes
+import field_index
+import search_index
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
 
 VALID_GROUPS = ["suspension", "drivetrain", "engine", "body", "electrical", "brakes", "other"]
 VALID_LOCATIONS = [
@@ -53,6 +68,11 @@ def handler(event, context, user=None):
     if body["part_location"] not in VALID_LOCATIONS:
         return bad_request(f"part_location must be one of: {', '.join(VALID_LOCATIONS)}")
 
+    try:
+        miles_used = Decimal(str(float(body.get("miles_used", 0) or 0)))
+    except (TypeError, ValueError):
+        return bad_request("miles_used must be a number")
+
     now = datetime.now(timezone.utc).isoformat()
     part = {
         "part_id": str(uuid.uuid4()),
@@ -61,7 +81,7 @@ def handler(event, context, user=None):
         "part_name": body["part_name"].strip(),
         "part_group": body["part_group"],
         "part_location": body["part_location"],
-        "miles_used": int(body.get("miles_used", 0)),
+        "miles_used": miles_used,
         "active": True,
         "created_at": now,
         "updated_at": now,
@@ -73,4 +93,8 @@ def handler(event, context, user=None):
         "extra_fields": body.get("extra_fields", {}),
     }
     parts_table.put_item(Item=part)
+    search_index.index_part(index_table, part)
+    field_index.index_part(field_index_table, part, field_index.field_types(fields_table))
+    version = bump_car_version(cars_table, car_id)
+    changes.record(changes_table, cars_table, car_id, version, [changes.upsert("part", part, "part_id")])
     return created({"part": part})
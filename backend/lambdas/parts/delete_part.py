@@ -3,12 +3,29 @@ DELETE /cars/{car_id}/parts/{part_id}
 Admin only. Hard-delete a part from the active inventory.
 """
 import os
-import boto3
 from utils import ok, bad_request, not_found, forbidden, require_admin
+from versions import bump_car_version
+from db import resource
+import changes
+import field_index
+import risk_alerts
+import search_index
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+ALERTS_TABLE = os.environ["ALERTS_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
+alerts_table = dynamodb.Table(ALERTS_TABLE)
 
 
 @require_admin
@@ -31,4 +48,9 @@ def handler(event, context, user=None):
         return forbidden("Part does not belong to this car")
 
     parts_table.delete_item(Key={"part_id": part_id})
+    search_index.remove_part(index_table, item)
+    field_index.remove_part(field_index_table, item, field_index.field_types(fields_table))
+    risk_alerts.clear(alerts_table, car_id, part_id)
+    version = bump_car_version(cars_table, car_id)
+    changes.record(changes_table, cars_table, car_id, version, [changes.delete("part", part_id)])
     return ok({"message": "Part deleted", "part_id": part_id})
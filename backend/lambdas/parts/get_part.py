@@ -3,12 +3,20 @@ GET /cars/{car_id}/parts/{part_id}
 Returns a single part.
 """
 import os
-import boto3
-from utils import ok, bad_request, not_found, forbidden, require_auth
+from utils import (
+    ok, bad_request, not_found, forbidden, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -23,6 +31,10 @@ def handler(event, context, user=None):
     if not car_id or not part_id:
         return bad_request("car_id and part_id path parameters are required")
 
+    etag = make_etag(get_car_version(cars_table, car_id), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     resp = parts_table.get_item(Key={"part_id": part_id})
     item = resp.get("Item")
     if not item:
@@ -30,4 +42,4 @@ def handler(event, context, user=None):
     if item.get("car_id") != car_id:
         return forbidden("Part does not belong to this car")
 
-    return ok({"part": item})
+    return ok({"part": item}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -3,12 +3,17 @@ GET /part-fields
 Returns all custom field definitions (for building dynamic form dropdowns).
 """
 import os
-import boto3
-from utils import ok, require_auth
+from utils import ok, require_auth, make_etag, etag_matches, not_modified, cache_headers
+from versions import get_counter, PART_FIELDS_COUNTER
+from db import resource
 
 PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
 fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -16,7 +21,11 @@ def handler(event, context, user=None):
     if event.get("httpMethod") == "OPTIONS":
         return ok({})
 
+    etag = make_etag(get_counter(counters_table, PART_FIELDS_COUNTER), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     resp = fields_table.scan()
     items = resp.get("Items", [])
     items.sort(key=lambda f: f.get("field_name", "").lower())
-    return ok({"fields": items})
+    return ok({"fields": items}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -4,15 +4,36 @@ Returns all active parts for a car.
 Query params:
   - group: filter by part_group
   - location: filter by part_location
+  - extra.<field>: filter on a custom field value, e.g.
+            extra.wrench_size=10mm, extra.torque_nm>=20, extra.torque_nm<40
+            (=, >=, >, <=, <; number fields compare numerically).
+            Answered from the field value index (shared/field_index.py),
+            so only the matching parts are read.
+  - fields: comma-separated attributes to return, e.g.
+            part_name,part_number,miles_used,extra_fields.wrench_size
+            (part_id is always included)
 """
 import os
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
-from utils import ok, bad_request, require_auth
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource, query_all, batch_get, parse_fields, projection, trim
+from field_index import field_types, parse_filters, check_filters, lookup, matches
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -24,15 +45,45 @@ def handler(event, context, user=None):
     if not car_id:
         return bad_request("car_id path parameter is required")
 
+    etag = make_etag(get_car_version(cars_table, car_id), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     qp = event.get("queryStringParameters") or {}
     group_filter = qp.get("group")
     location_filter = qp.get("location")
+    try:
+        fields = parse_fields(qp.get("fields"))
+        extra_filters = parse_filters(qp)
+        types = field_types(fields_table) if extra_filters else {}
+        check_filters(extra_filters, types)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    # Attributes the filters and sort below read, fetched even if not requested
+    needed = ["part_id", "active", "part_name"]
+    if group_filter:
+        needed.append("part_group")
+    if location_filter:
+        needed.append("part_location")
 
-    resp = parts_table.query(
-        IndexName="car-index",
-        KeyConditionExpression=Key("car_id").eq(car_id),
-    )
-    items = resp.get("Items", [])
+    if extra_filters:
+        names = {name for name, _, _ in extra_filters}
+        # Dotted keys cannot be addressed as a projection path; fetch the whole map then
+        needed += ["car_id"] + (
+            ["extra_fields"] if any("." in n for n in names) else [f"extra_fields.{n}" for n in names]
+        )
+        part_ids = sorted(lookup(field_index_table, car_id, extra_filters, types))
+        items = batch_get(dynamodb, PARTS_TABLE, [{"part_id": pid} for pid in part_ids],
+                          **projection(fields, needed))
+        items = [p for p in items if p.get("car_id") == car_id and matches(p, extra_filters, types)]
+    else:
+        items = query_all(
+            parts_table,
+            IndexName="car-index",
+            KeyConditionExpression=Key("car_id").eq(car_id),
+            **projection(fields, needed),
+        )
 
     # Filter out retired parts (active=False)
     items = [p for p in items if p.get("active", True)]
@@ -44,5 +95,6 @@ def handler(event, context, user=None):
 
     # Sort by part_name
     items.sort(key=lambda p: p.get("part_name", "").lower())
+    items = trim(items, fields, keep=("part_id",))
 
-    return ok({"parts": items, "count": len(items)})
+    return ok({"parts": items, "count": len(items)}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -5,15 +5,24 @@ Query params:
   - part_number: filter by part number
   - reason: filter by reason
   - limit: max records (default 100)
+  - fields: comma-separated attributes to return (history_id is always included)
 """
 import os
-import boto3
 from boto3.dynamodb.conditions import Key
-from utils import ok, bad_request, require_auth
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource, parse_fields, projection, trim
 
 PART_HISTORY_TABLE = os.environ["PART_HISTORY_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
 history_table = dynamodb.Table(PART_HISTORY_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -25,16 +34,25 @@ def handler(event, context, user=None):
     if not car_id:
         return bad_request("car_id path parameter is required")
 
+    etag = make_etag(get_car_version(cars_table, car_id), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     qp = event.get("queryStringParameters") or {}
     part_number_filter = qp.get("part_number")
     reason_filter = qp.get("reason")
     limit = int(qp.get("limit", 100))
+    try:
+        fields = parse_fields(qp.get("fields"))
+    except ValueError as e:
+        return bad_request(str(e))
 
     resp = history_table.query(
         IndexName="car-history-index",
         KeyConditionExpression=Key("car_id").eq(car_id),
         ScanIndexForward=False,  # newest first
         Limit=limit,
+        **projection(fields, needed=("history_id", "part_number", "reason")),
     )
     items = resp.get("Items", [])
 
@@ -42,5 +60,6 @@ def handler(event, context, user=None):
         items = [h for h in items if h.get("part_number") == part_number_filter]
     if reason_filter:
         items = [h for h in items if h.get("reason") == reason_filter]
+    items = trim(items, fields, keep=("history_id",))
 
-    return ok({"history": items, "count": len(items)})
+    return ok({"history": items, "count": len(items)}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -18,14 +18,34 @@ import json
 import os
 import uuid
 from datetime import datetime, timezone
-import boto3
+from botocore.exceptions import ClientError
 from utils import ok, bad_request, not_found, forbidden, require_write
+from versions import bump_car_version
+from db import resource
+import changes
+import field_index
+import risk_alerts
+import search_index
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
 PART_HISTORY_TABLE = os.environ["PART_HISTORY_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+FAILURE_STATS_TABLE = os.environ["FAILURE_STATS_TABLE"]
+ALERTS_TABLE = os.environ["ALERTS_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
 history_table = dynamodb.Table(PART_HISTORY_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
+stats_table = dynamodb.Table(FAILURE_STATS_TABLE)
+alerts_table = dynamodb.Table(ALERTS_TABLE)
 
 VALID_REASONS = ["failure", "upgrade", "routine_maintenance", "other"]
 
@@ -68,17 +88,29 @@ def handler(event, context, user=None):
 
     now = datetime.now(timezone.utc).isoformat()
 
-    # 1. Mark old part as inactive
-    parts_table.update_item(
-        Key={"part_id": part_id},
-        UpdateExpression="SET #active = :false, #updated_at = :now, #retired_at = :now",
-        ExpressionAttributeNames={
-            "#active": "active",
-            "#updated_at": "updated_at",
-            "#retired_at": "retired_at",
-        },
-        ExpressionAttributeValues={":false": False, ":now": now},
-    )
+    # 1. Mark old part as inactive. Conditional on it still being active, so
+    #    the miles it is retired with (ALL_NEW) include every session that
+    #    reached it, and no session adds miles afterwards.
+    try:
+        retired = parts_table.update_item(
+            Key={"part_id": part_id},
+            UpdateExpression="SET #active = :false, #updated_at = :now, #retired_at = :now",
+            ConditionExpression="attribute_exists(part_id) AND #active = :true",
+            ExpressionAttributeNames={
+                "#active": "active",
+                "#updated_at": "updated_at",
+                "#retired_at": "retired_at",
+            },
+            ExpressionAttributeValues={":false": False, ":true": True, ":now": now},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return bad_request("Part is already retired")
+        raise
+    search_index.index_part(index_table, retired, previous=old_part)
+    types = field_index.field_types(fields_table)
+    field_index.remove_part(field_index_table, old_part, types)
 
     # 2. Write history record
     history_record = {
@@ -89,7 +121,7 @@ def handler(event, context, user=None):
         "part_name": old_part.get("part_name", ""),
         "part_group": old_part.get("part_group", ""),
         "part_location": old_part.get("part_location", ""),
-        "miles_at_retirement": old_part.get("miles_used", 0),
+        "miles_at_retirement": retired.get("miles_used", 0),
         "reason": reason,
         "note": note,
         "replaced_by": user["email"],
@@ -97,6 +129,10 @@ def handler(event, context, user=None):
         "extra_fields": old_part.get("extra_fields", {}),
     }
     history_table.put_item(Item=history_record)
+    risk_alerts.clear(alerts_table, car_id, part_id)
+    if reason == "failure":
+        risk_alerts.record_failure(stats_table, car_id, history_record["part_number"],
+                                   history_record["miles_at_retirement"])
 
     new_part = None
     if replace_with_same:
@@ -119,6 +155,15 @@ def handler(event, context, user=None):
             "replaced_from_history_id": history_record["history_id"],
         }
         parts_table.put_item(Item=new_part)
+        search_index.index_part(index_table, new_part)
+        field_index.index_part(field_index_table, new_part, types)
+
+    version = bump_car_version(cars_table, car_id)
+    changes.record(changes_table, cars_table, car_id, version, [
+        changes.upsert("part", retired, "part_id"),
+        changes.upsert("history", history_record, "history_id"),
+        *([changes.upsert("part", new_part, "part_id")] if new_part else []),
+    ])
 
     result = {
         "message": "Part replaced successfully",
@@ -8,12 +8,32 @@ Body can include any combination of:
 import json
 import os
 from datetime import datetime, timezone
-import boto3
+from decimal import Decimal
 from utils import ok, bad_request, not_found, forbidden, require_write
+from versions import bump_car_version
+from db import resource
+import changes
+import field_index
+import risk_alerts
+import search_index
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+FAILURE_STATS_TABLE = os.environ["FAILURE_STATS_TABLE"]
+ALERTS_TABLE = os.environ["ALERTS_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
+stats_table = dynamodb.Table(FAILURE_STATS_TABLE)
+alerts_table = dynamodb.Table(ALERTS_TABLE)
 
 VALID_GROUPS = ["suspension", "drivetrain", "engine", "body", "electrical", "brakes", "other"]
 VALID_LOCATIONS = [
@@ -69,7 +89,10 @@ def handler(event, context, user=None):
             expr_names[key] = field
             value = body[field]
             if field == "miles_used":
-                value = int(value)
+                try:
+                    value = Decimal(str(float(value)))
+                except (TypeError, ValueError):
+                    return bad_request("miles_used must be a number")
             expr_values[val] = value
 
     # Merge extra_fields
@@ -87,10 +110,17 @@ def handler(event, context, user=None):
     expr_names["#updated_at"] = "updated_at"
     expr_values[":updated_at"] = datetime.now(timezone.utc).isoformat()
 
-    parts_table.update_item(
+    updated = parts_table.update_item(
         Key={"part_id": part_id},
         UpdateExpression="SET " + ", ".join(updates),
         ExpressionAttributeNames=expr_names,
         ExpressionAttributeValues=expr_values,
-    )
+        ReturnValues="ALL_NEW",
+    )["Attributes"]
+    search_index.index_part(index_table, updated, previous=item)
+    field_index.index_part(field_index_table, updated, field_index.field_types(fields_table), previous=item)
+    if "miles_used" in body and updated.get("active", True):
+        risk_alerts.refresh_part(alerts_table, stats_table, car_id, updated, expr_values[":updated_at"])
+    version = bump_car_version(cars_table, car_id)
+    changes.record(changes_table, cars_table, car_id, version, [changes.upsert("part", updated, "part_id")])
     return ok({"message": "Part updated", "part_id": part_id})
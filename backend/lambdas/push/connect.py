@@ -0,0 +1,29 @@
+"""
+WebSocket $connect on the push API (see shared/push.py).
+Query params:
+  - token: the JWT (browsers cannot set headers on a WebSocket)
+  - car_id: car whose change events this connection receives
+Any signed-in user may connect; readonly users receive events too.
+"""
+import os
+from utils import ok, bad_request, not_found, require_auth
+from db import resource
+import push
+
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
+cars_table = dynamodb.Table(CARS_TABLE)
+
+
+@require_auth
+def handler(event, context, user=None):
+    car_id = (event.get("queryStringParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id query parameter is required")
+
+    resp = cars_table.get_item(Key={"car_id": car_id}, ProjectionExpression="car_id")
+    if not resp.get("Item"):
+        return not_found("Car not found")
+
+    push.register(event["requestContext"]["connectionId"], car_id, user["email"])
+    return ok({})
@@ -0,0 +1,12 @@
+"""
+WebSocket $disconnect on the push API (see shared/push.py).
+Forgets the connection. API Gateway does not always deliver $disconnect;
+rows it misses expire through the connections table's TTL, and publishing
+removes connections that are already gone.
+"""
+import push
+
+
+def handler(event, context):
+    push.unregister(event["requestContext"]["connectionId"])
+    return {"statusCode": 200}
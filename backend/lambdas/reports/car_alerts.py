@@ -0,0 +1,59 @@
+"""
+GET /cars/{car_id}/alerts
+Active parts whose risk score (miles_used / avg miles at failure of the
+part_number, as in the likely-to-fail report) crossed a risk level when
+miles were logged. Raised incrementally by log_miles (see
+shared/risk_alerts.py), so this reads only the alerts, not the car's parts
+and history.
+Query params:
+  - level: lowest level to return, MEDIUM (default), HIGH or CRITICAL
+
+Each alert carries the level it reached, the risk_score and miles at that
+moment, the log_id of the session that raised it and raised_at.
+"""
+import os
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource
+from risk_alerts import SEVERITY, list_alerts
+
+CARS_TABLE = os.environ["CARS_TABLE"]
+ALERTS_TABLE = os.environ["ALERTS_TABLE"]
+dynamodb = resource()
+cars_table = dynamodb.Table(CARS_TABLE)
+alerts_table = dynamodb.Table(ALERTS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
+LEVELS = ("MEDIUM", "HIGH", "CRITICAL")
+
+
+@require_auth
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    level = ((event.get("queryStringParameters") or {}).get("level") or "MEDIUM").upper()
+    if level not in LEVELS:
+        return bad_request(f"level must be one of: {', '.join(LEVELS)}")
+
+    etag = make_etag(get_car_version(cars_table, car_id), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
+    alerts = list_alerts(alerts_table, car_id, level)
+    counts = {name: 0 for name in LEVELS}
+    for alert in alerts:
+        counts[alert["level"]] += 1
+    return ok({
+        "car_id": car_id,
+        "alerts": alerts,
+        "count": len(alerts),
+        "by_level": {name: counts[name] for name in LEVELS if SEVERITY[name] >= SEVERITY[level]},
+    }, headers=cache_headers(etag, CACHE_CONTROL))
@@ -0,0 +1,71 @@
+"""
+GET /cars/{car_id}/reports
+Several reports computed from a single fetch of the car's parts and history.
+Query params:
+  - include: comma-separated report names (default: all)
+             high_miles, mbf, likely_to_fail
+  - limit: number of parts in high_miles (default 20)
+  - group: filter high_miles by part_group
+  - fields: part attributes high_miles returns (part_id is always included)
+
+Response:
+{
+  "car_id": "...",
+  "reports": {
+    "high_miles": { ...same body as /reports/high-miles... },
+    "mbf": { ...same body as /reports/mbf... },
+    "likely_to_fail": { ...same body as /reports/likely-to-fail... }
+  }
+}
+"""
+import os
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource, parse_fields
+from report_engine import get_reports, parse_include
+
+PART_HISTORY_TABLE = os.environ["PART_HISTORY_TABLE"]
+PARTS_TABLE = os.environ["PARTS_TABLE"]
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
+history_table = dynamodb.Table(PART_HISTORY_TABLE)
+parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
+
+
+@require_auth
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    version = get_car_version(cars_table, car_id)
+    etag = make_etag(version, event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
+    qp = event.get("queryStringParameters") or {}
+    try:
+        include = parse_include(qp.get("include"))
+    except ValueError as e:
+        return bad_request(str(e))
+    limit = int(qp.get("limit", 20))
+    group_filter = qp.get("group")
+    try:
+        fields = parse_fields(qp.get("fields"))
+    except ValueError as e:
+        return bad_request(str(e))
+
+    version, reports = get_reports(dynamodb, parts_table, history_table, car_id, include,
+                                   limit=limit, group=group_filter, fields=fields, version=version)
+    # Tag the version the reports were computed at (no ETag when that is not known)
+    etag = make_etag(version, event)
+    return ok({"car_id": car_id, "reports": reports}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -4,15 +4,27 @@ Returns active parts sorted by miles_used descending.
 Query params:
   - limit: number of parts to return (default 20)
   - group: filter by part_group
+  - fields: comma-separated part attributes to return (part_id is always included)
+
+Thin wrapper over report_engine; see GET /cars/{car_id}/reports for
+fetching several reports in one request.
 """
 import os
-import boto3
-from boto3.dynamodb.conditions import Key
-from utils import ok, bad_request, require_auth
+from utils import (
+    ok, bad_request, require_auth,
+    make_etag, etag_matches, not_modified, cache_headers,
+)
+from versions import get_car_version
+from db import resource, parse_fields
+from report_engine import get_reports
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
 
 
 @require_auth
@@ -24,26 +36,20 @@ def handler(event, context, user=None):
     if not car_id:
         return bad_request("car_id path parameter is required")
 
+    version = get_car_version(cars_table, car_id)
+    etag = make_etag(version, event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
     qp = event.get("queryStringParameters") or {}
     limit = int(qp.get("limit", 20))
     group_filter = qp.get("group")
-
-    resp = parts_table.query(
-        IndexName="car-index",
-        KeyConditionExpression=Key("car_id").eq(car_id),
-    )
-    parts = [p for p in resp.get("Items", []) if p.get("active", True)]
-
-    if group_filter:
-        parts = [p for p in parts if p.get("part_group") == group_filter]
-
-    # Sort by miles_used descending
-    parts.sort(key=lambda p: float(str(p.get("miles_used", 0))), reverse=True)
-    top_parts = parts[:limit]
-
-    return ok({
-        "report": "high_miles",
-        "car_id": car_id,
-        "parts": top_parts,
-        "count": len(top_parts),
-    })
+    try:
+        fields = parse_fields(qp.get("fields"))
+    except ValueError as e:
+        return bad_request(str(e))
+
+    version, reports = get_reports(dynamodb, parts_table, None, car_id, ["high_miles"],
+                                   limit=limit, group=group_filter, fields=fields, version=version)
+    etag = make_etag(version, event)
+    return ok(reports["high_miles"], headers=cache_headers(etag, CACHE_CONTROL))
@@ -0,0 +1,80 @@
+"""
+GET /search
+Search parts across the fleet by name, part number, supplier and custom
+field values (see shared/search_index.py).
+Query params:
+  - q: search text, e.g. "m8 wheel bearing mcmaster" (required). Every
+       term must match; the last one also matches as a prefix.
+  - car_id: only parts on this car
+  - active: true / false to return only active or only retired parts
+  - limit: results per page (default 25, max 100)
+  - offset: results to skip, from next_offset of the previous page
+  - fields: comma-separated attributes to return (part_id and car_id are
+            always included)
+
+Results are ranked by how well each part matches: terms found in the part
+number or name count more than supplier and custom field matches.
+"""
+import os
+from utils import ok, bad_request, require_auth
+from db import resource, batch_get, parse_fields, projection, trim
+from search_index import parse_query, search
+import single_table
+
+PARTS_TABLE = os.environ["PARTS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+dynamodb = resource()
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+
+
+@require_auth
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    qp = event.get("queryStringParameters") or {}
+    try:
+        terms = parse_query(qp.get("q"))
+        fields = parse_fields(qp.get("fields"))
+    except ValueError as e:
+        return bad_request(str(e))
+    try:
+        limit = int(qp.get("limit", DEFAULT_LIMIT))
+        offset = int(qp.get("offset", 0))
+    except ValueError:
+        return bad_request("limit and offset must be integers")
+    if not 1 <= limit <= MAX_LIMIT:
+        return bad_request(f"limit must be between 1 and {MAX_LIMIT}")
+    if offset < 0:
+        return bad_request("offset must not be negative")
+
+    active = qp.get("active")
+    if active is not None:
+        if active.lower() not in ("true", "false"):
+            return bad_request("active must be true or false")
+        active = active.lower() == "true"
+
+    ranked = search(index_table, terms, car_id=qp.get("car_id") or None, active=active)
+    page = ranked[offset:offset + limit]
+
+    # The postings name each part's car, so its key needs no id-index lookup
+    with single_table.located({part_id: part_car for part_id, part_car, _ in page}):
+        items = batch_get(
+            dynamodb, PARTS_TABLE, [{"part_id": part_id} for part_id, _, _ in page],
+            **projection(fields, ("part_id", "car_id")),
+        )
+    by_id = {item["part_id"]: item for item in trim(items, fields, keep=("part_id", "car_id"))}
+    # A part deleted since it was indexed has no item; leave it out of the page
+    results = [{**by_id[part_id], "score": score} for part_id, _, score in page if part_id in by_id]
+
+    next_offset = offset + limit if offset + limit < len(ranked) else None
+    return ok({
+        "query": " ".join(terms),
+        "results": results,
+        "count": len(results),
+        "total": len(ranked),
+        "next_offset": next_offset,
+    })
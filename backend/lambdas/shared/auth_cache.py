@@ -0,0 +1,95 @@
+"""
+Per-container caches behind the auth decorators - canonical copy used by all Lambda functions.
+
+A warm container sees the same few bearer tokens over and over, so
+verified tokens are kept (token -> payload, least recently used out first)
+until their exp; a repeat request costs a dict lookup instead of an HMAC
+and a JSON decode.
+
+The signature alone cannot say whether a user was rejected or changed
+role after the token was issued (tokens live 7 days), so each user's
+role and status are read from the users table and cached too. Entries are
+trusted for USER_STATUS_TTL_S; after that one GetItem of the users counter
+(versions.USERS_COUNTER, bumped by update_user) tells whether any user
+changed. If none did the cache is good for another TTL, otherwise it is
+dropped and users are re-read as their requests come in. A rejection
+therefore takes effect within USER_STATUS_TTL_S, at the cost of one small
+read per container per TTL rather than one per request.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import resource
+from versions import USERS_COUNTER, get_counter
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 1024))
+USER_STATUS_TTL_S = float(os.environ.get("USER_STATUS_TTL_S", 10))
+
+_lock = threading.Lock()
+_tokens = OrderedDict()   # token -> verified payload
+_users = {}               # user_id -> {"role", "status"} item, None when there is no user
+_users_version = None
+_checked_at = float("-inf")
+
+
+def verified(token: str, verify) -> dict | None:
+    """verify(token) (the JWT check), remembered until the token's exp."""
+    now = time.time()
+    with _lock:
+        payload = _tokens.get(token)
+        if payload is not None:
+            if payload.get("exp", 0) >= int(now):
+                _tokens.move_to_end(token)
+                return payload
+            del _tokens[token]
+            return None
+    payload = verify(token)
+    if payload:
+        with _lock:
+            _tokens[token] = payload
+            if len(_tokens) > TOKEN_CACHE_SIZE:
+                _tokens.popitem(last=False)
+    return payload
+
+
+def _refresh():
+    """Drop the cached users once USER_STATUS_TTL_S has passed and the users counter moved."""
+    global _users_version, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < USER_STATUS_TTL_S:
+        return
+    version = get_counter(resource().Table(os.environ["COUNTERS_TABLE"]), USERS_COUNTER)
+    with _lock:
+        if version != _users_version:
+            _users.clear()
+            _users_version = version
+        _checked_at = now
+
+
+def current_user(user_id: str) -> dict | None:
+    """The user's stored role and status, or None when there is no such user."""
+    _refresh()
+    with _lock:
+        if user_id in _users:
+            return _users[user_id]
+    resp = resource().Table(os.environ["USERS_TABLE"]).get_item(
+        Key={"user_id": user_id},
+        ProjectionExpression="#r, #s",
+        ExpressionAttributeNames={"#r": "role", "#s": "status"},
+    )
+    item = resp.get("Item")
+    with _lock:
+        _users[user_id] = item
+    return item
+
+
+def clear():
+    """Forget everything cached (tests and tools that rewrite the users table)."""
+    global _users_version, _checked_at
+    with _lock:
+        _tokens.clear()
+        _users.clear()
+        _users_version = None
+        _checked_at = float("-inf")
@@ -0,0 +1,218 @@
+"""
+Bill-of-materials templates and bulk part copies - canonical copy used by all Lambda functions.
+
+A BOM template is a car's active parts as they would be fitted new: part
+number, name, group, location, supplier, cost and extra_fields, without
+miles or history. It is kept in two tables:
+
+    bom templates       template_id (hash); name, description, source_car_id, part_count, ...
+    bom template parts  template_id (hash), line_id (range); the part fields (PART_FIELDS)
+
+POST /templates saves a car as a template, POST /cars/{car_id}/apply-template
+creates a template's parts on a car and POST /cars/{car_id}/clone creates
+another car's active parts on it. Created parts get zero miles and ids
+derived from the target car and the source part or template line
+(part_id_for), so running a copy again - a retry, or sending back its
+pending ids - cannot create a part twice.
+
+All of them go through copy(): the source is read one Query page at a time
+and each page is written in chunks of 25 (COPY_WORKERS chunks in flight)
+while the next page is read. A new template's lines go in one
+BatchWriteItem per chunk; parts are put one by one on condition that
+their id is not taken yet, so a part created by an earlier run (and
+maybe used since) is left alone. Writes are paced and retried by the
+invocation's WriteScheduler. Source items whose copy was not written
+before the time budget ran out come back as pending.
+"""
+import contextvars
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import changes
+import field_index
+import search_index
+from scheduler import BudgetExhausted
+from versions import bump_car_version
+
+PARTS_TABLE = os.environ.get("PARTS_TABLE")
+CARS_TABLE = os.environ.get("CARS_TABLE")
+PART_FIELDS_TABLE = os.environ.get("PART_FIELDS_TABLE")
+SEARCH_INDEX_TABLE = os.environ.get("SEARCH_INDEX_TABLE")
+FIELD_INDEX_TABLE = os.environ.get("FIELD_INDEX_TABLE")
+CHANGE_LOG_TABLE = os.environ.get("CHANGE_LOG_TABLE")
+BOM_TEMPLATES_TABLE = os.environ.get("BOM_TEMPLATES_TABLE")
+BOM_TEMPLATE_PARTS_TABLE = os.environ.get("BOM_TEMPLATE_PARTS_TABLE")
+
+BATCH_SIZE = 25
+COPY_WORKERS = 8
+# Conditional puts are one item per request; more of them in flight
+CONDITIONAL_COPY_WORKERS = 32
+
+# What a template keeps of a part
+PART_FIELDS = ("part_number", "part_name", "part_group", "part_location",
+               "purchased_from", "cost", "extra_fields")
+
+
+def pages(table, **kwargs):
+    """Each page of a query's items, following LastEvaluatedKey."""
+    while True:
+        resp = table.query(**kwargs)
+        yield resp.get("Items", [])
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def car_parts(parts_table, car_id: str, only=None):
+    """Pages of a car's active parts (those in only, if given)."""
+    for page in pages(parts_table, IndexName="car-index", KeyConditionExpression=Key("car_id").eq(car_id)):
+        yield [p for p in page if p.get("active", True) and (only is None or p["part_id"] in only)]
+
+
+def template_lines(lines_table, template_id: str, only=None):
+    """Pages of a template's lines (those in only, if given)."""
+    for page in pages(lines_table, KeyConditionExpression=Key("template_id").eq(template_id)):
+        yield [line for line in page if only is None or line["line_id"] in only]
+
+
+def template_line(template_id: str, part: dict) -> dict:
+    return {
+        "template_id": template_id,
+        "line_id": str(uuid.uuid4()),
+        **{field: part[field] for field in PART_FIELDS if field in part},
+    }
+
+
+def part_id_for(car_id: str, source: dict) -> str:
+    """The id of the part created on car_id from a template line or another car's part."""
+    source_id = f"line:{source['template_id']}:{source['line_id']}" if "line_id" in source else f"part:{source['part_id']}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"bom:{car_id}:{source_id}"))
+
+
+def new_part(source: dict, car_id: str, created_by: str, now: str) -> dict:
+    """A part as create_part would make it, from a template line or another car's part."""
+    return {
+        "part_id": part_id_for(car_id, source),
+        "car_id": car_id,
+        "part_number": source["part_number"],
+        "part_name": source["part_name"],
+        "part_group": source["part_group"],
+        "part_location": source["part_location"],
+        "miles_used": Decimal(0),
+        "active": True,
+        "created_at": now,
+        "updated_at": now,
+        "created_by": created_by,
+        "purchased_from": source.get("purchased_from", ""),
+        "cost": source.get("cost", ""),
+        "extra_fields": source.get("extra_fields") or {},
+    }
+
+
+def copy(dynamodb, scheduler, table_name: str, id_attr: str, source_pages, build, written_hook=None,
+         conditional: bool = False) -> tuple:
+    """Put build(item) into table_name for every item of source_pages.
+
+    With conditional, each item is put on condition that its id_attr is not
+    taken, and items that exist already are skipped (neither written nor
+    pending). written_hook(items) runs in the worker after each chunk is
+    written (index upkeep). An error other than the time budget running out
+    stops the chunk it happened in (its unwritten items are pending) but
+    not the others, and is returned rather than raised so the caller can
+    still record what was written. Returns (written, pending, error or None):
+    the items written and the source items whose copy was not written.
+    """
+    table = dynamodb.Table(table_name)
+
+    def put(item) -> bool:
+        try:
+            scheduler.write(table, "put_item", Item=item,
+                            ConditionExpression="attribute_not_exists(#id)",
+                            ExpressionAttributeNames={"#id": id_attr})
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False  # created by an earlier run
+            raise
+
+    def write(chunk):
+        items = [build(source) for source in chunk]
+        done, left, error = [], [], None
+        if conditional:
+            for n, (source, item) in enumerate(zip(chunk, items)):
+                try:
+                    if put(item):
+                        done.append(item)
+                except BudgetExhausted:
+                    left.append(source)
+                except Exception as e:  # returned to the caller
+                    left += chunk[n:]
+                    error = e
+                    break
+        else:
+            requests = [{"PutRequest": {"Item": i}} for i in items]
+            try:
+                unwritten = scheduler.batch_write(dynamodb, table_name, requests)
+            except Exception as e:  # returned to the caller
+                unwritten, error = requests, e
+            left_ids = {request["PutRequest"]["Item"][id_attr] for request in unwritten}
+            done = [i for i in items if i[id_attr] not in left_ids]
+            left = [source for source, i in zip(chunk, items) if i[id_attr] in left_ids]
+        if done and written_hook:
+            try:
+                written_hook(done)
+            except Exception as e:  # the items are written all the same
+                error = error or e
+        return done, left, error
+
+    # Pages are read here while the workers write the chunks already queued.
+    # Each chunk runs in a copy of this context, so the request's car scope holds.
+    workers = CONDITIONAL_COPY_WORKERS if conditional else COPY_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, write, page[start:start + BATCH_SIZE])
+            for page in source_pages
+            for start in range(0, len(page), BATCH_SIZE)
+        ]
+        written, pending, error = [], [], None
+        for future in futures:
+            done, left, chunk_error = future.result()
+            written += done
+            pending += left
+            error = error or chunk_error
+    return written, pending, error
+
+
+def create_parts(dynamodb, scheduler, car_id: str, source_pages, created_by: str, now: str) -> tuple:
+    """Create a part on car_id for every source part / template line that has none yet.
+
+    Indexes the parts and records them in the car's change log as one
+    version - also when copying failed part way, before the error is
+    raised. Returns (parts created, source items pending).
+    """
+    index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+    field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+    types = field_index.field_types(dynamodb.Table(PART_FIELDS_TABLE))
+
+    def index(parts):
+        search_index.index_parts(index_table, parts)
+        field_index.index_parts(field_index_table, parts, types)
+
+    parts, pending, error = copy(
+        dynamodb, scheduler, PARTS_TABLE, "part_id", source_pages,
+        lambda source: new_part(source, car_id, created_by, now), index, conditional=True,
+    )
+    if parts:
+        cars_table = dynamodb.Table(CARS_TABLE)
+        version = bump_car_version(cars_table, car_id)
+        changes.record(dynamodb.Table(CHANGE_LOG_TABLE), cars_table, car_id, version,
+                       [changes.upsert("part", p, "part_id") for p in parts])
+    if error is not None:
+        raise error
+    return parts, pending
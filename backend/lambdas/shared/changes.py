@@ -0,0 +1,192 @@
+"""
+Per-car change log - canonical copy used by all Lambda functions.
+
+Every handler that mutates a car's parts, history or miles log appends
+what it changed to the change log table, under the data_version its
+bump_car_version() call returned (see versions.py):
+
+    car_id      (hash)
+    change_key  (range)  "<seq, zero-padded>#<n>"  (n numbers the rows of one change)
+    seq, n, of (rows in this version), at (epoch ms), entity ("part" | "history" | "miles"), id, op, ...
+
+    op "upsert"     item = the entity as it is after the change
+    op "delete"     (no payload)
+    op "add_miles"  miles = increment applied to every active part of the car,
+                    except = part_ids the session did not reach
+
+A client keeps a replica of the car and asks GET /cars/{car_id}/changes
+for everything after its cursor (read()); replaying rows in order brings
+the replica up to date. add_miles keeps a test session to one row instead
+of one snapshot per part.
+
+Compaction keeps the log from growing without bound. Every
+COMPACT_EVERY versions the writer runs compact(), which
+  - deletes rows older than COMPACT_AFTER_S whose entity has a later
+    upsert/delete (a client replaying the later row does not need them);
+  - deletes rows older than RETENTION_DAYS and raises the car's
+    changes_floor to the newest seq removed. A cursor below the floor
+    cannot be caught up and gets a reset instead.
+"""
+import os
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import push
+from db import query_all
+
+RETENTION_DAYS = int(os.environ.get("CHANGE_RETENTION_DAYS", 30))
+COMPACT_EVERY = int(os.environ.get("CHANGE_COMPACT_EVERY", 200))
+COMPACT_AFTER_S = 3600
+# A missing seq younger than this may still be in flight (its writer bumped
+# the version but has not written its rows yet); readers stop in front of it
+SETTLE_MS = 5000
+SEQ_DIGITS = 12
+
+
+def upsert(entity: str, item: dict, id_attr: str) -> dict:
+    return {"entity": entity, "op": "upsert", "id": item[id_attr], "item": item}
+
+
+def delete(entity: str, entity_id: str) -> dict:
+    return {"entity": entity, "op": "delete", "id": entity_id}
+
+
+def add_miles(log_id: str, miles, except_ids: list) -> dict:
+    return {"entity": "part", "op": "add_miles", "id": log_id, "miles": miles, "except": except_ids}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _change_key(seq: int, n: int) -> str:
+    return f"{seq:0{SEQ_DIGITS}d}#{n:05d}"
+
+
+def record(changes_table, cars_table, car_id: str, seq: int | None, changes: list):
+    """Append one version's changes and push them to the car's connected clients.
+
+    seq is what bump_car_version() returned. Nothing is written when the
+    car no longer exists (seq is None).
+    """
+    if seq is None or not changes:
+        return
+    at = _now_ms()
+    with changes_table.batch_writer() as batch:
+        for n, change in enumerate(changes):
+            batch.put_item(Item={
+                "car_id": car_id,
+                "change_key": _change_key(seq, n),
+                "seq": seq,
+                "n": n,
+                "of": len(changes),
+                "at": at,
+                **change,
+            })
+    push.publish(car_id, seq, changes)
+    if seq % COMPACT_EVERY == 0:
+        compact(changes_table, cars_table, car_id)
+
+
+def _rows_after(changes_table, car_id: str, since: int):
+    kwargs = {
+        "KeyConditionExpression": Key("car_id").eq(car_id) & Key("change_key").gt(f"{since:0{SEQ_DIGITS}d}$"),
+    }
+    while True:
+        resp = changes_table.query(**kwargs)
+        yield from resp.get("Items", [])
+        if not resp.get("LastEvaluatedKey"):
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def read(changes_table, car_id: str, since: int, limit: int) -> tuple:
+    """(rows, cursor, has_more) for the changes after seq `since`.
+
+    A version's rows are returned together, so `limit` may be exceeded by
+    the rows of the last version. The cursor does not move past a version
+    that is still being written - a missing seq, or a seq with fewer rows
+    than its "of" count - until it is SETTLE_MS old; anything still
+    missing then was compacted away or lost with a failed writer.
+    """
+    settled = _now_ms() - SETTLE_MS
+    rows, group, cursor = [], [], since
+
+    def complete(group):
+        return len(group) == int(group[0]["of"]) or int(group[0]["at"]) <= settled
+
+    for row in _rows_after(changes_table, car_id, since):
+        if group and row["seq"] != group[0]["seq"]:
+            if not complete(group):
+                return rows, cursor, False
+            rows += group
+            cursor = int(group[0]["seq"])
+            group = []
+            if len(rows) >= limit:
+                return rows, cursor, True
+        if not group and int(row["seq"]) > cursor + 1 and int(row["at"]) > settled:
+            return rows, cursor, False
+        group.append(row)
+    if group and complete(group):
+        rows += group
+        cursor = int(group[0]["seq"])
+    return rows, cursor, False
+
+
+def collapse(rows: list) -> list:
+    """Drop upserts/deletes that a later row for the same entity overrides.
+
+    add_miles rows are kept in place: a snapshot after one already
+    includes the increment, and a snapshot before one receives it.
+    """
+    last = {}
+    for i, row in enumerate(rows):
+        if row["op"] != "add_miles":
+            last[(row["entity"], row["id"])] = i
+    return [
+        row for i, row in enumerate(rows)
+        if row["op"] == "add_miles" or last[(row["entity"], row["id"])] == i
+    ]
+
+
+def compact(changes_table, cars_table, car_id: str) -> dict:
+    """Remove superseded and expired rows of one car's log; returns what was removed."""
+    rows = query_all(
+        changes_table,
+        KeyConditionExpression=Key("car_id").eq(car_id),
+        ProjectionExpression="change_key, seq, #at, entity, #id, op",
+        ExpressionAttributeNames={"#at": "at", "#id": "id"},
+    )
+    now = _now_ms()
+    old = now - COMPACT_AFTER_S * 1000
+    expired = now - RETENTION_DAYS * 86400 * 1000
+    kept = {row["change_key"] for row in collapse(rows)}
+
+    superseded = 0
+    floor = None
+    with changes_table.batch_writer() as batch:
+        for row in rows:
+            at = int(row["at"])
+            if at < expired:
+                floor = max(floor or 0, int(row["seq"]))
+            elif at < old and row["change_key"] not in kept:
+                superseded += 1
+            else:
+                continue
+            batch.delete_item(Key={"car_id": car_id, "change_key": row["change_key"]})
+
+    if floor is not None:
+        try:
+            cars_table.update_item(
+                Key={"car_id": car_id},
+                UpdateExpression="SET changes_floor = :f",
+                ConditionExpression="attribute_exists(car_id) AND "
+                                    "(attribute_not_exists(changes_floor) OR changes_floor < :f)",
+                ExpressionAttributeValues={":f": floor},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+    return {"superseded": superseded, "floor": floor}
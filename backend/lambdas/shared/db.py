@@ -0,0 +1,128 @@
+"""
+DynamoDB access helpers - canonical copy used by all Lambda functions.
+Copied into each Lambda package at build time alongside utils.py.
+See scripts/build.sh for details.
+
+Handlers get their DynamoDB resource from resource() rather than calling
+boto3 directly, so tools can run them against another implementation
+(see backend/tools/memory_dynamodb.py) by calling use() before import.
+Either way the client is instrumented for per-request metrics, and the
+car tables are served per DATA_LAYOUT (see single_table.py).
+"""
+import boto3
+
+import metrics
+import single_table
+
+_resource = None
+
+
+def use(dynamodb):
+    """Make resource() return dynamodb instead of the boto3 resource."""
+    global _resource
+    _resource = single_table.wrap(dynamodb)
+    metrics.instrument(dynamodb.meta.client)
+
+
+def resource():
+    """The process-wide DynamoDB resource (boto3's unless use() replaced it)."""
+    global _resource
+    if _resource is None:
+        _resource = single_table.wrap(boto3.resource("dynamodb"))
+        metrics.instrument(_resource.meta.client)
+    return _resource
+
+
+def query_all(table, **kwargs) -> list:
+    """Run a query to completion, following LastEvaluatedKey across 1 MB pages."""
+    items = []
+    while True:
+        resp = table.query(**kwargs)
+        items.extend(resp.get("Items", []))
+        last_key = resp.get("LastEvaluatedKey")
+        if not last_key:
+            return items
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def batch_get(dynamodb, table_name: str, keys: list, **kwargs) -> list:
+    """Fetch items by key, 100 per request, retrying UnprocessedKeys.
+
+    kwargs (e.g. from projection()) apply to every request. Items come
+    back in no particular order; missing keys are simply absent.
+    """
+    items = []
+    for start in range(0, len(keys), 100):
+        request = {table_name: {"Keys": keys[start:start + 100], **kwargs}}
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(resp.get("Responses", {}).get(table_name, []))
+            request = resp.get("UnprocessedKeys") or None
+    return items
+
+
+# ─── Sparse fieldsets (?fields=) ──────────────────────────────────────────────
+
+MAX_FIELDS = 50
+
+
+def parse_fields(value) -> list | None:
+    """Split ?fields=a,b,extra_fields.c into attribute paths.
+
+    Returns None when the parameter is absent (whole items). Raises
+    ValueError on empty or oversized lists and malformed paths.
+    """
+    if value is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in value.split(",") if f.strip()))
+    if not fields:
+        raise ValueError("fields must name at least one attribute")
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f"fields accepts at most {MAX_FIELDS} attributes")
+    for f in fields:
+        if any(not seg or len(seg) > 255 for seg in f.split(".")):
+            raise ValueError(f"Invalid field: {f!r}")
+    return fields
+
+
+def _outermost(paths) -> list:
+    """Drop paths covered by an ancestor; DynamoDB rejects overlapping projections."""
+    paths = list(dict.fromkeys(paths))
+    return [
+        p for p in paths
+        if not any(p.startswith(q + ".") for q in paths if q != p)
+    ]
+
+
+def projection(fields, needed=()) -> dict:
+    """query()/get_item() kwargs that fetch only fields plus the needed attributes.
+
+    Every path segment is aliased through ExpressionAttributeNames, so
+    reserved words (name, status, ...) and arbitrary extra_fields keys are
+    safe. Returns {} when fields is None (whole items).
+    """
+    if fields is None:
+        return {}
+    names = {}
+    aliased = []
+    for path in _outermost([*needed, *fields]):
+        segments = []
+        for seg in path.split("."):
+            alias = next((a for a, n in names.items() if n == seg), None)
+            if alias is None:
+                alias = f"#f{len(names)}"
+                names[alias] = seg
+            segments.append(alias)
+        aliased.append(".".join(segments))
+    return {
+        "ProjectionExpression": ", ".join(aliased),
+        "ExpressionAttributeNames": names,
+    }
+
+
+def trim(items: list, fields, keep=()) -> list:
+    """Strip attributes that were only fetched for filtering or sorting."""
+    if fields is None:
+        return items
+    wanted = {f.split(".")[0] for f in fields} | set(keep)
+    return [{k: v for k, v in item.items() if k in wanted} for item in items]
@@ -0,0 +1,259 @@
+"""
+Custom field value index - canonical copy used by all Lambda functions.
+
+One row per active part and extra_fields value in the field index table:
+
+    field_key  (hash)   "<car_id>#<field_name>"
+    value_key  (range)  typed sort key + "#" + part_id
+    part_id, value
+
+Values of number fields (see create_field) are stored as "n:" followed by
+an order-preserving encoding of the number; everything else (text and
+dropdown fields, keys without a definition) as "s:" followed by the value.
+An equality or range filter on one car's field is then a single Query
+range over the rows that match (lookup()), instead of reading every part
+on the car. Retired parts are not indexed: list_parts only returns active
+parts.
+
+The write paths keep the index in step with index_part() / remove_part().
+Each posting carries the raw value and lookup() re-checks it, so a row
+left behind by a field whose type was redefined is skipped rather than
+returned; backend/tools/rebuild_indexes.py rebuilds the index.
+"""
+import re
+import time
+from decimal import Decimal, InvalidOperation
+
+from boto3.dynamodb.conditions import Key
+
+from db import query_all
+
+NUMBER_DIGITS = 20
+MAX_FILTERS = 10
+FIELD_TYPES_TTL = 60  # seconds a container reuses the field definitions
+
+_FILTER = re.compile(r"^extra\.([^<>=]+?)(?:([<>])(.*))?$", re.S)
+_types_cache = (0.0, {})
+
+
+def field_types(fields_table) -> dict:
+    """field_name -> field_type from the part field definitions (cached briefly)."""
+    global _types_cache
+    expires, types = _types_cache
+    if time.monotonic() < expires:
+        return types
+    definitions = []
+    kwargs = {}
+    while True:
+        resp = fields_table.scan(**kwargs)
+        definitions.extend(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    # The latest definition wins when a name was defined twice
+    definitions.sort(key=lambda f: f.get("created_at", ""))
+    types = {f["field_name"]: f.get("field_type", "text") for f in definitions}
+    _types_cache = (time.monotonic() + FIELD_TYPES_TTL, types)
+    return types
+
+
+def _number(value) -> Decimal | None:
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or abs(number) >= Decimal(10) ** NUMBER_DIGITS:
+        return None
+    return number if number else Decimal(0)
+
+
+def _number_key(number: Decimal) -> str:
+    """Encode a number so that string order matches numeric order.
+
+    Non-negative: "1" + zero-padded integer digits + "." + fraction digits.
+    Negative: "0" + nines' complement of both parts + "~", so larger
+    magnitudes sort first and a shorter fraction sorts after a longer one.
+    """
+    whole, _, fraction = format(abs(number), "f").partition(".")
+    whole = whole.zfill(NUMBER_DIGITS)
+    fraction = fraction.rstrip("0")
+    if number >= 0:
+        return f"1{whole}.{fraction}"
+    flip = str.maketrans("0123456789", "9876543210")
+    return f"0{whole.translate(flip)}.{fraction.translate(flip)}~"
+
+
+def _typed(value, field_type: str):
+    """(sort key prefix, comparable value) for a stored or queried value."""
+    if field_type == "number":
+        number = _number(value)
+        if number is not None:
+            return "n:" + _number_key(number), number
+    return "s:" + str(value), str(value)
+
+
+def _entries(part: dict | None, types: dict) -> dict:
+    if not part or not part.get("active", True):
+        return {}
+    out = {}
+    for name, value in (part.get("extra_fields") or {}).items():
+        if value is None or value == "" or isinstance(value, (dict, list, set)):
+            continue
+        prefix, _ = _typed(value, types.get(name, "text"))
+        key = (f"{part['car_id']}#{name}", f"{prefix}#{part['part_id']}")
+        out[key] = str(value)
+    return out
+
+
+def index_part(index_table, part: dict, types: dict, previous: dict | None = None, batch=None):
+    """Write a part's rows; previous is the item before this change, if any.
+
+    A retired part (active = false) ends up with no rows. batch, if given,
+    is the batch writer to use instead of the table's own (as in
+    search_index.index_part).
+    """
+    if batch is not None:
+        _write(batch, part, types, previous)
+        return
+    with index_table.batch_writer() as batch:
+        _write(batch, part, types, previous)
+
+
+def _write(batch, part: dict, types: dict, previous: dict | None):
+    new = _entries(part, types)
+    old = _entries(previous, types)
+    for field_key, value_key in old.keys() - new.keys():
+        batch.delete_item(Key={"field_key": field_key, "value_key": value_key})
+    for (field_key, value_key), value in new.items():
+        if old.get((field_key, value_key)) == value:
+            continue
+        batch.put_item(Item={
+            "field_key": field_key,
+            "value_key": value_key,
+            "part_id": part["part_id"],
+            "value": value,
+        })
+
+
+def index_parts(index_table, parts, types: dict):
+    """Index new parts in bulk (BOM copies, rebuilds)."""
+    with index_table.batch_writer() as batch:
+        for part in parts:
+            for (field_key, value_key), value in _entries(part, types).items():
+                batch.put_item(Item={
+                    "field_key": field_key,
+                    "value_key": value_key,
+                    "part_id": part["part_id"],
+                    "value": value,
+                })
+
+
+def remove_part(index_table, part: dict, types: dict):
+    with index_table.batch_writer() as batch:
+        for field_key, value_key in _entries(part, types):
+            batch.delete_item(Key={"field_key": field_key, "value_key": value_key})
+
+
+def parse_filters(qp: dict) -> list:
+    """(field, op, value) for every extra.<field> query parameter.
+
+    API Gateway splits a parameter at its first "=", so
+    "extra.torque_nm>=20" arrives as key "extra.torque_nm>" with value
+    "20", and "extra.torque_nm>20" as that whole key with no value.
+    Raises ValueError on malformed filters.
+    """
+    filters = []
+    for key, value in qp.items():
+        if not key.startswith("extra."):
+            continue
+        m = _FILTER.match(key)
+        if not m:
+            raise ValueError(f"Invalid filter: {key}")
+        name, sign, rest = m.groups()
+        if sign is None:
+            op = "eq"
+        elif rest:
+            op, value = ("gt" if sign == ">" else "lt"), rest
+        else:
+            op = "ge" if sign == ">" else "le"
+        if value is None or value == "":
+            raise ValueError(f"Filter {key} needs a value")
+        filters.append((name, op, value))
+    if len(filters) > MAX_FILTERS:
+        raise ValueError(f"At most {MAX_FILTERS} extra.* filters are allowed")
+    return filters
+
+
+def check_filters(filters: list, types: dict):
+    """Raise ValueError if a number field is compared with something that is not a number."""
+    for name, op, value in filters:
+        if types.get(name) == "number" and _number(value) is None:
+            raise ValueError(f"extra.{name} is a number field; {value!r} is not a number")
+
+
+def lookup(index_table, car_id: str, filters: list, types: dict) -> set:
+    """part_ids of the car's active parts matching every filter."""
+    matched = None
+    for name, op, value in filters:
+        field_type = types.get(name, "text")
+        prefix, target = _typed(value, field_type)
+        kind = prefix[:2]
+        # Every row for this value lies in [prefix#, prefix$); the kind's rows in [kind, kind;).
+        # A longer value sorts after prefix, but can sort before prefix# ("Front Left#..."
+        # < "Front#..."), and a shorter one after prefix$ when the value goes on with a
+        # character below "#" ("Front#..." > "Front Left$"), so the open ends are widened
+        # to cover them and _compare drops the rows that do not match.
+        below = _below(prefix)
+        lo, hi = {
+            "eq": (prefix + "#", prefix + "$"),
+            "ge": (prefix, kind[0] + ";"),
+            "gt": (prefix, kind[0] + ";"),
+            "le": (kind, below),
+            "lt": (kind, below),
+        }[op]
+        rows = query_all(
+            index_table,
+            KeyConditionExpression=Key("field_key").eq(f"{car_id}#{name}") & Key("value_key").between(lo, hi),
+        )
+        ids = {
+            row["part_id"] for row in rows
+            if _compare(_typed(row["value"], field_type), kind, op, target)
+        }
+        matched = ids if matched is None else matched & ids
+        if not matched:
+            return set()
+    return matched if matched is not None else set()
+
+
+def _below(prefix: str) -> str:
+    """An upper bound for the sort keys of every value up to prefix's."""
+    text = prefix[2:]
+    return max([prefix + "$"] + [prefix[:2] + text[:i] + "$" for i, c in enumerate(text) if c < "#"])
+
+
+def _compare(typed, kind: str, op: str, target) -> bool:
+    prefix, value = typed
+    if prefix[:2] != kind:
+        return False
+    if op == "eq":
+        return value == target
+    if op == "ge":
+        return value >= target
+    if op == "gt":
+        return value > target
+    if op == "le":
+        return value <= target
+    return value < target
+
+
+def matches(part: dict, filters: list, types: dict) -> bool:
+    """Re-check filters against a fetched part, in case its rows were out of date."""
+    extra = part.get("extra_fields") or {}
+    for name, op, value in filters:
+        if name not in extra or extra[name] in (None, ""):
+            return False
+        field_type = types.get(name, "text")
+        prefix, target = _typed(value, field_type)
+        if not _compare(_typed(extra[name], field_type), prefix[:2], op, target):
+            return False
+    return True
@@ -0,0 +1,139 @@
+"""
+Idempotency-Key support for the write decorator - canonical copy used by all Lambda functions.
+
+A client that may retry a mutation (log miles, replace, upload over a
+flaky connection) sends the same Idempotency-Key header with every attempt.
+The first attempt claims the key with a conditional put of a pending
+record and runs the handler; its response is then stored on the record
+(body zlib-compressed). Later attempts with the key get that response back
+without the handler running again, with Idempotent-Replayed: true (or
+"truncated", with an empty body, if the body was too large to store).
+
+Records are per user (user_id#key) and carry a fingerprint of the request,
+so a key reused for a different request is refused (422). An attempt that
+arrives while the first is still running waits for its response, up to
+IDEMPOTENCY_WAIT_S, and otherwise gets a 409 to retry. A pending record
+is locked only for the first attempt's remaining Lambda time, after which
+another attempt may take it over (the first one timed out). Responses with
+a 5xx status, and handler exceptions, release the key so a retry runs
+again. So do responses marked with an Idempotency-Incomplete header: work
+left over that running the same request again resumes rather than
+repeats (log_miles), so a retry finishes it instead of replaying the
+partial response. Records expire through the table's TTL attribute (expires_at)
+after IDEMPOTENCY_TTL seconds.
+"""
+import hashlib
+import json
+import os
+import time
+import zlib
+
+from botocore.exceptions import ClientError
+from db import resource
+
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE")
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_WAIT_S = float(os.environ.get("IDEMPOTENCY_WAIT_S", 10))
+MAX_KEY_LENGTH = 255
+POLL_S = 0.2
+
+# Bodies larger than this compressed are not stored; the replay then has an
+# empty body and Idempotent-Replayed: truncated
+MAX_BODY_BYTES = 350 * 1024
+# How long an attempt without a Lambda context (local tools) holds the key: Lambda's longest timeout
+NO_CONTEXT_LOCK_S = 900
+
+PENDING = "pending"
+DONE = "done"
+
+# Set by a handler on a response whose work is not finished (see above)
+INCOMPLETE_HEADER = "Idempotency-Incomplete"
+
+
+def _table():
+    return resource().Table(IDEMPOTENCY_TABLE)
+
+
+def fingerprint(event: dict) -> str:
+    """Hash of what makes two requests the same: method, resource, path parameters and body."""
+    digest = hashlib.sha256()
+    params = json.dumps(event.get("pathParameters") or {}, sort_keys=True)
+    for part in (event.get("httpMethod"), event.get("resource"), params, event.get("body")):
+        digest.update((part or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def claim(record_id: str, request_fingerprint: str, context) -> dict | None:
+    """Claim record_id for this attempt.
+
+    Returns None when the caller now owns the key and should run the
+    handler, else the existing record: done, for another request, or still
+    pending after waiting as long as the attempt can afford. Without a
+    context the key is held for NO_CONTEXT_LOCK_S and the wait is
+    IDEMPOTENCY_WAIT_S.
+    """
+    remaining_s = context.get_remaining_time_in_millis() / 1000 if context else NO_CONTEXT_LOCK_S
+    deadline = time.time() + min(IDEMPOTENCY_WAIT_S, max(0, remaining_s - 1))
+    while True:
+        now = time.time()
+        try:
+            _table().put_item(
+                Item={
+                    "record_id": record_id,
+                    "state": PENDING,
+                    "fingerprint": request_fingerprint,
+                    "locked_until": int(now + remaining_s) + 1,
+                    "expires_at": int(now) + IDEMPOTENCY_TTL,
+                },
+                ConditionExpression="attribute_not_exists(record_id) OR (#s = :pending AND locked_until < :now)",
+                ExpressionAttributeNames={"#s": "state"},
+                ExpressionAttributeValues={":pending": PENDING, ":now": int(now)},
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        record = _table().get_item(Key={"record_id": record_id}, ConsistentRead=True).get("Item")
+        if record is None:
+            continue  # released meanwhile
+        if record["state"] == DONE or record["fingerprint"] != request_fingerprint or time.time() >= deadline:
+            return record
+        time.sleep(POLL_S)
+
+
+def complete(record_id: str, resp: dict):
+    """Store the handler's response on the claimed record."""
+    body = zlib.compress((resp.get("body") or "").encode())
+    item = {
+        "state": DONE,
+        "status_code": resp.get("statusCode", 200),
+        "headers": resp.get("headers") or {},
+        "is_base64": bool(resp.get("isBase64Encoded")),
+    }
+    if len(body) <= MAX_BODY_BYTES:
+        item["body"] = body
+    _table().update_item(
+        Key={"record_id": record_id},
+        UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in item),
+        ExpressionAttributeNames={f"#{k}": k for k in item},
+        ExpressionAttributeValues={f":{k}": v for k, v in item.items()},
+    )
+
+
+def release(record_id: str):
+    """Give the key up after a failed attempt, so a retry runs the handler."""
+    _table().delete_item(Key={"record_id": record_id})
+
+
+def replay(record: dict) -> dict:
+    """The stored response of a done record (with an empty body if it was too large to store)."""
+    body = record.get("body")
+    resp = {
+        "statusCode": int(record["status_code"]),
+        "headers": {**record.get("headers", {}), "Idempotent-Replayed": "true" if body else "truncated"},
+        "body": zlib.decompress(getattr(body, "value", body)).decode() if body else "",
+    }
+    if record.get("is_base64"):
+        resp["isBase64Encoded"] = True
+    return resp
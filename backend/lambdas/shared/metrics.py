@@ -0,0 +1,224 @@
+"""
+Per-invocation metrics - canonical copy used by all Lambda functions.
+
+The auth decorators in utils.py wrap every invocation in begin()/end(),
+which emits one CloudWatch Embedded Metric Format (EMF) line to stdout.
+CloudWatch Logs extracts the declared metrics from it; the per-table
+breakdown and request details stay searchable in Logs Insights.
+
+DynamoDB requests are observed through the client's botocore events
+(instrument() is called by db.resource() / db.use()). While an
+invocation is being measured every request also asks for
+ReturnConsumedCapacity=INDEXES, so read/write units, calls, items and
+time are attributed per table and index. Outside an invocation, or with
+METRICS_ENABLED=false, requests are left untouched.
+
+Set METRICS_ENABLED=false to turn it off. Tools can replace ``sink`` to
+collect the lines instead of printing them.
+"""
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "CalSolInventory")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() != "false"
+
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+}
+READ_OPS = {"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"}
+
+METRICS = [
+    ("Latency", "Milliseconds"),
+    ("ResponseBytes", "Bytes"),
+    ("DynamoDBCalls", "Count"),
+    ("DynamoDBLatency", "Milliseconds"),
+    ("ConsumedRCU", "Count"),
+    ("ConsumedWCU", "Count"),
+    ("ColdStart", "Count"),
+]
+
+_current = ContextVar("metrics_invocation", default=None)
+_cold_start = True
+
+
+def stdout_sink(line: str):
+    print(line, flush=True)
+
+
+sink = stdout_sink
+
+
+class Invocation:
+    """DynamoDB usage and timing of one handler invocation."""
+
+    def __init__(self, event: dict, context, cold_start: bool):
+        self.event = event or {}
+        self.context = context
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.token = None
+        self.lock = threading.Lock()
+        # "Table" or "Table/index" -> {"calls", "items", "rcu", "wcu", "ms"}
+        self.tables = {}
+        # (offset ms, operation, target, duration ms), in completion order
+        self.timeline = []
+
+    def _entry(self, target: str) -> dict:
+        return self.tables.setdefault(target, {"calls": 0, "items": 0, "rcu": 0.0, "wcu": 0.0, "ms": 0.0})
+
+    def record_call(self, op: str, target: str, started: float, items: int, capacity):
+        done = time.perf_counter()
+        ms = (done - started) * 1000
+        kind = "rcu" if op in READ_OPS else "wcu"
+        with self.lock:
+            entry = self._entry(target)
+            entry["calls"] += 1
+            entry["items"] += items
+            entry["ms"] += ms
+            self.timeline.append((round((started - self.started) * 1000, 2), op, target, round(ms, 2)))
+            for cap in capacity:
+                table = cap.get("TableName", target.split("/")[0])
+                parts = []
+                if "Table" in cap:
+                    parts.append((table, cap["Table"]))
+                for index, idx_cap in (cap.get("GlobalSecondaryIndexes") or {}).items():
+                    parts.append((f"{table}/{index}", idx_cap))
+                for index, idx_cap in (cap.get("LocalSecondaryIndexes") or {}).items():
+                    parts.append((f"{table}/{index}", idx_cap))
+                if not parts:
+                    parts.append((table, cap))
+                for name, units in parts:
+                    self._entry(name)[kind] += float(units.get("CapacityUnits", 0))
+
+    def totals(self) -> dict:
+        with self.lock:
+            entries = list(self.tables.values())
+        return {
+            "DynamoDBCalls": sum(e["calls"] for e in entries),
+            "DynamoDBLatency": round(sum(e["ms"] for e in entries), 2),
+            "ConsumedRCU": sum(e["rcu"] for e in entries),
+            "ConsumedWCU": sum(e["wcu"] for e in entries),
+        }
+
+
+def current() -> Invocation | None:
+    return _current.get()
+
+
+def begin(event: dict, context) -> Invocation | None:
+    """Start measuring an invocation; returns None when metrics are disabled."""
+    global _cold_start
+    if not METRICS_ENABLED:
+        return None
+    invocation = Invocation(event, context, _cold_start)
+    _cold_start = False
+    invocation.token = _current.set(invocation)
+    return invocation
+
+
+def end(invocation: Invocation | None, resp: dict | None, status_code: int | None = None):
+    """Emit the EMF line for an invocation started with begin()."""
+    if invocation is None:
+        return
+    _current.reset(invocation.token)
+    latency = (time.perf_counter() - invocation.started) * 1000
+    if status_code is None:
+        status_code = (resp or {}).get("statusCode", 500)
+    body = (resp or {}).get("body") or ""
+    event = invocation.event
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Function"]],
+                "Metrics": [{"Name": name, "Unit": unit} for name, unit in METRICS],
+            }],
+        },
+        "Function": function_name(invocation.context),
+        "RequestId": getattr(invocation.context, "aws_request_id", None),
+        "Method": event.get("httpMethod"),
+        "Resource": event.get("resource"),
+        "StatusCode": status_code,
+        "Latency": round(latency, 2),
+        "ResponseBytes": len(body),
+        "ColdStart": 1 if invocation.cold_start else 0,
+        **invocation.totals(),
+        "DynamoDB": {
+            target: {**usage, "ms": round(usage["ms"], 2)}
+            for target, usage in invocation.tables.items()
+        },
+    }
+    sink(json.dumps(record, default=str, separators=(",", ":")))
+
+
+def function_name(context) -> str:
+    return (
+        getattr(context, "function_name", None)
+        or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+        or "local"
+    )
+
+
+# ─── botocore hooks ───────────────────────────────────────────────────────────
+
+def _target(params: dict) -> str:
+    table = params.get("TableName")
+    if not table:
+        # Batch / transact requests name their tables inside the request
+        tables = list(params.get("RequestItems") or {})
+        tables += [
+            next(iter(entry.values())).get("TableName")
+            for entry in params.get("TransactItems") or []
+        ]
+        return ",".join(sorted({t for t in tables if t})) or "?"
+    index = params.get("IndexName")
+    return f"{table}/{index}" if index else table
+
+
+def _items(op: str, params: dict, parsed: dict) -> int:
+    if op in ("Query", "Scan"):
+        return int(parsed.get("Count", 0))
+    if op == "GetItem":
+        return 1 if parsed.get("Item") else 0
+    if op == "BatchGetItem":
+        return sum(len(v) for v in (parsed.get("Responses") or {}).values())
+    if op == "BatchWriteItem":
+        return sum(len(v) for v in (params.get("RequestItems") or {}).values())
+    if op in ("TransactWriteItems", "TransactGetItems"):
+        return len(params.get("TransactItems") or [])
+    return 1
+
+
+def _provide_params(params, model, context, **kwargs):
+    if _current.get() is None:
+        return
+    if model.name in CAPACITY_OPS:
+        params.setdefault("ReturnConsumedCapacity", "INDEXES")
+    context["metrics"] = (time.perf_counter(), _target(params), params)
+
+
+def _after_call(parsed, model, context, **kwargs):
+    invocation = _current.get()
+    started = context.get("metrics") if context is not None else None
+    if invocation is None or started is None:
+        return
+    started_at, target, params = started
+    capacity = parsed.get("ConsumedCapacity") or []
+    if isinstance(capacity, dict):
+        capacity = [capacity]
+    invocation.record_call(model.name, target, started_at, _items(model.name, params, parsed), capacity)
+
+
+def instrument(client):
+    """Register the metrics hooks on a DynamoDB client (idempotent)."""
+    events = getattr(getattr(client, "meta", None), "events", None)
+    if events is None:
+        return
+    events.register("provide-client-params.dynamodb", _provide_params, unique_id="calsol-metrics-params")
+    events.register("after-call.dynamodb", _after_call, unique_id="calsol-metrics-after")
@@ -0,0 +1,544 @@
+"""
+Logging a test session's miles - canonical copy used by all Lambda functions.
+
+The miles path shared by POST /cars/{car_id}/miles (miles typed in) and
+POST /cars/{car_id}/telemetry (miles derived from GPS / wheel-speed logs):
+
+  1. write the miles log entry;
+  2. add the miles to miles_used of every active part of the car,
+     PART_WORKERS at a time, paced and retried by the caller's
+     WriteScheduler (parts not reached before its time budget ran out are
+     returned as pending);
+  3. raise risk alerts for parts that crossed a level (risk_alerts.py);
+  4. bump the car's data_version and record one add_miles change.
+
+correct_session() changes (PUT /cars/{car_id}/miles/{log_id}) or removes
+(DELETE) a logged session. The difference is added atomically (ADD) to
+the parts that were on the car when the session was logged (created
+before logged_at, not retired before it), PART_WORKERS at a time,
+so a car of N parts takes about N / PART_WORKERS round trips. Parts
+retired since also get their history row's miles_at_retirement and, for
+failures, the failure stats corrected. The entry is changed on condition
+that its miles are still what was read, so two corrections of one session
+cannot both apply their difference.
+
+Progress is kept on the entry, not on the parts. While a session or a
+correction is being applied the entry holds the miles still owed
+(pending_miles), and the parts and history rows the budget did not reach
+are added to pending_parts / pending_history; the entry reads as
+incomplete (see public()) until none is left. A removed session stays
+as a hidden tombstone (removed) until then. resume_session() takes the
+pending items off the entry (so two concurrent resumes cannot both apply
+one), adds the miles and puts back whatever it did not reach. Logging a
+log_id that exists already, or repeating the unfinished correction, does
+the same, so a session sent twice (telemetry derives its log_id from the
+session, log_miles from the Idempotency-Key) is logged once. Any other
+correction of an unfinished entry is refused (SessionPending) - it would
+change what the pending items are owed.
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import changes
+import risk_alerts
+from db import query_all
+from scheduler import BudgetExhausted
+from versions import bump_car_version
+
+MILES_LOG_TABLE = os.environ.get("MILES_LOG_TABLE")
+PARTS_TABLE = os.environ.get("PARTS_TABLE")
+CARS_TABLE = os.environ.get("CARS_TABLE")
+CHANGE_LOG_TABLE = os.environ.get("CHANGE_LOG_TABLE")
+FAILURE_STATS_TABLE = os.environ.get("FAILURE_STATS_TABLE")
+ALERTS_TABLE = os.environ.get("ALERTS_TABLE")
+PART_HISTORY_TABLE = os.environ.get("PART_HISTORY_TABLE")
+
+PART_WORKERS = 16
+
+# Entry attributes that track unfinished work; never shown by the API
+PROGRESS_ATTRS = ("pending_miles", "pending_parts", "pending_history", "pending_correction",
+                  "removed", "incomplete")
+
+_PENDING = object()  # a write the time budget did not reach
+
+
+class SessionChanged(Exception):
+    """The entry was corrected or removed by someone else since it was read."""
+
+
+class SessionPending(Exception):
+    """The entry has an unfinished session or correction to finish first."""
+
+
+def public(entry: dict) -> dict:
+    """The entry as the API and replicas see it: incomplete while anything is pending."""
+    shown = {k: v for k, v in entry.items() if k not in PROGRESS_ATTRS}
+    if "pending_miles" in entry:
+        shown["incomplete"] = True
+    return shown
+
+
+def log_session(dynamodb, scheduler, car_id: str, miles: Decimal, log_id: str, note: str,
+                test_date: str, logged_by: str, extra: dict | None = None) -> dict | None:
+    """Log one session's miles (see the module docstring).
+
+    A log_id that was logged already is finished instead (resume_session).
+    Returns {"log", "resumed", "parts_updated", "parts_pending", "alerts"},
+    or None when log_id belongs to another car.
+    """
+    miles_table = dynamodb.Table(MILES_LOG_TABLE)
+    parts_table = dynamodb.Table(PARTS_TABLE)
+    cars_table = dynamodb.Table(CARS_TABLE)
+    now = datetime.now(timezone.utc).isoformat()
+
+    # 1. Write the miles log entry, unless it is there from an earlier attempt.
+    #    It is pending until every part has the miles.
+    log_entry = {
+        "log_id": log_id,
+        "car_id": car_id,
+        "miles": miles,
+        "note": note,
+        "test_date": test_date,
+        "logged_at": now,
+        "logged_by": logged_by,
+        **(extra or {}),
+    }
+    try:
+        miles_table.put_item(Item={**log_entry, "pending_miles": miles},
+                             ConditionExpression="attribute_not_exists(log_id)")
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return resume_session(dynamodb, scheduler, car_id, log_id)
+        raise
+
+    # 2. Fetch all active parts for this car
+    parts = query_all(
+        parts_table,
+        IndexName="car-index",
+        KeyConditionExpression=Key("car_id").eq(car_id),
+    )
+    active_parts = [p for p in parts if p.get("active", True)]
+
+    # 3. ADD the miles to each active part, note the ones not reached on the entry
+    updated, _, pending, _, error = _apply(
+        dynamodb, scheduler, miles, [p["part_id"] for p in active_parts], (), now, active_only=True,
+    )
+    if pending:
+        _mark_pending(miles_table, log_id, miles, pending)
+        log_entry["pending_miles"] = miles
+    else:
+        _settle(miles_table, log_id)
+    alerts = _alerts(dynamodb, car_id, log_id, miles, list(updated.values()), now)
+
+    # 4. Invalidate anything derived from this car's data (cached reports)
+    #    and tell replicas: one row for the session instead of one per part
+    version = bump_car_version(cars_table, car_id)
+    changes.record(dynamodb.Table(CHANGE_LOG_TABLE), cars_table, car_id, version, [
+        changes.upsert("miles", public(log_entry), "log_id"),
+        changes.add_miles(log_id, str(miles), [p["part_id"] for p in active_parts if p["part_id"] not in updated]),
+    ])
+    if error is not None:
+        raise error
+
+    return {
+        "log": public(log_entry),
+        "resumed": False,
+        "parts_updated": len(updated),
+        "parts_pending": pending,
+        "alerts": alerts,
+    }
+
+
+def resume_session(dynamodb, scheduler, car_id: str, log_id: str, part_ids: list | None = None) -> dict | None:
+    """Finish a logged session, or a correction of one, that did not reach every part.
+
+    Adds the entry's pending_miles to its pending parts (only part_ids, if
+    given) and history rows, and clears the incomplete state once none is
+    left, whoever applied the last ones. Returns {"log", "resumed",
+    "delta", "parts_updated", "parts_pending", "history_updated",
+    "history_pending", "alerts"}, or None when the car has no such entry.
+    """
+    entry = dynamodb.Table(MILES_LOG_TABLE).get_item(Key={"log_id": log_id}, ConsistentRead=True).get("Item")
+    if not entry or entry.get("car_id") != car_id or entry.get("removed"):
+        return None
+    return _resume(dynamodb, scheduler, entry, part_ids)
+
+
+def _resume(dynamodb, scheduler, entry: dict, part_ids: list | None) -> dict:
+    miles_table = dynamodb.Table(MILES_LOG_TABLE)
+    cars_table = dynamodb.Table(CARS_TABLE)
+    car_id, log_id = entry["car_id"], entry["log_id"]
+    now = datetime.now(timezone.utc).isoformat()
+
+    if "pending_miles" not in entry:
+        return {
+            "log": public(entry), "resumed": True, "delta": Decimal(0),
+            "parts_updated": 0, "parts_pending": [], "history_updated": 0, "history_pending": [], "alerts": [],
+        }
+    miles = Decimal(str(entry["pending_miles"]))
+    removed = entry.get("removed", False)
+
+    claimed_parts, claimed_history = _claim(miles_table, entry, part_ids)
+    updated, history, pending, history_pending, error = _apply(
+        dynamodb, scheduler, miles, sorted(claimed_parts), sorted(claimed_history), now,
+        active_only=not entry.get("pending_correction"),
+    )
+    if pending or history_pending:
+        _mark_pending(miles_table, log_id, miles, pending, history_pending, entry.get("pending_correction", False))
+    elif _settle(miles_table, log_id):
+        if removed:
+            _forget(miles_table, log_id)
+        entry = {k: v for k, v in entry.items() if k not in PROGRESS_ATTRS}
+    _failure_stats(dynamodb, car_id, history, miles)
+    active = [p for p in updated.values() if p.get("active", True)]
+    alerts = _alerts(dynamodb, car_id, log_id, miles, active, now)
+
+    if updated or history:
+        # Replicas get the items themselves: the car's other parts are not known here
+        version = bump_car_version(cars_table, car_id)
+        rows = [] if removed else [changes.upsert("miles", public(entry), "log_id")]
+        rows += [changes.upsert("part", p, "part_id") for p in updated.values()]
+        rows += [changes.upsert("history", h, "history_id") for h in history]
+        changes.record(dynamodb.Table(CHANGE_LOG_TABLE), cars_table, car_id, version, rows)
+    if error is not None:
+        raise error
+
+    return {
+        "log": None if removed else public(entry),
+        "resumed": True,
+        "delta": miles,
+        "parts_updated": len(updated),
+        "parts_pending": pending + sorted(set(entry.get("pending_parts", ())) - claimed_parts),
+        "history_updated": len(history),
+        "history_pending": history_pending,
+        "alerts": alerts,
+    }
+
+
+def _mark_pending(miles_table, log_id: str, miles: Decimal, part_ids: list, history_ids: list = (),
+                  correction: bool = False) -> None:
+    """Record on the entry that part_ids and history_ids are still owed miles."""
+    update = "SET pending_miles = :m"
+    values = {":m": miles}
+    if correction:
+        update += ", pending_correction = :true"
+        values[":true"] = True
+    adds = []
+    if part_ids:
+        adds.append("pending_parts :p")
+        values[":p"] = set(part_ids)
+    if history_ids:
+        adds.append("pending_history :h")
+        values[":h"] = set(history_ids)
+    if adds:
+        update += " ADD " + ", ".join(adds)
+    miles_table.update_item(Key={"log_id": log_id}, UpdateExpression=update, ExpressionAttributeValues=values)
+
+
+def _claim(miles_table, entry: dict, part_ids: list | None) -> tuple:
+    """Take the entry's pending parts (only part_ids, if given) and history rows off it.
+
+    The DELETE returns what the sets held just before, so of two concurrent
+    resumes only one gets each item. Returns the (part ids, history ids)
+    now owed the entry's pending_miles.
+    """
+    parts = set(entry.get("pending_parts", ()))
+    if part_ids is not None:
+        parts &= set(part_ids)
+    history = set(entry.get("pending_history", ()))
+    deletes, values = [], {":m": entry["pending_miles"]}
+    if parts:
+        deletes.append("pending_parts :p")
+        values[":p"] = parts
+    if history:
+        deletes.append("pending_history :h")
+        values[":h"] = history
+    if not deletes:
+        return set(), set()
+    try:
+        old = miles_table.update_item(
+            Key={"log_id": entry["log_id"]},
+            UpdateExpression="DELETE " + ", ".join(deletes),
+            ConditionExpression="pending_miles = :m",
+            ExpressionAttributeValues=values,
+            ReturnValues="UPDATED_OLD",
+        ).get("Attributes", {})
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return set(), set()  # finished since it was read
+        raise
+    return parts & set(old.get("pending_parts", ())), history & set(old.get("pending_history", ()))
+
+
+def _settle(miles_table, log_id: str) -> bool:
+    """Clear the entry's pending state if nothing is left; whether it did."""
+    try:
+        miles_table.update_item(
+            Key={"log_id": log_id},
+            UpdateExpression="REMOVE pending_miles, pending_correction",
+            ConditionExpression=("attribute_exists(pending_miles) AND attribute_not_exists(pending_parts)"
+                                 " AND attribute_not_exists(pending_history)"),
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _forget(miles_table, log_id: str) -> None:
+    """Delete a removed session's entry once its miles are off every part."""
+    try:
+        miles_table.delete_item(
+            Key={"log_id": log_id},
+            ConditionExpression="removed = :true AND attribute_not_exists(pending_miles)",
+            ExpressionAttributeValues={":true": True},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _apply(dynamodb, scheduler, miles: Decimal, part_ids: list, history_ids: list, now: str,
+           active_only: bool) -> tuple:
+    """ADD miles to the parts' miles_used and history rows' miles_at_retirement, PART_WORKERS at a time.
+
+    With active_only (a session) each part update is conditional on the part
+    still being active, so a concurrent retirement keeps the miles it
+    retired with; a correction also corrects retired parts. An item whose
+    write failed for another reason than the time budget counts as pending
+    too (so it is never lost, at worst applied twice), and the first such
+    error is returned for the caller to raise once it has recorded the
+    rest. Returns ({part_id: updated part}, updated history rows, pending
+    part ids, pending history ids, error or None).
+    """
+    parts_table = dynamodb.Table(PARTS_TABLE)
+    history_table = dynamodb.Table(PART_HISTORY_TABLE)
+
+    def apply(task):
+        table, key, attr, stamp, only_active = task
+        try:
+            return _add_miles(scheduler, table, key, attr, miles, stamp, now, only_active)
+        except BudgetExhausted:
+            return _PENDING
+
+    tasks = [(parts_table, {"part_id": pid}, "miles_used", "updated_at", active_only) for pid in part_ids]
+    tasks += [(history_table, {"history_id": hid}, "miles_at_retirement", "corrected_at", False)
+              for hid in history_ids]
+    # Each write runs in a copy of this context, so id-only keys resolve to the request's car
+    with ThreadPoolExecutor(max_workers=PART_WORKERS) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, apply, task) for task in tasks]
+    results, error = [], None
+    for f in futures:
+        try:
+            results.append(f.result())
+        except Exception as e:  # raised by the caller
+            results.append(_PENDING)
+            error = error or e
+    part_results, history_results = results[:len(part_ids)], results[len(part_ids):]
+
+    updated = {pid: r for pid, r in zip(part_ids, part_results) if isinstance(r, dict)}
+    history = [r for r in history_results if isinstance(r, dict)]
+    pending = [pid for pid, r in zip(part_ids, part_results) if r is _PENDING]
+    history_pending = [hid for hid, r in zip(history_ids, history_results) if r is _PENDING]
+    return updated, history, pending, history_pending, error
+
+
+def _add_miles(scheduler, table, key: dict, attr: str, delta: Decimal, stamp: str, now: str,
+               active_only: bool = False):
+    """ADD delta to attr of an existing (and active) item, SET stamp = now; None if it is not."""
+    condition = "attribute_exists(#k)"
+    values = {":d": delta, ":t": now}
+    if active_only:
+        condition += " AND active = :true"
+        values[":true"] = True
+    try:
+        return scheduler.write(
+            table, "update_item",
+            Key=key,
+            UpdateExpression="ADD #m :d SET #t = :t",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={"#m": attr, "#t": stamp, "#k": next(iter(key))},
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None  # retired or deleted since it was listed
+        raise
+
+
+def _failure_stats(dynamodb, car_id: str, history: list, delta: Decimal) -> None:
+    """Correct the failure miles of the failures among the history rows corrected by delta."""
+    failures = {}
+    for row in history:
+        if row.get("reason") == "failure" and row.get("part_number"):
+            failures[row["part_number"]] = failures.get(row["part_number"], Decimal(0)) + delta
+    stats_table = dynamodb.Table(FAILURE_STATS_TABLE)
+    for part_number, miles_delta in failures.items():
+        stats_table.update_item(
+            Key={"car_id": car_id, "part_number": part_number},
+            UpdateExpression="ADD failure_miles :m",
+            ExpressionAttributeValues={":m": miles_delta},
+        )
+
+
+def _alerts(dynamodb, car_id: str, log_id: str, delta: Decimal, parts: list, now: str) -> list:
+    """Raise the alerts active parts crossed into with delta more miles, re-evaluate alerted ones that lost miles."""
+    stats_table = dynamodb.Table(FAILURE_STATS_TABLE)
+    alerts_table = dynamodb.Table(ALERTS_TABLE)
+    if delta > 0:
+        avg_by_pn = risk_alerts.thresholds(stats_table, car_id)
+        crossed = []
+        for part in parts:
+            new_miles = Decimal(str(part["miles_used"]))
+            alert = risk_alerts.evaluate(part, new_miles - delta, new_miles, avg_by_pn)
+            if alert:
+                crossed.append(alert)
+        return risk_alerts.raise_alerts(alerts_table, car_id, crossed, log_id, now)
+    alerts = []
+    if delta < 0 and parts:
+        alerted = {a["part_id"] for a in risk_alerts.list_alerts(alerts_table, car_id)}
+        for part in parts:
+            if part["part_id"] in alerted:
+                alert = risk_alerts.refresh_part(alerts_table, stats_table, car_id, part, now)
+                if alert:
+                    alerts.append(alert)
+    return alerts
+
+
+def _on_car_during(part: dict, at: str) -> bool:
+    """Whether the part was installed at ISO time at (and not yet retired)."""
+    return part.get("created_at", "") <= at and not part.get("retired_at", at) < at
+
+
+def _correct_entry(miles_table, entry: dict, miles: Decimal | None, delta: Decimal, corrected_by: str,
+                   note: str | None, now: str) -> dict:
+    """Set the entry's miles (mark it removed for None) and pending the difference, unless it changed since read."""
+    update = "SET pending_miles = :d, pending_correction = :true"
+    values = {":old": entry["miles"], ":d": delta, ":true": True}
+    if miles is None:
+        update += ", removed = :true"
+    else:
+        update += ", miles = :m, corrections = list_append(if_not_exists(corrections, :none), :c)"
+        values.update({
+            ":m": miles, ":none": [],
+            ":c": [{"at": now, "by": corrected_by, "from": entry["miles"], "to": miles}],
+        })
+        if note is not None:
+            update += ", note = :n"
+            values[":n"] = note
+    try:
+        return miles_table.update_item(
+            Key={"log_id": entry["log_id"]},
+            UpdateExpression=update,
+            ConditionExpression="miles = :old AND attribute_not_exists(pending_miles)",
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise SessionChanged(entry["log_id"]) from None
+        raise
+
+
+def correct_session(dynamodb, scheduler, car_id: str, log_id: str, miles: Decimal | None,
+                    corrected_by: str, note: str | None = None) -> dict | None:
+    """Set a logged session's miles (None removes the session) and correct its parts.
+
+    Returns {"log" (None once removed), "delta", "parts_updated",
+    "parts_pending", "history_updated", "history_pending", "alerts"}, or
+    None when the car has no such entry. Repeating an unfinished
+    correction finishes it (the result of resume_session); another one
+    raises SessionPending. Raises SessionChanged if the entry moved
+    meanwhile.
+    """
+    miles_table = dynamodb.Table(MILES_LOG_TABLE)
+    parts_table = dynamodb.Table(PARTS_TABLE)
+    cars_table = dynamodb.Table(CARS_TABLE)
+    history_table = dynamodb.Table(PART_HISTORY_TABLE)
+    now = datetime.now(timezone.utc).isoformat()
+
+    entry = miles_table.get_item(Key={"log_id": log_id}, ConsistentRead=True).get("Item")
+    if not entry or entry.get("car_id") != car_id:
+        return None
+    if "pending_miles" in entry:
+        if miles is None:
+            repeat = entry.get("removed", False)
+        else:
+            repeat = not entry.get("removed") and Decimal(str(entry["miles"])) == miles
+        if not repeat:
+            raise SessionPending(log_id)
+        return _resume(dynamodb, scheduler, entry, None)
+    if entry.get("removed"):
+        return None
+    logged_at = entry["logged_at"]
+    delta = (miles if miles is not None else Decimal(0)) - Decimal(str(entry.get("miles", 0)))
+
+    # 1. Correct (or mark removed) the entry, if nobody else did first; it
+    #    is pending until every part has the difference
+    corrected = _correct_entry(miles_table, entry, miles, delta, corrected_by, note, now)
+
+    # 2. The parts on the car during the session, and the history rows of
+    #    those retired since (their miles at retirement included the session)
+    parts = query_all(
+        parts_table,
+        IndexName="car-index",
+        KeyConditionExpression=Key("car_id").eq(car_id),
+    ) if delta else []
+    affected = [p for p in parts if _on_car_during(p, logged_at)]
+    retired_ids = {p["part_id"] for p in affected if p.get("retired_at")}
+    history = [
+        h for h in query_all(
+            history_table,
+            IndexName="car-history-index",
+            KeyConditionExpression=Key("car_id").eq(car_id) & Key("replaced_at").gte(logged_at),
+        ) if h.get("part_id") in retired_ids
+    ] if retired_ids else []
+
+    # 3. ADD the difference, PART_WORKERS writes in flight at a time; note
+    #    what was not reached on the entry, or finish it
+    updated, history_updated, pending, history_pending, error = _apply(
+        dynamodb, scheduler, delta, [p["part_id"] for p in affected], [h["history_id"] for h in history], now,
+        active_only=False,
+    )
+    if pending or history_pending:
+        _mark_pending(miles_table, log_id, delta, pending, history_pending, correction=True)
+    elif _settle(miles_table, log_id):
+        if miles is None:
+            _forget(miles_table, log_id)
+        corrected = {k: v for k, v in corrected.items() if k not in PROGRESS_ATTRS}
+    _failure_stats(dynamodb, car_id, history_updated, delta)
+
+    # 4. Alerts: raise the ones more miles crossed into, re-evaluate alerted parts that lost miles
+    active = [p for p in updated.values() if p.get("active", True)]
+    alerts = _alerts(dynamodb, car_id, log_id, delta, active, now)
+
+    # 5. Invalidate derived data and tell replicas: one add_miles row for
+    #    the correction, skipping every part it did not reach
+    version = bump_car_version(cars_table, car_id)
+    rows = [changes.upsert("miles", public(corrected), "log_id") if miles is not None
+            else changes.delete("miles", log_id)]
+    if delta:
+        skipped = [p["part_id"] for p in parts if p["part_id"] not in updated]
+        rows.append(changes.add_miles(log_id, str(delta), skipped))
+    rows += [changes.upsert("history", h, "history_id") for h in history_updated]
+    changes.record(dynamodb.Table(CHANGE_LOG_TABLE), cars_table, car_id, version, rows)
+    if error is not None:
+        raise error
+
+    return {
+        "log": public(corrected) if miles is not None else None,
+        "delta": delta,
+        "parts_updated": len(updated),
+        "parts_pending": pending,
+        "history_updated": len(history_updated),
+        "history_pending": history_pending,
+        "alerts": alerts,
+    }
@@ -0,0 +1,171 @@
+"""
+Opt-in request profiling - canonical copy used by all Lambda functions.
+
+Two modes, both off unless configured through environment variables:
+
+  PROFILE_SAMPLE_RATE  fraction of invocations (0-1) run under cProfile;
+                       every sampled request is logged.
+  SLOW_REQUEST_MS      requests slower than this are logged. A stack
+                       sampler thread (every PROFILE_INTERVAL_MS, default
+                       10) runs alongside each request so there is a
+                       profile to report once it turns out to be slow.
+
+Each logged request is one JSON line ("type": "slow_request") with the
+top PROFILE_TOP_N (default 25) functions by cumulative time and the
+request's DynamoDB call timeline from metrics.py, so pagination,
+encoding and sorting costs can be told apart.
+
+With neither variable set begin() returns None and the request path is
+unchanged.
+
+Only one cProfile can be enabled per process (on Python 3.12+ it holds the
+interpreter-wide sys.monitoring profiler slot), so concurrent requests in
+one process (the local ASGI server, threaded tools) take turns: a sampled
+request that finds it in use is profiled by the stack sampler instead.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0) or 0)
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0) or 0)
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", 25))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 10))
+
+sink = metrics.stdout_sink
+
+# Held while a request runs under cProfile (see the module docstring)
+_cprofile = threading.Lock()
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    # Last two path components are enough to tell handlers, shared modules and libraries apart
+    short = "/".join(filename.replace("\\", "/").split("/")[-2:])
+    return f"{short}:{line}({name})"
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval, counting each function once per sample."""
+
+    def __init__(self, thread_id: int, interval_ms: float):
+        super().__init__(name="request-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.counts = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if key not in seen:
+                    seen.add(key)
+                    self.counts[key] += 1
+                frame = frame.f_back
+            self.samples += 1
+
+    def stop(self) -> list:
+        self._done.set()
+        self.join()
+        interval_ms = self.interval * 1000
+        return [
+            {
+                "function": _label(*key),
+                "cumulative_ms": round(count * interval_ms, 1),
+                "samples": count,
+            }
+            for key, count in self.counts.most_common(PROFILE_TOP_N)
+        ]
+
+
+class Profile:
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.profiler = None
+        self.sampler = None
+        if sampled and _cprofile.acquire(blocking=False):
+            try:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+            except ValueError:
+                # Another tool holds the profiler slot (a debugger, coverage)
+                self.profiler = None
+                _cprofile.release()
+        if self.profiler is None:
+            self.sampler = _StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS)
+            self.sampler.start()
+
+    def stop(self) -> list:
+        if self.profiler:
+            try:
+                self.profiler.disable()
+            finally:
+                _cprofile.release()
+            stats = pstats.Stats(self.profiler).stats
+            ranked = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP_N]
+            return [
+                {
+                    "function": _label(*key),
+                    "cumulative_ms": round(ct * 1000, 2),
+                    "own_ms": round(tt * 1000, 2),
+                    "calls": nc,
+                }
+                for key, (cc, nc, tt, ct, callers) in ranked
+            ]
+        return self.sampler.stop()
+
+
+def begin() -> Profile | None:
+    """Start profiling this invocation if a mode is enabled (and it is sampled)."""
+    if not (PROFILE_SAMPLE_RATE or SLOW_REQUEST_MS):
+        return None
+    sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    if not sampled and not SLOW_REQUEST_MS:
+        return None
+    return Profile(sampled)
+
+
+def end(profile: Profile | None, event: dict, context, resp: dict | None):
+    """Stop profiling and log the request if it was sampled or slow."""
+    if profile is None:
+        return
+    latency = (time.perf_counter() - profile.started) * 1000
+    top = profile.stop()
+    slow = bool(SLOW_REQUEST_MS) and latency >= SLOW_REQUEST_MS
+    if not (profile.sampled or slow):
+        return
+
+    invocation = metrics.current()
+    timeline = [
+        {"at_ms": at, "op": op, "target": target, "ms": ms}
+        for at, op, target, ms in (invocation.timeline if invocation else [])
+    ]
+    event = event or {}
+    sink(json.dumps({
+        "type": "slow_request",
+        "trigger": "sampled" if profile.sampled else "slow",
+        "profiler": "cProfile" if profile.profiler else "stack-sampler",
+        "Function": metrics.function_name(context),
+        "RequestId": getattr(context, "aws_request_id", None),
+        "Method": event.get("httpMethod"),
+        "Resource": event.get("resource"),
+        "Path": event.get("path"),
+        "StatusCode": (resp or {}).get("statusCode", 500),
+        "Latency": round(latency, 2),
+        "ResponseBytes": len((resp or {}).get("body") or ""),
+        "top": top,
+        "dynamodb_timeline": timeline,
+    }, default=str, separators=(",", ":")))
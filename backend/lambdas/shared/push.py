@@ -0,0 +1,140 @@
+"""
+Push notifications - canonical copy used by all Lambda functions.
+
+Browsers open a WebSocket to the push API
+(wss://<api>/<stage>?token=<jwt>&car_id=<car_id>); push/connect.py
+stores the connection under its car in the connections table:
+
+    connection_id (hash), car_id (car-index), email, connected_at, expires_at
+
+changes.record() publishes one compact event per version to every
+connection on the car:
+
+    {"type": "changes", "car_id": "...", "cursor": 42,
+     "changes": [{"entity": "part", "op": "upsert", "id": "..."}, ...]}
+
+Large versions (an upload) send only "count" and "truncated": true. The
+event is a nudge, not the data: clients fetch GET /cars/{car_id}/changes
+from their cursor, so a missed event is caught up by the next sync.
+
+Messages go out through a broker. By default it is the API Gateway
+management API at PUSH_ENDPOINT; tools install an in-process broker
+with use() (see backend/tools/memory_broker.py). Publishing never fails
+the request that triggered it; connections the broker reports gone are
+removed.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from db import resource, query_all
+
+CONNECTIONS_TABLE = os.environ.get("CONNECTIONS_TABLE")
+PUSH_ENDPOINT = os.environ.get("PUSH_ENDPOINT")
+MAX_EVENT_CHANGES = 50
+MAX_SENDERS = 8
+# API Gateway closes WebSocket connections after 2 hours; rows outlive a missed $disconnect by this much
+CONNECTION_TTL = 3 * 3600
+
+
+class Gone(Exception):
+    """The connection no longer exists."""
+
+
+class ApiGatewayBroker:
+    """Posts to WebSocket connections through the API Gateway management API."""
+
+    def __init__(self, endpoint: str):
+        self.client = boto3.client("apigatewaymanagementapi", endpoint_url=endpoint)
+
+    def send(self, connection_id: str, data: bytes):
+        try:
+            self.client.post_to_connection(ConnectionId=connection_id, Data=data)
+        except self.client.exceptions.GoneException:
+            raise Gone(connection_id)
+
+
+_broker = None
+
+
+def use(broker):
+    """Make publish() deliver through broker instead of API Gateway."""
+    global _broker
+    _broker = broker
+
+
+def broker():
+    """The process-wide broker, or None when there is no push API to post to."""
+    global _broker
+    if _broker is None and PUSH_ENDPOINT:
+        _broker = ApiGatewayBroker(PUSH_ENDPOINT)
+    return _broker
+
+
+def _table():
+    return resource().Table(CONNECTIONS_TABLE)
+
+
+def register(connection_id: str, car_id: str, email: str):
+    now = int(time.time())
+    _table().put_item(Item={
+        "connection_id": connection_id,
+        "car_id": car_id,
+        "email": email,
+        "connected_at": now,
+        "expires_at": now + CONNECTION_TTL,
+    })
+
+
+def unregister(connection_id: str):
+    _table().delete_item(Key={"connection_id": connection_id})
+
+
+def event(car_id: str, seq: int, changes: list) -> dict:
+    out = {"type": "changes", "car_id": car_id, "cursor": seq}
+    if len(changes) > MAX_EVENT_CHANGES:
+        out.update(count=len(changes), truncated=True)
+    else:
+        out["changes"] = [{"entity": c["entity"], "op": c["op"], "id": c["id"]} for c in changes]
+    return out
+
+
+def publish(car_id: str, seq: int, changes: list) -> int:
+    """Send the event for one version to the car's connections; returns how many got it."""
+    sender = broker()
+    if sender is None or not CONNECTIONS_TABLE:
+        return 0
+    try:
+        connections = query_all(
+            _table(),
+            IndexName="car-index",
+            KeyConditionExpression=Key("car_id").eq(car_id),
+            ProjectionExpression="connection_id",
+        )
+    except Exception as e:
+        print(json.dumps({"type": "push_error", "car_id": car_id, "error": str(e)}), flush=True)
+        return 0
+    if not connections:
+        return 0
+    data = json.dumps(event(car_id, seq, changes), separators=(",", ":")).encode()
+
+    def send(connection_id):
+        try:
+            try:
+                sender.send(connection_id, data)
+                return True
+            except Gone:
+                unregister(connection_id)
+        except Exception as e:
+            print(json.dumps({"type": "push_error", "connection_id": connection_id, "error": str(e)}), flush=True)
+        return False
+
+    ids = [c["connection_id"] for c in connections]
+    if len(ids) == 1:
+        return int(send(ids[0]))
+    with ThreadPoolExecutor(max_workers=min(MAX_SENDERS, len(ids))) as pool:
+        return sum(pool.map(send, ids))
@@ -0,0 +1,147 @@
+"""
+Per-user request rate limits - canonical copy used by all Lambda functions.
+
+Every authenticated request draws from a token bucket keyed by the user and
+the endpoint's class:
+
+    read    GET requests
+    write   other mutations
+    bulk    mutations that fan out into many writes (BULK below)
+
+Limits are (requests per second, burst) per role and class (LIMITS,
+overridable with the RATE_LIMITS JSON environment variable, e.g.
+'{"readonly": {"read": [5, 50]}}'). A request over the limit gets a 429
+with Retry-After.
+
+The buckets live in the rate limits table as GCRA items: one number, tat,
+the time (epoch ms) at which the bucket would be full again. Taking n
+tokens is a single conditional UpdateItem (no read), so concurrent
+containers share a bucket exactly. To keep that write off most requests a
+container takes LEASE tokens at a time and spends them locally, and once a
+bucket is known to be empty it answers 429s locally until Retry-After.
+Items expire through the table's TTL attribute (expires_at).
+"""
+import json
+import math
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from db import resource
+
+RATE_LIMITS_ENABLED = os.environ.get("RATE_LIMITS_ENABLED", "true").lower() != "false"
+RATE_LIMITS_TABLE = os.environ.get("RATE_LIMITS_TABLE")
+
+# role -> endpoint class -> (requests per second, burst)
+LIMITS = {
+    "admin": {"read": (20, 200), "write": (5, 50), "bulk": (0.2, 5)},
+    "readonly": {"read": (10, 100), "write": (1, 10), "bulk": (0.05, 2)},
+}
+for _role, _classes in json.loads(os.environ.get("RATE_LIMITS") or "{}").items():
+    for _cls, (_rate, _burst) in _classes.items():
+        LIMITS.setdefault(_role, dict(LIMITS["readonly"]))[_cls] = (float(_rate), int(_burst))
+
+# Tokens a container takes from the shared bucket per UpdateItem
+LEASE = {"read": 10, "write": 3, "bulk": 1}
+
+# (method, resource) of the bulk endpoints
+BULK = {
+    ("POST", "/cars/{car_id}/miles"),
+    ("PUT", "/cars/{car_id}/miles/{log_id}"),
+    ("DELETE", "/cars/{car_id}/miles/{log_id}"),
+    ("POST", "/cars/{car_id}/upload"),
+    ("POST", "/cars/{car_id}/telemetry"),
+    ("POST", "/cars/{car_id}/apply-template"),
+    ("POST", "/cars/{car_id}/clone"),
+    ("POST", "/templates"),
+    ("DELETE", "/templates/{template_id}"),
+}
+
+_lock = threading.Lock()
+_leases = {}    # bucket id -> tokens taken from the shared bucket, not yet spent
+_blocked = {}   # bucket id -> epoch ms until which the bucket is known to be empty
+
+
+def endpoint_class(event: dict) -> str | None:
+    """read, write or bulk; None for CORS preflights, which are not limited."""
+    method = event.get("httpMethod") or "GET"
+    if method == "OPTIONS":
+        return None
+    if method in ("GET", "HEAD"):
+        return "read"
+    if (method, event.get("resource")) in BULK:
+        return "bulk"
+    return "write"
+
+
+def _take(bucket_id: str, n: int, interval: float, burst: int, now: int) -> bool:
+    """Take n tokens from the shared bucket if it holds them (see the module docstring)."""
+    table = resource().Table(RATE_LIMITS_TABLE)
+    cost = math.ceil(n * interval)
+    expires_at = (now + math.ceil(burst * interval)) // 1000 + 3600
+    try:
+        # Bucket full (or new): it restarts from now
+        table.update_item(
+            Key={"bucket_id": bucket_id},
+            UpdateExpression="SET tat = :t, expires_at = :e",
+            ConditionExpression="attribute_not_exists(tat) OR tat < :now",
+            ExpressionAttributeValues={":t": now + cost, ":e": expires_at, ":now": now},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    try:
+        table.update_item(
+            Key={"bucket_id": bucket_id},
+            UpdateExpression="SET tat = tat + :c, expires_at = :e",
+            ConditionExpression="tat <= :limit",
+            ExpressionAttributeValues={":c": cost, ":e": expires_at,
+                                       ":limit": now + math.floor((burst - n) * interval)},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    return False
+
+
+def _next_token_at(bucket_id: str, interval: float, burst: int, now: int) -> int:
+    """Epoch ms at which the (empty) bucket has a token again."""
+    item = resource().Table(RATE_LIMITS_TABLE).get_item(
+        Key={"bucket_id": bucket_id}, ConsistentRead=True,
+    ).get("Item") or {}
+    return max(now + 1, int(item.get("tat", now)) - math.floor((burst - 1) * interval))
+
+
+def check(user: dict, event: dict) -> int | None:
+    """None when the request may go ahead, else the seconds to send as Retry-After."""
+    cls = endpoint_class(event)
+    if not RATE_LIMITS_ENABLED or not cls:
+        return None
+    rate, burst = LIMITS.get(user.get("role"), LIMITS["readonly"])[cls]
+    interval = 1000 / rate
+    bucket_id = f"{user['user_id']}#{cls}"
+    now = int(time.time() * 1000)
+
+    with _lock:
+        blocked_until = _blocked.get(bucket_id, 0)
+        if blocked_until > now:
+            return math.ceil((blocked_until - now) / 1000)
+        if _leases.get(bucket_id):
+            _leases[bucket_id] -= 1
+            return None
+
+    lease = min(LEASE[cls], burst)
+    for n in dict.fromkeys((lease, 1)):
+        if _take(bucket_id, n, interval, burst, now):
+            if n > 1:
+                with _lock:
+                    _leases[bucket_id] = _leases.get(bucket_id, 0) + n - 1
+            return None
+
+    blocked_until = _next_token_at(bucket_id, interval, burst, now)
+    with _lock:
+        _blocked[bucket_id] = blocked_until
+    return math.ceil((blocked_until - now) / 1000)
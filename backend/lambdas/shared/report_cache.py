@@ -0,0 +1,135 @@
+"""
+Persistent report result cache - canonical copy used by all Lambda functions.
+
+Report bodies are stored in the report cache table under
+(car_id, "<report>#<params>") together with the car data_version they were
+computed from. An entry is only served while that version is still the car's
+current version, so the effective key is (car_id, report, params, version);
+mutations never touch the cache, they just bump the car version.
+
+The car's version and all requested entries are read in one BatchGetItem,
+so a repeat view costs a single small round trip. Entries expire through
+the table's TTL attribute (expires_at).
+
+Reports read through GSIs (the per-entity tables) are eventually
+consistent: right after a bump they may not include the writes before
+it yet. Results loaded that way are only stored when settled() holds -
+the version is still current after the load and at least SETTLE_MS old -
+so a stale result is never cached under a version it does not reflect.
+Strongly consistent loads (the single-table layout) are always stored.
+"""
+import json
+import os
+import time
+import zlib
+
+from botocore.exceptions import ClientError
+from utils import encode_json
+from versions import car_version_from_item
+
+CARS_TABLE = os.environ.get("CARS_TABLE")
+REPORT_CACHE_TABLE = os.environ.get("REPORT_CACHE_TABLE")
+REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", 7 * 86400))
+
+# Compressed bodies above this are not cached (DynamoDB items max out at 400 KB).
+MAX_ENTRY_BYTES = 350 * 1024
+# A version bumped more recently than this may not be reflected in GSI reads yet
+# (the same window changes.read() gives writers)
+SETTLE_MS = 5000
+
+
+def cache_key(report: str, params: dict) -> str:
+    param_str = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+    return f"{report}#{param_str}"
+
+
+def _encode(body: dict) -> bytes:
+    return zlib.compress(encode_json(body).encode())
+
+
+def _decode(raw) -> dict:
+    return json.loads(zlib.decompress(getattr(raw, "value", raw)))
+
+
+def lookup(dynamodb, car_id: str, keys: dict, version: int | None = None) -> tuple:
+    """Fetch the car version and any cache entries still valid for it.
+
+    keys maps report name -> cache_key. Pass version if the caller already
+    read it (e.g. for an ETag) and only the cache entries are fetched.
+    Returns (version, {report: body}); version is None when the car does
+    not exist or caching is disabled.
+    """
+    if not (CARS_TABLE and REPORT_CACHE_TABLE):
+        return version, {}
+
+    request = {
+        REPORT_CACHE_TABLE: {
+            "Keys": [{"car_id": car_id, "cache_key": k} for k in keys.values()],
+        },
+    }
+    if version is None:
+        request[CARS_TABLE] = {
+            "Keys": [{"car_id": car_id}],
+            "ProjectionExpression": "car_id, data_version",
+        }
+    found = {CARS_TABLE: [], REPORT_CACHE_TABLE: []}
+    while request:
+        resp = dynamodb.batch_get_item(RequestItems=request)
+        for table, items in resp.get("Responses", {}).items():
+            found[table].extend(items)
+        request = resp.get("UnprocessedKeys") or None
+
+    if version is None:
+        version = car_version_from_item(found[CARS_TABLE][0] if found[CARS_TABLE] else None)
+    if version is None:
+        return None, {}
+
+    by_key = {e["cache_key"]: e for e in found[REPORT_CACHE_TABLE]}
+    hits = {}
+    for report, key in keys.items():
+        entry = by_key.get(key)
+        if entry and int(entry.get("data_version", -1)) == version:
+            hits[report] = _decode(entry["body"])
+    return version, hits
+
+
+def settled(dynamodb, car_id: str, version: int | None) -> bool:
+    """Whether version is still the car's current one and at least SETTLE_MS old."""
+    if version is None or not CARS_TABLE:
+        return False
+    item = dynamodb.Table(CARS_TABLE).get_item(
+        Key={"car_id": car_id},
+        ProjectionExpression="car_id, data_version, data_version_at",
+        ConsistentRead=True,
+    ).get("Item")
+    if car_version_from_item(item) != version:
+        return False
+    return time.time() * 1000 - int(item.get("data_version_at", 0)) >= SETTLE_MS
+
+
+def store(dynamodb, car_id: str, bodies: dict, keys: dict, version: int | None):
+    """Cache freshly computed report bodies for the given car version."""
+    if version is None or not REPORT_CACHE_TABLE:
+        return
+    table = dynamodb.Table(REPORT_CACHE_TABLE)
+    expires_at = int(time.time()) + REPORT_CACHE_TTL
+    for report, body in bodies.items():
+        blob = _encode(body)
+        if len(blob) > MAX_ENTRY_BYTES:
+            continue
+        try:
+            # Never let a slow reader overwrite an entry for a newer version.
+            table.put_item(
+                Item={
+                    "car_id": car_id,
+                    "cache_key": keys[report],
+                    "data_version": version,
+                    "body": blob,
+                    "expires_at": expires_at,
+                },
+                ConditionExpression="attribute_not_exists(data_version) OR data_version < :v",
+                ExpressionAttributeValues={":v": version},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
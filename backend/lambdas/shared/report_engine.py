@@ -0,0 +1,283 @@
+"""
+Single-pass reports engine shared by the report Lambdas.
+
+A car's parts and part history are fetched once (concurrently when both are
+needed) and folded into one per-part_number index. Each report is then a
+pass over that index instead of its own pair of DynamoDB queries, so any
+combination of reports costs the same reads as the most expensive one.
+
+Under the single-table layout parts and history come from the car's
+partition instead, one Query of each prefix (single_table.query_car()).
+
+Results are memoized per car data version through report_cache, so a
+repeat view of an unchanged car costs one small read (see get_reports).
+Under the single-table layout the load is strongly consistent; otherwise
+a result is only cached once its version has settled (report_cache.settled()).
+
+Only the attributes the reports read are fetched (PART_ATTRS,
+HISTORY_ATTRS); high_miles returns whole part items unless narrowed with
+?fields=.
+
+Report names (as accepted by ?include=):
+  - high_miles      active parts sorted by miles_used descending
+  - mbf             miles between failures per part_number
+  - likely_to_fail  risk score of each active part vs. its part_number's avg MBF
+"""
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+from db import query_all, projection, trim
+import report_cache
+import single_table
+
+REPORTS = ("high_miles", "mbf", "likely_to_fail")
+NEEDS_HISTORY = {"mbf", "likely_to_fail"}
+# Query params each report's output depends on (part of its cache key)
+REPORT_PARAMS = {"high_miles": ("limit", "group", "fields")}
+RISK_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3, "UNKNOWN": 4}
+
+# Attributes the reports read from parts and history items
+PART_ATTRS = ("part_id", "part_number", "part_name", "part_group", "part_location", "miles_used", "active")
+HISTORY_ATTRS = ("part_number", "reason", "miles_at_retirement", "part_name", "replaced_at", "note")
+
+
+def to_float(value) -> float:
+    return float(str(value))
+
+
+class CarIndex:
+    """Active parts and failure history of one car, grouped by part_number."""
+
+    def __init__(self, car_id: str, parts: list, history: list):
+        self.car_id = car_id
+        # [(part, miles_used as float)] for active parts, in query order
+        self.active = []
+        # part_number -> [miles_used] of active parts
+        self.active_miles_by_pn = defaultdict(list)
+        # part_number (None when the history row has none) -> [failure dict]
+        self.failures_by_pn = defaultdict(list)
+
+        for part in parts:
+            if not part.get("active", True):
+                continue
+            miles = to_float(part.get("miles_used", 0))
+            self.active.append((part, miles))
+            self.active_miles_by_pn[part.get("part_number", "")].append(miles)
+
+        for h in history:
+            if h.get("reason") != "failure":
+                continue
+            self.failures_by_pn[h.get("part_number")].append({
+                "miles_at_failure": to_float(h.get("miles_at_retirement", 0)),
+                "part_name": h.get("part_name", ""),
+                "replaced_at": h.get("replaced_at", ""),
+                "note": h.get("note", ""),
+            })
+
+    def avg_mbf(self, part_number):
+        failures = self.failures_by_pn.get(part_number) if part_number else None
+        if not failures:
+            return None
+        return sum(f["miles_at_failure"] for f in failures) / len(failures)
+
+
+def parse_include(value) -> list:
+    """Split ?include=a,b into report names; raises ValueError on unknown names."""
+    if not value:
+        return list(REPORTS)
+    names = [n.strip() for n in value.split(",") if n.strip()]
+    unknown = [n for n in names if n not in REPORTS]
+    if unknown:
+        raise ValueError(f"Unknown report(s): {', '.join(unknown)}. Valid: {', '.join(REPORTS)}")
+    return list(dict.fromkeys(names))
+
+
+def load_index(parts_table, history_table, car_id: str, include, fields=None,
+               consistent: bool = False) -> CarIndex:
+    """Fetch everything the requested reports need in one round of queries.
+
+    Whole part items are only read when high_miles is requested without
+    fields; otherwise parts and history are projected to what the reports use.
+    consistent makes the queries strongly consistent (see single_table.consistent()).
+    """
+    if "high_miles" in include and fields is None:
+        part_projection = {}
+    else:
+        part_projection = projection(fields or [], PART_ATTRS)
+    read = {"ConsistentRead": True} if consistent else {}
+
+    def fetch_parts():
+        return query_all(
+            parts_table,
+            IndexName="car-index",
+            KeyConditionExpression=Key("car_id").eq(car_id),
+            **part_projection,
+            **read,
+        )
+
+    def fetch_history():
+        return query_all(
+            history_table,
+            IndexName="car-history-index",
+            KeyConditionExpression=Key("car_id").eq(car_id),
+            **projection([], HISTORY_ATTRS),
+            **read,
+        )
+
+    if NEEDS_HISTORY & set(include) and single_table.combinable(parts_table, history_table):
+        # Whole items, or the union of both projections
+        attrs = projection(fields or [], PART_ATTRS + HISTORY_ATTRS) if part_projection else {}
+        parts, history = single_table.query_car(car_id, (parts_table, history_table), **attrs, **read)
+        return CarIndex(car_id, parts, history)
+    if NEEDS_HISTORY & set(include):
+        # Run in copies of this context so the queries count towards the request's metrics
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            parts_future = pool.submit(contextvars.copy_context().run, fetch_parts)
+            history_future = pool.submit(contextvars.copy_context().run, fetch_history)
+            return CarIndex(car_id, parts_future.result(), history_future.result())
+    return CarIndex(car_id, fetch_parts(), [])
+
+
+# ─── Reports ──────────────────────────────────────────────────────────────────
+
+def high_miles(index: CarIndex, limit: int = 20, group: str | None = None, fields=None) -> dict:
+    active = index.active
+    if group:
+        active = [(p, m) for p, m in active if p.get("part_group") == group]
+    active = sorted(active, key=lambda pm: pm[1], reverse=True)
+    top_parts = trim([p for p, _ in active[:limit]], fields, keep=("part_id",))
+    return {
+        "report": "high_miles",
+        "car_id": index.car_id,
+        "parts": top_parts,
+        "count": len(top_parts),
+    }
+
+
+def miles_between_failures(index: CarIndex) -> dict:
+    mbf_report = []
+    for part_number, failures in index.failures_by_pn.items():
+        part_number = "unknown" if part_number is None else part_number
+        miles_list = [f["miles_at_failure"] for f in failures]
+        avg_mbf = sum(miles_list) / len(miles_list)
+
+        current_miles = index.active_miles_by_pn.get(part_number, [])
+        pct_of_avg = None
+        if current_miles and avg_mbf > 0:
+            pct_of_avg = round((max(current_miles) / avg_mbf) * 100, 1)
+
+        mbf_report.append({
+            "part_number": part_number,
+            "part_name": failures[0]["part_name"],
+            "failure_count": len(failures),
+            "avg_miles_between_failures": round(avg_mbf, 1),
+            "min_miles_at_failure": round(min(miles_list), 1),
+            "max_miles_at_failure": round(max(miles_list), 1),
+            "current_active_miles": current_miles,
+            "highest_active_pct_of_avg_mbf": pct_of_avg,
+            "failures": failures,
+        })
+
+    # Sort by avg MBF ascending (most concerning first)
+    mbf_report.sort(key=lambda x: x["avg_miles_between_failures"])
+    return {
+        "report": "miles_between_failures",
+        "car_id": index.car_id,
+        "data": mbf_report,
+        "count": len(mbf_report),
+    }
+
+
+def risk_label(risk_score: float) -> str:
+    return (
+        "CRITICAL" if risk_score >= 1.0 else
+        "HIGH" if risk_score >= 0.8 else
+        "MEDIUM" if risk_score >= 0.5 else
+        "LOW"
+    )
+
+
+def likely_to_fail(index: CarIndex) -> dict:
+    avg_by_pn = {}
+    result = []
+    for part, current_miles in index.active:
+        pn = part.get("part_number", "")
+        if pn not in avg_by_pn:
+            avg_by_pn[pn] = index.avg_mbf(pn)
+        avg_mbf = avg_by_pn[pn]
+
+        if avg_mbf and avg_mbf > 0:
+            risk_score = round(current_miles / avg_mbf, 3)
+            label = risk_label(risk_score)
+        else:
+            risk_score = 0.0
+            label = "UNKNOWN"
+
+        result.append({
+            "part_id": part["part_id"],
+            "part_number": pn,
+            "part_name": part.get("part_name", ""),
+            "part_group": part.get("part_group", ""),
+            "part_location": part.get("part_location", ""),
+            "current_miles": current_miles,
+            "avg_mbf": round(avg_mbf, 1) if avg_mbf else None,
+            "risk_score": risk_score,
+            "risk_label": label,
+            "failure_history_count": len(index.failures_by_pn.get(pn, [])) if pn else 0,
+        })
+
+    # Sort: CRITICAL first, then by risk_score desc
+    result.sort(key=lambda x: (RISK_ORDER[x["risk_label"]], -x["risk_score"]))
+    return {
+        "report": "likely_to_fail",
+        "car_id": index.car_id,
+        "parts": result,
+        "count": len(result),
+    }
+
+
+def run_reports(index: CarIndex, include, limit: int = 20, group: str | None = None,
+                fields=None) -> dict:
+    """Compute each requested report from the same index."""
+    builders = {
+        "high_miles": lambda: high_miles(index, limit=limit, group=group, fields=fields),
+        "mbf": lambda: miles_between_failures(index),
+        "likely_to_fail": lambda: likely_to_fail(index),
+    }
+    return {name: builders[name]() for name in include}
+
+
+def get_reports(dynamodb, parts_table, history_table, car_id: str, include,
+                limit: int = 20, group: str | None = None, fields=None,
+                version: int | None = None) -> tuple:
+    """Serve reports from the version-keyed cache, computing only the misses.
+
+    fields narrows the part items high_miles returns (see db.parse_fields).
+    version is the car's data_version if the caller already has it.
+    Returns (version, {report: body}); version is the one the bodies were
+    computed at (for the ETag), or None when that is not known - a GSI
+    load of a version that has not settled.
+    """
+    params = {"limit": limit, "group": group, "fields": ",".join(fields) if fields else None}
+    keys = {
+        name: report_cache.cache_key(name, {p: params[p] for p in REPORT_PARAMS.get(name, ())})
+        for name in include
+    }
+    version, reports = report_cache.lookup(dynamodb, car_id, keys, version)
+
+    missing = [name for name in include if name not in reports]
+    if missing:
+        tables = (parts_table, history_table) if NEEDS_HISTORY & set(missing) else (parts_table,)
+        consistent = single_table.consistent(*tables)
+        index = load_index(parts_table, history_table, car_id, missing, fields=fields, consistent=consistent)
+        fresh = run_reports(index, missing, limit=limit, group=group, fields=fields)
+        # The version read before a consistent load is covered by it; a GSI
+        # load only once that version has settled
+        if consistent or report_cache.settled(dynamodb, car_id, version):
+            report_cache.store(dynamodb, car_id, fresh, keys, version)
+        else:
+            version = None
+        reports.update(fresh)
+    return version, {name: reports[name] for name in include}
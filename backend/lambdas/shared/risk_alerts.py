@@ -0,0 +1,170 @@
+"""
+Incremental risk alerts - canonical copy used by all Lambda functions.
+
+The likely_to_fail report scores a part as miles_used / the average miles
+at failure of its part_number on the car, recomputing every score from
+all parts and history on each view. This module keeps just enough state
+to evaluate that score as miles are logged:
+
+    failure stats table   car_id (hash), part_number (range)
+                          failures, failure_miles  (avg MBF = failure_miles / failures)
+    alerts table          car_id (hash), part_id (range)
+                          level, severity, risk_score, miles, avg_mbf, log_id, raised_at, ...
+
+replace_part keeps the failure stats with an atomic ADD when a part is
+retired for "failure". log_miles knows each part's miles before and
+after the session, so with the car's thresholds (one Query) evaluate()
+finds the parts that crossed a risk level (report_engine.risk_label) and
+raise_alerts() writes them, conditioned on the stored severity: a part
+alerts once per level it reaches, however many sessions it stays there.
+Replacing or deleting a part clears its alert; editing its miles_used
+by hand re-evaluates it (refresh_part()).
+
+Thresholds only move when a failure is recorded, so a part pushed over
+one by a new failure alerts at the next miles log.
+backend/tools/rebuild_indexes.py recomputes the failure stats from history.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from db import query_all
+from report_engine import risk_label, to_float
+
+SEVERITY = {"LOW": 0, "MEDIUM": 1, "HIGH": 2, "CRITICAL": 3}
+
+
+def record_failure(stats_table, car_id: str, part_number: str, miles):
+    if not part_number:
+        return
+    stats_table.update_item(
+        Key={"car_id": car_id, "part_number": part_number},
+        UpdateExpression="ADD failures :one, failure_miles :m",
+        ExpressionAttributeValues={":one": 1, ":m": Decimal(str(miles))},
+    )
+
+
+def stats_from_history(history) -> dict:
+    """(car_id, part_number) -> [failures, failure_miles] over history items."""
+    stats = defaultdict(lambda: [0, Decimal(0)])
+    for h in history:
+        if h.get("reason") != "failure" or not h.get("part_number"):
+            continue
+        entry = stats[(h["car_id"], h["part_number"])]
+        entry[0] += 1
+        entry[1] += Decimal(str(h.get("miles_at_retirement", 0)))
+    return stats
+
+
+def write_stats(stats_table, history):
+    """Replace the failure stats of every (car, part_number) in history (seeding, rebuilds)."""
+    with stats_table.batch_writer() as batch:
+        for (car_id, part_number), (failures, miles) in stats_from_history(history).items():
+            batch.put_item(Item={
+                "car_id": car_id,
+                "part_number": part_number,
+                "failures": failures,
+                "failure_miles": miles,
+            })
+
+
+def thresholds_from_rows(rows) -> dict:
+    return {
+        row["part_number"]: to_float(row["failure_miles"]) / int(row["failures"])
+        for row in rows
+        if int(row.get("failures", 0)) > 0 and to_float(row["failure_miles"]) > 0
+    }
+
+
+def thresholds(stats_table, car_id: str) -> dict:
+    """part_number -> average miles at failure on this car."""
+    return thresholds_from_rows(query_all(stats_table, KeyConditionExpression=Key("car_id").eq(car_id)))
+
+
+def evaluate(part: dict, old_miles, new_miles, avg_by_pn: dict) -> dict | None:
+    """The alert for a part whose miles went from old_miles to new_miles, if it crossed a level."""
+    avg_mbf = avg_by_pn.get(part.get("part_number", ""))
+    if not avg_mbf:
+        return None
+    old_level = risk_label(to_float(old_miles) / avg_mbf)
+    score = round(to_float(new_miles) / avg_mbf, 3)
+    level = risk_label(score)
+    if SEVERITY[level] <= SEVERITY[old_level]:
+        return None
+    return {
+        "part_id": part["part_id"],
+        "part_number": part.get("part_number", ""),
+        "part_name": part.get("part_name", ""),
+        "part_group": part.get("part_group", ""),
+        "part_location": part.get("part_location", ""),
+        "level": level,
+        "severity": SEVERITY[level],
+        "risk_score": Decimal(str(score)),
+        "miles": Decimal(str(new_miles)),
+        "avg_mbf": Decimal(str(round(avg_mbf, 1))),
+    }
+
+
+def raise_alerts(alerts_table, car_id: str, alerts: list, log_id: str | None, now: str) -> list:
+    """Write alerts not already raised at their level or higher; returns the ones written.
+
+    log_id is the miles session that raised them (None for a backfill).
+    """
+    raised = []
+    for alert in alerts:
+        item = {**alert, "car_id": car_id, "raised_at": now}
+        if log_id:
+            item["log_id"] = log_id
+        try:
+            alerts_table.put_item(
+                Item=item,
+                ConditionExpression="attribute_not_exists(part_id) OR severity < :s",
+                ExpressionAttributeValues={":s": alert["severity"]},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                continue
+            raise
+        raised.append(alert)
+    return raised
+
+
+def refresh_part(alerts_table, stats_table, car_id: str, part: dict, now: str) -> dict | None:
+    """Re-evaluate a part whose miles_used was edited by hand.
+
+    Its alert is raised, lowered or cleared to match its current score;
+    returns the alert if one was written.
+    """
+    rows = []
+    if part.get("part_number"):
+        stats = stats_table.get_item(Key={"car_id": car_id, "part_number": part["part_number"]}).get("Item")
+        rows = [stats] if stats else []
+    alert = evaluate(part, 0, part.get("miles_used", 0), thresholds_from_rows(rows))
+    if alert is None:
+        clear(alerts_table, car_id, part["part_id"])
+        return None
+    try:
+        alerts_table.put_item(
+            Item={**alert, "car_id": car_id, "raised_at": now},
+            ConditionExpression="attribute_not_exists(part_id) OR severity <> :s",
+            ExpressionAttributeValues={":s": alert["severity"]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        raise
+    return alert
+
+
+def clear(alerts_table, car_id: str, part_id: str):
+    alerts_table.delete_item(Key={"car_id": car_id, "part_id": part_id})
+
+
+def list_alerts(alerts_table, car_id: str, min_level: str = "MEDIUM") -> list:
+    """The car's alerts at min_level or above, most severe first."""
+    rows = query_all(alerts_table, KeyConditionExpression=Key("car_id").eq(car_id))
+    rows = [r for r in rows if int(r["severity"]) >= SEVERITY[min_level]]
+    rows.sort(key=lambda r: (-int(r["severity"]), -to_float(r["risk_score"])))
+    return rows
@@ -0,0 +1,233 @@
+"""
+Paced, retrying writes for bulk paths - canonical copy used by all Lambda functions.
+
+Handlers that fan out many writes (upload_spreadsheet, log_miles, the BOM
+copies in bom.py) send them through a WriteScheduler instead of calling the
+table directly:
+
+  - pacing: a token bucket per table admits WRITE_RATE writes/second
+    (bursts of WRITE_BURST). The rate adapts AIMD-style: it is halved
+    when DynamoDB throttles and grows by about WRITE_RATE_STEP per second
+    while writes succeed. Buckets live at module level, so a warm
+    container that was just throttled starts the next job cautiously.
+  - retries: a throttled write is retried with full-jitter exponential
+    backoff, up to WRITE_MAX_ATTEMPTS attempts (on top of botocore's
+    own retries). A BatchWriteItem's UnprocessedItems are DynamoDB
+    shedding load and are retried the same way.
+  - deadline: the invocation's budget is context.get_remaining_time_in_millis(),
+    capped at API_TIMEOUT_MS (API Gateway gives up on a request after 29 s,
+    however long the Lambda may run), minus DEADLINE_RESERVE_MS, kept back
+    so the handler can still record and report what it did. When a write could not start (or retry)
+    within the budget, write() raises BudgetExhausted and the handler
+    returns partial progress instead of being killed mid-way.
+"""
+import os
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+WRITE_RATE = float(os.environ.get("WRITE_RATE", 1000))
+WRITE_MIN_RATE = float(os.environ.get("WRITE_MIN_RATE", 10))
+WRITE_MAX_RATE = float(os.environ.get("WRITE_MAX_RATE", 4000))
+WRITE_BURST = float(os.environ.get("WRITE_BURST", 100))
+WRITE_RATE_STEP = float(os.environ.get("WRITE_RATE_STEP", 50))
+WRITE_MAX_ATTEMPTS = int(os.environ.get("WRITE_MAX_ATTEMPTS", 8))
+DEADLINE_RESERVE_MS = int(os.environ.get("DEADLINE_RESERVE_MS", 2000))
+API_TIMEOUT_MS = int(os.environ.get("API_TIMEOUT_MS", 29000))
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 2.0
+# Throttles arriving together (one burst) cut the rate once
+DECREASE_COOLDOWN = 0.2
+
+THROTTLE_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+
+class BudgetExhausted(Exception):
+    """A write was not attempted (or not retried) because the budget ran out."""
+
+
+def is_throttle(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response["Error"]["Code"] in THROTTLE_CODES
+
+
+class _Bucket:
+    """Token bucket whose refill rate follows additive-increase / multiplicative-decrease."""
+
+    def __init__(self):
+        self.rate = WRITE_RATE
+        self.tokens = WRITE_BURST
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(WRITE_BURST, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n: int = 1) -> float:
+        """Take n tokens; returns how long to wait before using them."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= n
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, n: int = 1):
+        with self.lock:
+            self.tokens += n
+
+    def succeeded(self, n: int = 1):
+        with self.lock:
+            # rate/s successes each adding STEP/rate -> about STEP per second
+            self.rate = min(WRITE_MAX_RATE, self.rate + n * WRITE_RATE_STEP / self.rate)
+
+    def throttled(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease < DECREASE_COOLDOWN:
+                return
+            self.last_decrease = now
+            self._refill(now)
+            self.rate = max(WRITE_MIN_RATE, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(name: str) -> _Bucket:
+    with _buckets_lock:
+        return _buckets.setdefault(name, _Bucket())
+
+
+class WriteScheduler:
+    """Paces and retries one invocation's writes within its time budget."""
+
+    def __init__(self, context=None, reserve_ms: int = DEADLINE_RESERVE_MS):
+        remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if remaining:
+            self.deadline = time.monotonic() + (min(remaining(), API_TIMEOUT_MS) - reserve_ms) / 1000
+        else:
+            self.deadline = float("inf")
+        self.writes = 0
+        self.throttles = 0
+
+    def remaining_ms(self) -> float:
+        return max(0.0, (self.deadline - time.monotonic()) * 1000)
+
+    def _sleep(self, seconds: float):
+        if time.monotonic() + seconds > self.deadline:
+            raise BudgetExhausted("time budget exhausted")
+        if seconds:
+            time.sleep(seconds)
+
+    def write(self, table, method: str, **kwargs):
+        """Call table.<method>(**kwargs) paced by the table's bucket, retrying throttles.
+
+        Raises BudgetExhausted when the write cannot be made before the
+        deadline; any other error is raised as is.
+        """
+        bucket = _bucket(table.name)
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            wait = bucket.reserve()
+            try:
+                self._sleep(wait)
+            except BudgetExhausted:
+                bucket.refund()
+                raise
+            try:
+                result = getattr(table, method)(**kwargs)
+            except ClientError as e:
+                if not is_throttle(e):
+                    raise
+                self.throttles += 1
+                bucket.throttled()
+                self._sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            bucket.succeeded()
+            self.writes += 1
+            return result
+        raise BudgetExhausted(f"still throttled after {WRITE_MAX_ATTEMPTS} attempts")
+
+    def batch_write(self, dynamodb, table_name: str, requests: list) -> list:
+        """BatchWriteItem requests (at most 25) to table_name, paced and retried like write().
+
+        Returns the requests left unwritten when the budget ran out or
+        DynamoDB kept them unprocessed through every attempt; [] when all
+        were written. Any other error is raised as is.
+        """
+        bucket = _bucket(table_name)
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            wait = bucket.reserve(len(requests))
+            try:
+                self._sleep(wait)
+            except BudgetExhausted:
+                bucket.refund(len(requests))
+                return requests
+            try:
+                resp = dynamodb.batch_write_item(RequestItems={table_name: requests})
+            except ClientError as e:
+                if not is_throttle(e):
+                    raise
+                left = requests
+            else:
+                left = (resp.get("UnprocessedItems") or {}).get(table_name) or []
+                self.writes += len(requests) - len(left)
+                if not left:
+                    bucket.succeeded(len(requests))
+                    return []
+            self.throttles += 1
+            bucket.throttled()
+            requests = left
+            try:
+                self._sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            except BudgetExhausted:
+                return requests
+        return requests
+
+    def batch_writer(self, dynamodb, table_name: str) -> "_BatchWriter":
+        """Like Table.batch_writer(), but written with batch_write() when the block ends.
+
+        Raises BudgetExhausted at the end of the with block when any of the
+        writes were left unwritten.
+        """
+        return _BatchWriter(self, dynamodb, table_name)
+
+
+class _BatchWriter:
+    """Collects put_item/delete_item calls for WriteScheduler.batch_writer()."""
+
+    BATCH_SIZE = 25  # BatchWriteItem's limit
+
+    def __init__(self, scheduler: WriteScheduler, dynamodb, table_name: str):
+        self.scheduler = scheduler
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.requests = []
+
+    def put_item(self, Item):
+        self.requests.append({"PutRequest": {"Item": Item}})
+
+    def delete_item(self, Key):
+        self.requests.append({"DeleteRequest": {"Key": Key}})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return False
+        left = 0
+        for start in range(0, len(self.requests), self.BATCH_SIZE):
+            left += len(self.scheduler.batch_write(
+                self.dynamodb, self.table_name, self.requests[start:start + self.BATCH_SIZE],
+            ))
+        if left:
+            raise BudgetExhausted(f"{left} writes to {self.table_name} left unwritten")
+        return False
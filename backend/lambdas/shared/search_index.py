@@ -0,0 +1,168 @@
+"""
+Parts search index - canonical copy used by all Lambda functions.
+
+Every part is broken into terms: the lower-cased alphanumeric tokens of
+its part_name, part_number, purchased_from and extra_fields values. Each
+(term, part) pair is one posting row in the search index table:
+
+    bucket  (hash)   first BUCKET_CHARS characters of the term
+    entry   (range)  "<term>#<car_id>#<part_id>"
+    part_id, car_id, active, weight
+
+Keying postings by the term's leading characters keeps every term that
+shares a prefix in one partition, sorted by term, so an exact term
+(begins_with "<term>#", or "<term>#<car_id>#" for one car) and a prefix
+(begins_with "<prefix>") are each a single Query range. A search reads
+only the postings that match, however large the fleet is.
+
+Handlers that write parts keep the index in step: index_part() after a
+put or update (given the previous item, so terms the part lost are
+deleted), remove_part() after a delete. The index is derived data;
+backend/tools/rebuild_indexes.py rebuilds it from the parts table.
+"""
+import re
+
+from boto3.dynamodb.conditions import Key, Attr
+
+from db import query_all
+
+BUCKET_CHARS = 2
+MAX_TERM_CHARS = 64
+MAX_QUERY_TERMS = 8
+# A term's weight is that of the most significant field it appears in
+FIELD_WEIGHTS = {"part_number": 4, "part_name": 3, "purchased_from": 2}
+EXTRA_FIELD_WEIGHT = 1
+# Matching only as a prefix ("bear" -> "bearing") scores this fraction of an exact match
+PREFIX_FACTOR = 0.5
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list:
+    return _TOKEN.findall(str(text).lower())
+
+
+def terms(part: dict | None) -> dict:
+    """term -> weight for every indexed token of a part."""
+    out = {}
+    if not part:
+        return out
+
+    def add(text, weight):
+        for term in tokenize(text):
+            if len(term) <= MAX_TERM_CHARS and weight > out.get(term, 0):
+                out[term] = weight
+
+    for field, weight in FIELD_WEIGHTS.items():
+        add(part.get(field) or "", weight)
+    for value in (part.get("extra_fields") or {}).values():
+        add(value, EXTRA_FIELD_WEIGHT)
+    return out
+
+
+def _key(term: str, part: dict) -> dict:
+    return {"bucket": term[:BUCKET_CHARS], "entry": f"{term}#{part['car_id']}#{part['part_id']}"}
+
+
+def _write(batch, part: dict | None, previous: dict | None):
+    new = terms(part)
+    old = terms(previous)
+    for term in old.keys() - new.keys():
+        batch.delete_item(Key=_key(term, previous))
+    same_status = previous is not None and previous.get("active", True) == part.get("active", True)
+    for term, weight in new.items():
+        if same_status and old.get(term) == weight:
+            continue
+        batch.put_item(Item={
+            **_key(term, part),
+            "part_id": part["part_id"],
+            "car_id": part["car_id"],
+            "active": bool(part.get("active", True)),
+            "weight": weight,
+        })
+
+
+def index_part(index_table, part: dict, previous: dict | None = None, batch=None):
+    """Write a part's postings; previous is the item before this change, if any.
+
+    batch, if given, is the batch writer to use instead of the table's own
+    (e.g. WriteScheduler.batch_writer() for paced bulk paths).
+    """
+    if batch is not None:
+        _write(batch, part, previous)
+        return
+    with index_table.batch_writer() as batch:
+        _write(batch, part, previous)
+
+
+def index_parts(index_table, parts):
+    """Index new parts in bulk (BOM copies, rebuilds)."""
+    with index_table.batch_writer() as batch:
+        for part in parts:
+            _write(batch, part, None)
+
+
+def remove_part(index_table, part: dict):
+    with index_table.batch_writer() as batch:
+        for term in terms(part):
+            batch.delete_item(Key=_key(term, part))
+
+
+def parse_query(q) -> list:
+    """Split ?q= into distinct terms. Raises ValueError when there is nothing to search for."""
+    tokens = list(dict.fromkeys(t for t in tokenize(q or "") if len(t) <= MAX_TERM_CHARS))
+    if not tokens:
+        raise ValueError("q must contain at least one letter or digit")
+    if len(tokens) > MAX_QUERY_TERMS:
+        raise ValueError(f"q accepts at most {MAX_QUERY_TERMS} terms")
+    return tokens
+
+
+def _matches(index_table, term: str, prefix: bool, car_id: str | None, active: bool | None) -> dict:
+    """(part_id, car_id) -> score for the postings of one query term."""
+    if prefix:
+        start = term
+    elif car_id:
+        start = f"{term}#{car_id}#"
+    else:
+        start = f"{term}#"
+    kwargs = {"KeyConditionExpression": Key("bucket").eq(term[:BUCKET_CHARS]) & Key("entry").begins_with(start)}
+    filters = []
+    if prefix and car_id:
+        filters.append(Attr("car_id").eq(car_id))
+    if active is not None:
+        filters.append(Attr("active").eq(active))
+    if filters:
+        condition = filters[0]
+        for f in filters[1:]:
+            condition = condition & f
+        kwargs["FilterExpression"] = condition
+
+    scores = {}
+    for posting in query_all(index_table, **kwargs):
+        token = posting["entry"].split("#", 1)[0]
+        score = float(posting["weight"]) * (1 if token == term else PREFIX_FACTOR)
+        match = (posting["part_id"], posting["car_id"])
+        if score > scores.get(match, 0):
+            scores[match] = score
+    return scores
+
+
+def search(index_table, tokens: list, car_id: str | None = None, active: bool | None = None) -> list:
+    """(part_id, car_id, score) for parts matching every term, best first.
+
+    The last term also matches as a prefix, so results narrow as the user
+    types; earlier terms must match whole tokens.
+    """
+    combined = None
+    for i, term in enumerate(tokens):
+        prefix = i == len(tokens) - 1 and len(term) >= BUCKET_CHARS
+        scores = _matches(index_table, term, prefix, car_id, active)
+        if combined is None:
+            combined = scores
+        else:
+            combined = {pid: combined[pid] + s for pid, s in scores.items() if pid in combined}
+        if not combined:
+            return []
+    ranked = sorted(combined.items(), key=lambda kv: (-kv[1], kv[0][0]))
+    return [(part_id, part_car, score) for (part_id, part_car), score in ranked]
@@ -0,0 +1,512 @@
+"""
+Single-table layout for car data - canonical copy used by all Lambda functions.
+
+By default each kind of car data has its own table, listed per car
+through a GSI. With DATA_LAYOUT=single (template parameter DataLayout)
+the parts, history, miles log and failure stats of a car live in one
+partition of CAR_DATA_TABLE instead:
+
+    PK (hash)       SK (range)                TS (ts-index range)
+    CAR#<car_id>    AGG#FAIL#<part_number>
+    CAR#<car_id>    HIST#<history_id>         HIST#<replaced_at>
+    CAR#<car_id>    MILES#<log_id>            MILES#<logged_at>
+    CAR#<car_id>    PART#<part_id>
+
+so everything about a car, or all of one entity (each of parts and
+history for the reports, see query_car()), is one paginated Query. Point reads and
+conditional updates address items by id, so the id is in the sort key;
+the ts-index LSI keeps history and miles in time order, as the GSIs did.
+
+Handlers do not change: db.resource() wraps the DynamoDB resource with
+wrap(), whose Table() returns a view with the boto3 Table methods the
+handlers use, keyed and queried exactly as the per-entity table was
+(batch_get_item() and batch_write_item() on the resource are mapped too).
+Views add PK / SK / TS (and ID, see below) on the way in and strip them
+on the way out. A view needs the car of keys that only carry an id
+({"part_id": ...}): it is taken from the cars a handler already knows
+for the ids (located(), e.g. from the search index's postings), from the
+request's car (scope(), set by the utils decorators from the car_id path
+parameter) and otherwise, for parts, looked up on the sparse id-index
+GSI. A part id the id-index does not have reads as missing; any other
+key whose car does not resolve raises UnresolvedCar.
+
+The key attributes of an item (car_id, its id, replaced_at / logged_at)
+are set when it is written and must not be updated afterwards.
+
+DATA_LAYOUT=dual is the migration step between the two: reads use the
+per-entity tables and every write is mirrored into CAR_DATA_TABLE (see
+backend/tools/migrate_single_table.py).
+"""
+import contextlib
+import contextvars
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+
+DATA_LAYOUT = os.environ.get("DATA_LAYOUT", "tables")
+CAR_DATA_TABLE = os.environ.get("CAR_DATA_TABLE")
+TS_INDEX = "ts-index"
+ID_INDEX = "id-index"
+INTERNAL = ("PK", "SK", "TS", "ID")
+
+_car = contextvars.ContextVar("car_scope", default=None)
+_located = contextvars.ContextVar("located_cars", default=None)
+
+
+class UnresolvedCar(LookupError):
+    """An id-only key whose car is neither given, located, in scope nor in the id-index."""
+
+
+def scope(car_id):
+    """Resolve id-only keys in this context to car_id; returns a token for unscope()."""
+    return _car.set(car_id)
+
+
+def unscope(token):
+    _car.reset(token)
+
+
+@contextlib.contextmanager
+def located(cars: dict):
+    """Resolve id-only keys of these ids (id -> car_id) to their car within the block."""
+    token = _located.set(cars)
+    try:
+        yield
+    finally:
+        _located.reset(token)
+
+
+class Entity:
+    """How items of one per-entity table are laid out in the car partition."""
+
+    def __init__(self, prefix: str, id_attr: str, index: str | None = None,
+                 sort_attr: str | None = None, lookup: bool = False):
+        self.prefix = prefix
+        self.id_attr = id_attr
+        # The per-car GSI of the per-entity table, and its range attribute
+        self.index = index
+        self.sort_attr = sort_attr
+        # Maintain ID for the id-index (items read by id without a car)
+        self.lookup = lookup
+
+    def key(self, car_id: str, item_id: str) -> dict:
+        if not car_id:
+            raise UnresolvedCar(f"No car for {self.id_attr} {item_id}")
+        return {"PK": f"CAR#{car_id}", "SK": self.prefix + item_id}
+
+    def to_item(self, item: dict) -> dict:
+        out = {**item, **self.key(item["car_id"], item[self.id_attr])}
+        if self.sort_attr and item.get(self.sort_attr):
+            out["TS"] = self.prefix + item[self.sort_attr]
+        if self.lookup:
+            out["ID"] = self.prefix + item[self.id_attr]
+        return out
+
+    def to_start_key(self, key: dict) -> dict:
+        """An ExclusiveStartKey of the per-entity table as one of the car-data table."""
+        out = self.key(key["car_id"], key[self.id_attr])
+        if self.sort_attr:
+            out["TS"] = self.prefix + key[self.sort_attr]
+        return out
+
+    def from_key(self, key: dict) -> dict:
+        """A LastEvaluatedKey of the car-data table as one of the per-entity table."""
+        out = {"car_id": key["PK"][len("CAR#"):], self.id_attr: key["SK"][len(self.prefix):]}
+        if self.sort_attr and "TS" in key:
+            out[self.sort_attr] = key["TS"][len(self.prefix):]
+        return out
+
+
+# Table environment variable -> layout of its items. Failure stats are
+# keyed (car_id, part_number) already, so their keys always carry the car.
+ENTITIES = {
+    "FAILURE_STATS_TABLE": Entity("AGG#FAIL#", "part_number"),
+    "PART_HISTORY_TABLE": Entity("HIST#", "history_id", "car-history-index", "replaced_at"),
+    "MILES_LOG_TABLE": Entity("MILES#", "log_id", "car-miles-index", "logged_at"),
+    "PARTS_TABLE": Entity("PART#", "part_id", "car-index", lookup=True),
+}
+
+
+def strip(item):
+    if item is None:
+        return None
+    return {k: v for k, v in item.items() if k not in INTERNAL}
+
+
+def _strip_attributes(resp: dict) -> dict:
+    if "Attributes" in resp:
+        resp = {**resp, "Attributes": strip(resp["Attributes"])}
+    return resp
+
+
+def _conditions(cond) -> dict:
+    """attribute -> (operator, values) of a Key() condition, ANDed parts flattened."""
+    expr = cond.get_expression()
+    if expr["operator"] == "AND":
+        out = {}
+        for part in expr["values"]:
+            out.update(_conditions(part))
+        return out
+    key, *values = expr["values"]
+    return {key.name: (expr["operator"], values)}
+
+
+def _key_condition(name: str, operator: str, values: list):
+    key = Key(name)
+    if operator == "BETWEEN":
+        return key.between(*values)
+    return {
+        "=": key.eq, "<": key.lt, "<=": key.lte, ">": key.gt, ">=": key.gte,
+        "begins_with": key.begins_with,
+    }[operator](values[0])
+
+
+_SET = re.compile(r"\bSET\s", re.IGNORECASE)
+
+
+class CarTable:
+    """One per-entity table, served from the car-data table."""
+
+    def __init__(self, entity: Entity, table):
+        self.entity = entity
+        self.table = table
+        self.name = table.name
+        self.meta = table.meta
+
+    def key(self, key: dict) -> dict:
+        item_id = key[self.entity.id_attr]
+        car_id = key.get("car_id") or (_located.get() or {}).get(item_id) or _car.get() or self._lookup(item_id)
+        return self.entity.key(car_id, item_id)
+
+    def _lookup(self, item_id: str):
+        if not self.entity.lookup:
+            return None
+        items = self.table.query(
+            IndexName=ID_INDEX,
+            KeyConditionExpression=Key("ID").eq(self.entity.prefix + item_id),
+        ).get("Items", [])
+        return items[0]["PK"][len("CAR#"):] if items else None
+
+    def get_item(self, Key, **kwargs):
+        try:
+            key = self.key(Key)
+        except UnresolvedCar:
+            if self.entity.lookup:
+                return {}  # not in the id-index: no such item
+            raise
+        resp = self.table.get_item(Key=key, **kwargs)
+        if "Item" in resp:
+            resp = {**resp, "Item": strip(resp["Item"])}
+        return resp
+
+    def put_item(self, Item, **kwargs):
+        return _strip_attributes(self.table.put_item(Item=self.entity.to_item(Item), **kwargs))
+
+    def update_item(self, Key, **kwargs):
+        key = self.key(Key)
+        # Set the item's own key attributes too, as DynamoDB does when an update creates the item
+        identity = {"car_id": key["PK"][len("CAR#"):], self.entity.id_attr: Key[self.entity.id_attr]}
+        if self.entity.lookup:
+            identity["ID"] = key["SK"]
+        names = {f"#_k{i}": name for i, name in enumerate(identity)}
+        values = {f":_k{i}": value for i, value in enumerate(identity.values())}
+        sets = ", ".join(f"{n} = {v}" for n, v in zip(names, values))
+        expression = kwargs.get("UpdateExpression", "")
+        if _SET.search(expression):
+            expression = _SET.sub(f"SET {sets}, ", expression, count=1)
+        else:
+            expression = f"SET {sets} {expression}"
+        kwargs = {
+            **kwargs,
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": {**kwargs.get("ExpressionAttributeNames", {}), **names},
+            "ExpressionAttributeValues": {**kwargs.get("ExpressionAttributeValues", {}), **values},
+        }
+        return _strip_attributes(self.table.update_item(Key=key, **kwargs))
+
+    def delete_item(self, Key, **kwargs):
+        return _strip_attributes(self.table.delete_item(Key=self.key(Key), **kwargs))
+
+    def query(self, **kwargs):
+        entity = self.entity
+        index = kwargs.pop("IndexName", None)
+        if index not in (None, entity.index):
+            raise ValueError(f"{index} is not an index of this table")
+        conds = _conditions(kwargs.pop("KeyConditionExpression"))
+        car_id = conds.pop("car_id")[1][0]
+        condition = Key("PK").eq(f"CAR#{car_id}")
+        if entity.sort_attr and index:
+            range_key, range_attr = "TS", entity.sort_attr
+            kwargs["IndexName"] = TS_INDEX
+        else:
+            range_key, range_attr = "SK", entity.id_attr
+        if range_attr in conds:
+            operator, values = conds.pop(range_attr)
+            condition &= _key_condition(range_key, operator, [entity.prefix + v for v in values])
+        else:
+            condition &= Key(range_key).begins_with(entity.prefix)
+        if conds:
+            raise ValueError(f"Unsupported key condition on {', '.join(conds)}")
+        if "ExclusiveStartKey" in kwargs:
+            kwargs["ExclusiveStartKey"] = entity.to_start_key(kwargs["ExclusiveStartKey"])
+
+        resp = self.table.query(KeyConditionExpression=condition, **kwargs)
+        if "Items" in resp:
+            resp["Items"] = [strip(item) for item in resp["Items"]]
+        if "LastEvaluatedKey" in resp:
+            resp["LastEvaluatedKey"] = entity.from_key(resp["LastEvaluatedKey"])
+        return resp
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _CarBatchWriter(self)
+
+
+class _CarBatchWriter:
+    def __init__(self, view: CarTable):
+        self._view = view
+        self._writer = view.table.batch_writer()
+
+    def put_item(self, Item):
+        self._writer.put_item(Item=self._view.entity.to_item(Item))
+
+    def delete_item(self, Key):
+        self._writer.delete_item(Key=self._view.key(Key))
+
+    def __enter__(self):
+        self._writer.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._writer.__exit__(*exc)
+
+
+class DualTable:
+    """A per-entity table whose writes are mirrored into the car-data table.
+
+    The per-entity table stays authoritative: reads go there, and the
+    mirror writes the item as it stands after each write. A failed mirror
+    write is logged, not raised; the migration tool's --verify pass
+    repairs whatever the mirror missed.
+    """
+
+    def __init__(self, table, mirror: CarTable):
+        self.table = table
+        self.mirror = mirror
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+    def _mirror(self, write, *args):
+        try:
+            write(*args)
+        except Exception as e:
+            print(json.dumps({"type": "dual_write_error", "table": self.table.name, "error": str(e)}), flush=True)
+
+    def put_item(self, Item, **kwargs):
+        resp = self.table.put_item(Item=Item, **kwargs)
+        self._mirror(lambda: self.mirror.put_item(Item=Item))
+        return resp
+
+    def update_item(self, Key, **kwargs):
+        wanted = kwargs.get("ReturnValues", "NONE")
+        if wanted in ("NONE", "ALL_NEW"):
+            resp = self.table.update_item(Key=Key, **{**kwargs, "ReturnValues": "ALL_NEW"})
+            item = resp.get("Attributes")
+            if wanted == "NONE":
+                resp = {k: v for k, v in resp.items() if k != "Attributes"}
+        else:
+            resp = self.table.update_item(Key=Key, **kwargs)
+            item = self.table.get_item(Key=Key, ConsistentRead=True).get("Item")
+        if item:
+            self._mirror(lambda: self.mirror.put_item(Item=item))
+        return resp
+
+    def delete_item(self, Key, **kwargs):
+        wanted = kwargs.get("ReturnValues", "NONE")
+        resp = self.table.delete_item(Key=Key, **{**kwargs, "ReturnValues": "ALL_OLD"})
+        old = resp.get("Attributes")
+        if wanted != "ALL_OLD":
+            resp = {k: v for k, v in resp.items() if k != "Attributes"}
+        if old:
+            self._mirror(lambda: self.mirror.delete_item(Key={**Key, "car_id": old["car_id"]}))
+        return resp
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _DualBatchWriter(self)
+
+
+class _DualBatchWriter:
+    def __init__(self, dual: DualTable):
+        self._dual = dual
+        self._writer = dual.table.batch_writer()
+        self._mirror = dual.mirror.batch_writer()
+
+    def put_item(self, Item):
+        self._writer.put_item(Item=Item)
+        self._dual._mirror(lambda: self._mirror.put_item(Item=Item))
+
+    def delete_item(self, Key):
+        self._writer.delete_item(Key=Key)
+        self._dual._mirror(lambda: self._mirror.delete_item(Key=Key))
+
+    def __enter__(self):
+        self._writer.__enter__()
+        self._mirror.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._writer.__exit__(*exc)
+        self._dual._mirror(lambda: self._mirror.__exit__(*exc))
+
+
+class CarDataResource:
+    """A DynamoDB resource whose per-entity car tables are served per DATA_LAYOUT."""
+
+    def __init__(self, dynamodb, layout: str, table_name: str):
+        self._dynamodb = dynamodb
+        self.layout = layout
+        self._table = dynamodb.Table(table_name)
+        # table name -> Entity, for the tables this deployment maps
+        self.entities = {
+            os.environ[env]: entity for env, entity in ENTITIES.items() if os.environ.get(env)
+        }
+
+    def __getattr__(self, name):
+        return getattr(self._dynamodb, name)
+
+    def Table(self, name: str):
+        table = self._dynamodb.Table(name)
+        entity = self.entities.get(name)
+        if entity is None:
+            return table
+        view = CarTable(entity, self._table)
+        return view if self.layout == "single" else DualTable(table, view)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        mapped = {name: spec for name, spec in RequestItems.items() if name in self.entities}
+        if self.layout != "single" or not mapped:
+            return self._dynamodb.batch_get_item(RequestItems=RequestItems, **kwargs)
+        rest = {name: spec for name, spec in RequestItems.items() if name not in mapped}
+        resp = self._dynamodb.batch_get_item(RequestItems=rest, **kwargs) if rest else {}
+        responses = dict(resp.get("Responses", {}))
+        unprocessed = dict(resp.get("UnprocessedKeys", {}))
+        # One request per mapped table: each has its own projection
+        for name, spec in mapped.items():
+            view = self.Table(name)
+            # (PK, SK) -> the key as given; ids the id-index does not have are simply missing
+            keys = {}
+            for key in spec["Keys"]:
+                try:
+                    physical = view.key(key)
+                except UnresolvedCar:
+                    if view.entity.lookup:
+                        continue
+                    raise
+                keys[(physical["PK"], physical["SK"])] = key
+            responses[name] = []
+            if not keys:
+                continue
+            request = {**spec, "Keys": [{"PK": pk, "SK": sk} for pk, sk in keys]}
+            got = self._dynamodb.batch_get_item(RequestItems={self._table.name: request}, **kwargs)
+            responses[name] = [strip(item) for item in got.get("Responses", {}).get(self._table.name, [])]
+            left = got.get("UnprocessedKeys", {}).get(self._table.name)
+            if left:
+                unprocessed[name] = {**spec, "Keys": [keys[(k["PK"], k["SK"])] for k in left["Keys"]]}
+        return {**resp, "Responses": responses, "UnprocessedKeys": unprocessed}
+
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        mapped = {name: requests for name, requests in RequestItems.items() if name in self.entities}
+        if not mapped:
+            return self._dynamodb.batch_write_item(RequestItems=RequestItems, **kwargs)
+        if self.layout == "dual":
+            resp = self._dynamodb.batch_write_item(RequestItems=RequestItems, **kwargs)
+            unprocessed = resp.get("UnprocessedItems") or {}
+            for name, requests in mapped.items():
+                dual = self.Table(name)
+                done = [r for r in requests if r not in unprocessed.get(name, [])]
+                dual._mirror(lambda: _write_requests(dual.mirror, done))
+            return resp
+
+        rest = {name: requests for name, requests in RequestItems.items() if name not in mapped}
+        physical = []
+        # (PK, SK) -> (table name, the request as given), to map UnprocessedItems back
+        origin = {}
+        for name, requests in mapped.items():
+            view = self.Table(name)
+            for request in requests:
+                if "PutRequest" in request:
+                    key = view.entity.to_item(request["PutRequest"]["Item"])
+                    physical.append({"PutRequest": {"Item": key}})
+                else:
+                    key = view.key(request["DeleteRequest"]["Key"])
+                    physical.append({"DeleteRequest": {"Key": key}})
+                origin[(key["PK"], key["SK"])] = (name, request)
+        resp = self._dynamodb.batch_write_item(RequestItems={**rest, self._table.name: physical}, **kwargs)
+        unprocessed = dict(resp.get("UnprocessedItems") or {})
+        for request in unprocessed.pop(self._table.name, []):
+            spec = request.get("PutRequest", {}).get("Item") or request["DeleteRequest"]["Key"]
+            name, given = origin[(spec["PK"], spec["SK"])]
+            unprocessed.setdefault(name, []).append(given)
+        return {**resp, "UnprocessedItems": unprocessed}
+
+
+def _write_requests(table, requests: list):
+    with table.batch_writer() as batch:
+        for request in requests:
+            if "PutRequest" in request:
+                batch.put_item(Item=request["PutRequest"]["Item"])
+            else:
+                batch.delete_item(Key=request["DeleteRequest"]["Key"])
+
+
+def wrap(dynamodb):
+    """dynamodb as the handlers should see it under DATA_LAYOUT."""
+    if DATA_LAYOUT == "tables" or not CAR_DATA_TABLE:
+        return dynamodb
+    if DATA_LAYOUT not in ("dual", "single"):
+        raise ValueError(f"DATA_LAYOUT must be tables, dual or single, not {DATA_LAYOUT!r}")
+    return CarDataResource(dynamodb, DATA_LAYOUT, CAR_DATA_TABLE)
+
+
+def combinable(*tables) -> bool:
+    """Whether query_car() can read these tables' items together."""
+    return all(isinstance(t, CarTable) for t in tables) and len({t.name for t in tables}) == 1
+
+
+def consistent(*tables) -> bool:
+    """Whether per-car queries of these tables can be strongly consistent.
+
+    They can when every table is served from the car-data table, whose
+    base table and ts-index LSI support ConsistentRead; the per-entity
+    tables are listed per car through GSIs, which do not.
+    """
+    return all(isinstance(t, CarTable) for t in tables)
+
+
+def query_car(car_id: str, tables, **kwargs) -> list:
+    """Every item of a car in each of tables (see combinable()).
+
+    Returns one list per table. Each table's items are one paginated
+    Query of its prefix, run concurrently. kwargs (e.g. from
+    db.projection(), ConsistentRead) apply to all of them.
+    """
+    def fetch(prefix):
+        condition = Key("PK").eq(f"CAR#{car_id}") & Key("SK").begins_with(prefix)
+        args = dict(kwargs)
+        items = []
+        while True:
+            resp = tables[0].table.query(KeyConditionExpression=condition, **args)
+            items += [strip(item) for item in resp.get("Items", [])]
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                return items
+            args["ExclusiveStartKey"] = last_key
+
+    # Each query runs in a copy of this context, so it counts towards the request's metrics
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fetch, t.entity.prefix) for t in tables]
+        return [f.result() for f in futures]
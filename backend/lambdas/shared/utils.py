@@ -9,29 +9,91 @@ import time
 import hmac
 import hashlib
 import base64
+import gzip
+import zlib
+from decimal import Decimal
 from functools import wraps
 
+import auth_cache
+import idempotency
+import metrics
+import profiling
+import rate_limit
+import single_table
+
+try:
+    import brotli  # optional; gzip is used when it is not packaged
+except ImportError:
+    brotli = None
+
 ALLOWED_ORIGIN = os.environ.get("ALLOWED_ORIGIN", "*")
 JWT_SECRET = os.environ.get("JWT_SECRET", "change-me")
+# HMAC state after absorbing the key; each signature starts from a copy of it
+_JWT_HMAC = hmac.new(JWT_SECRET.encode(), digestmod=hashlib.sha256)
+
+# Bodies at least this large are compressed when the client accepts it.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+# A gzip request body may not inflate past this (a small upload can expand a thousandfold)
+MAX_DECODED_BODY_BYTES = int(os.environ.get("MAX_DECODED_BODY_BYTES", 32 * 1024 * 1024))
+
+
+class BodyTooLarge(ValueError):
+    """The request body is larger than MAX_DECODED_BODY_BYTES once decoded."""
+
+
+# ─── JSON encoding ────────────────────────────────────────────────────────────
+
+# default=float is a C builtin, so DynamoDB Decimals become JSON numbers
+# without a Python-level callback per value.
+_encoder = json.JSONEncoder(default=float, separators=(",", ":"), check_circular=False)
+
+
+def _fallback(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def encode_json(body) -> str:
+    """Serialize a response body, emitting Decimals as numbers.
+
+    Bodies holding anything else json cannot encode natively (DynamoDB sets,
+    datetimes) take the slower fallback path.
+    """
+    try:
+        return _encoder.encode(body)
+    except (TypeError, ValueError):
+        return json.dumps(body, default=_fallback, separators=(",", ":"))
 
 
 # ─── Response helpers ─────────────────────────────────────────────────────────
 
-def response(status_code: int, body: dict) -> dict:
+def _base_headers() -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": ALLOWED_ORIGIN,
+        "Access-Control-Allow-Headers": "Content-Type,Authorization,If-None-Match,Idempotency-Key",
+        "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
+        "Access-Control-Expose-Headers": "ETag,Retry-After,Idempotent-Replayed,Idempotency-Incomplete",
+        "Cache-Control": "no-store",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def response(status_code: int, body: dict, headers: dict | None = None) -> dict:
     return {
         "statusCode": status_code,
-        "headers": {
-            "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": ALLOWED_ORIGIN,
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
-            "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
-        },
-        "body": json.dumps(body, default=str),
+        "headers": {**_base_headers(), **(headers or {})},
+        "body": encode_json(body),
     }
 
 
-def ok(body: dict) -> dict:
-    return response(200, body)
+def ok(body: dict, headers: dict | None = None) -> dict:
+    return response(200, body, headers)
 
 
 def created(body: dict) -> dict:
@@ -54,12 +116,182 @@ def not_found(msg: str = "Not found") -> dict:
     return response(404, {"error": msg})
 
 
+def too_many_requests(retry_after: int) -> dict:
+    return response(429, {"error": "Too many requests", "retry_after": retry_after},
+                    {"Retry-After": str(retry_after)})
+
+
 def server_error(msg: str = "Internal server error") -> dict:
     return response(500, {"error": msg})
 
 
+# ─── Conditional requests (ETag / 304) ────────────────────────────────────────
+
+# Bump when the JSON shape of responses changes so previously issued ETags stop matching.
+REPRESENTATION_VERSION = 2
+
+
+def get_header(event: dict, name: str):
+    """Case-insensitive request header lookup."""
+    headers = event.get("headers") or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def make_etag(version, event: dict) -> str | None:
+    """Strong ETag derived from a resource version counter instead of hashing the body.
+
+    The request path and query string are folded in so that different
+    filters on the same resource get different tags. Returns None when the
+    version is unknown (e.g. the car does not exist).
+    """
+    if version is None:
+        return None
+    qp = event.get("queryStringParameters") or {}
+    params = "&".join(f"{k}={qp[k]}" for k in sorted(qp))
+    path = event.get("path") or event.get("resource", "")
+    variant = f"{path}?{params}#r{REPRESENTATION_VERSION}"
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(event: dict, etag: str | None) -> bool:
+    """True if the client's If-None-Match already names this representation."""
+    header = get_header(event, "If-None-Match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function (RFC 9110 13.1.2);
+    # compressed variants of the same representation match too.
+    return any(_strip_coding(tag.strip().removeprefix("W/")) == etag for tag in header.split(","))
+
+
+def _strip_coding(etag: str) -> str:
+    for coding in ("gzip", "br"):
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def cache_headers(etag: str | None, cache_control: str) -> dict:
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def not_modified(etag: str, cache_control: str) -> dict:
+    return {
+        "statusCode": 304,
+        "headers": {**_base_headers(), **cache_headers(etag, cache_control)},
+        "body": "",
+    }
+
+
+# ─── Request / response encoding ──────────────────────────────────────────────
+
+def decode_request_body(event: dict):
+    """Decode a base64 request body in place, gunzipping it if sent with Content-Encoding: gzip.
+
+    The API has binary media types enabled (so compressed responses can be
+    returned), which makes API Gateway base64-encode incoming bodies too.
+    Raises BodyTooLarge when the body inflates past MAX_DECODED_BODY_BYTES.
+    """
+    if event.get("isBase64Encoded") and event.get("body"):
+        data = base64.b64decode(event["body"])
+        if (get_header(event, "Content-Encoding") or "").lower() == "gzip":
+            data = _gunzip(data, MAX_DECODED_BODY_BYTES)
+        event["body"] = data.decode("utf-8")
+        event["isBase64Encoded"] = False
+
+
+def _gunzip(data: bytes, limit: int) -> bytes:
+    """gzip.decompress(data) (every member), but never inflating more than limit bytes."""
+    out = []
+    size = 0
+    while data:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunk = inflater.decompress(data, limit - size + 1)
+        size += len(chunk)
+        if size > limit or inflater.unconsumed_tail:
+            raise BodyTooLarge(f"Request body is larger than {limit} bytes uncompressed")
+        if not inflater.eof:
+            raise EOFError("Compressed request body ended early")
+        out.append(chunk)
+        data = inflater.unused_data
+    return b"".join(out)
+
+
+def _accepted_encodings(event: dict) -> set:
+    accepted = set()
+    for part in (get_header(event, "Accept-Encoding") or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def finalize_response(event: dict, resp: dict) -> dict:
+    """Negotiate Content-Encoding for a handler response.
+
+    Bodies of at least COMPRESS_MIN_BYTES are brotli- or gzip-compressed and
+    returned base64-encoded for API Gateway to decode. The ETag gets a
+    per-coding suffix so each encoded variant has its own strong validator.
+    """
+    headers = resp.get("headers") or {}
+    if resp.get("statusCode") == 304:
+        # Echo the variant the client already holds
+        sent = get_header(event, "If-None-Match") or ""
+        for tag in sent.split(","):
+            tag = tag.strip().removeprefix("W/")
+            if _strip_coding(tag) == headers.get("ETag"):
+                resp["headers"] = {**headers, "ETag": tag}
+                break
+        return resp
+
+    body = resp.get("body")
+    if resp.get("isBase64Encoded") or not body or len(body) < COMPRESS_MIN_BYTES:
+        return resp
+
+    accepted = _accepted_encodings(event)
+    if brotli is not None and "br" in accepted:
+        coding, data = "br", brotli.compress(body.encode(), quality=BROTLI_QUALITY)
+    elif "gzip" in accepted:
+        coding, data = "gzip", gzip.compress(body.encode(), compresslevel=GZIP_LEVEL)
+    else:
+        return resp
+
+    headers = {**headers, "Content-Encoding": coding}
+    if headers.get("ETag"):
+        headers["ETag"] = headers["ETag"][:-1] + f'-{coding}"'
+    return {
+        **resp,
+        "headers": headers,
+        "body": base64.b64encode(data).decode(),
+        "isBase64Encoded": True,
+    }
+
+
 # ─── Minimal JWT (HS256) ──────────────────────────────────────────────────────
 
+def _sign(sig_input: bytes) -> bytes:
+    mac = _JWT_HMAC.copy()
+    mac.update(sig_input)
+    return mac.digest()
+
+
 def _b64url_encode(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
 
@@ -78,7 +310,7 @@ def create_jwt(payload: dict, expires_in: int = 86400 * 7) -> str:
     payload["exp"] = int(time.time()) + expires_in
     body = _b64url_encode(json.dumps(payload).encode())
     sig_input = f"{header}.{body}".encode()
-    sig = hmac.new(JWT_SECRET.encode(), sig_input, hashlib.sha256).digest()
+    sig = _sign(sig_input)
     return f"{header}.{body}.{_b64url_encode(sig)}"
 
 
@@ -89,7 +321,7 @@ def verify_jwt(token: str):
             return None
         header, body, sig = parts
         sig_input = f"{header}.{body}".encode()
-        expected_sig = hmac.new(JWT_SECRET.encode(), sig_input, hashlib.sha256).digest()
+        expected_sig = _sign(sig_input)
         if not hmac.compare_digest(_b64url_decode(sig), expected_sig):
             return None
         payload = json.loads(_b64url_decode(body))
@@ -107,47 +339,118 @@ def get_token_from_event(event: dict):
     auth_header = headers.get("Authorization") or headers.get("authorization") or ""
     if auth_header.startswith("Bearer "):
         return auth_header[7:]
+    # Browsers cannot set headers when opening a WebSocket (push/connect.py)
+    if (event.get("requestContext") or {}).get("eventType") == "CONNECT":
+        return (event.get("queryStringParameters") or {}).get("token")
+    return None
+
+
+def _admin_only(user: dict):
+    if user.get("role") != "admin":
+        return forbidden("Admin access required")
     return None
 
 
+def _writers_only(user: dict):
+    if user.get("role") == "readonly":
+        return forbidden("Write access required")
+    return None
+
+
+def _run(func, event, context, kwargs, role_check=None, idempotent=False):
+    """Invoke a handler through _authorized, emitting its metrics line (see metrics.py)
+    and, when enabled, its profile (see profiling.py). Part, history and miles
+    keys in the request resolve to its car_id path parameter (see single_table.py)."""
+    invocation = metrics.begin(event, context)
+    profile = profiling.begin()
+    car_scope = single_table.scope((event.get("pathParameters") or {}).get("car_id"))
+    resp = None
+    try:
+        resp = _authorized(func, event, context, kwargs, role_check, idempotent)
+        return resp
+    finally:
+        single_table.unscope(car_scope)
+        profiling.end(profile, event, context, resp)
+        metrics.end(invocation, resp)
+
+
+def _authorized(func, event, context, kwargs, role_check, idempotent=False):
+    """Authenticate, authorize and invoke a handler; shared by the decorators below."""
+    try:
+        decode_request_body(event)
+    except BodyTooLarge as e:
+        return response(413, {"error": str(e)})
+    except (OSError, EOFError, ValueError, zlib.error):
+        return bad_request("Request body could not be decoded")
+    token = get_token_from_event(event)
+    if not token:
+        return unauthorized("Missing Authorization header")
+    payload = auth_cache.verified(token, verify_jwt)
+    if not payload:
+        return unauthorized("Invalid or expired token")
+    # The token's role is as of sign-in; the users table has the current one
+    stored = auth_cache.current_user(payload["user_id"])
+    if not stored or stored.get("status") == "rejected":
+        return forbidden("Access has been revoked")
+    if stored.get("role") != payload.get("role"):
+        payload = {**payload, "role": stored.get("role")}
+    if role_check:
+        denied = role_check(payload)
+        if denied:
+            return denied
+    retry_after = rate_limit.check(payload, event)
+    if retry_after:
+        return too_many_requests(retry_after)
+    if idempotent and get_header(event, "Idempotency-Key"):
+        return finalize_response(event, _run_once(func, event, context, payload, kwargs))
+    return finalize_response(event, func(event, context, user=payload, **kwargs))
+
+
+def _run_once(func, event, context, user, kwargs):
+    """Invoke a mutation at most once per Idempotency-Key (see idempotency.py)."""
+    key = get_header(event, "Idempotency-Key")
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        return bad_request(f"Idempotency-Key must be at most {idempotency.MAX_KEY_LENGTH} characters")
+    record_id = f"{user['user_id']}#{key}"
+    fingerprint = idempotency.fingerprint(event)
+    record = idempotency.claim(record_id, fingerprint, context)
+    if record is not None:
+        if record["fingerprint"] != fingerprint:
+            return response(422, {"error": "Idempotency-Key was already used for a different request"})
+        if record["state"] != idempotency.DONE:
+            return response(409, {"error": "A request with this Idempotency-Key is still in progress"},
+                            {"Retry-After": "1"})
+        return idempotency.replay(record)
+
+    try:
+        resp = func(event, context, user=user, **kwargs)
+    except BaseException:
+        idempotency.release(record_id)
+        raise
+    if resp.get("statusCode", 200) >= 500 or idempotency.INCOMPLETE_HEADER in (resp.get("headers") or {}):
+        idempotency.release(record_id)
+    else:
+        idempotency.complete(record_id, resp)
+    return resp
+
+
 def require_auth(func):
     @wraps(func)
     def wrapper(event, context, **kwargs):
-        token = get_token_from_event(event)
-        if not token:
-            return unauthorized("Missing Authorization header")
-        payload = verify_jwt(token)
-        if not payload:
-            return unauthorized("Invalid or expired token")
-        return func(event, context, user=payload, **kwargs)
+        return _run(func, event, context, kwargs)
     return wrapper
 
 
 def require_admin(func):
     @wraps(func)
     def wrapper(event, context, **kwargs):
-        token = get_token_from_event(event)
-        if not token:
-            return unauthorized("Missing Authorization header")
-        payload = verify_jwt(token)
-        if not payload:
-            return unauthorized("Invalid or expired token")
-        if payload.get("role") != "admin":
-            return forbidden("Admin access required")
-        return func(event, context, user=payload, **kwargs)
+        return _run(func, event, context, kwargs, _admin_only)
     return wrapper
 
 
 def require_write(func):
+    """Writers only; honors Idempotency-Key (see idempotency.py)."""
     @wraps(func)
     def wrapper(event, context, **kwargs):
-        token = get_token_from_event(event)
-        if not token:
-            return unauthorized("Missing Authorization header")
-        payload = verify_jwt(token)
-        if not payload:
-            return unauthorized("Invalid or expired token")
-        if payload.get("role") == "readonly":
-            return forbidden("Write access required")
-        return func(event, context, user=payload, **kwargs)
+        return _run(func, event, context, kwargs, _writers_only, idempotent=True)
     return wrapper
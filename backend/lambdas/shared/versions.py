@@ -0,0 +1,75 @@
+"""
+Resource version counters - canonical copy used by all Lambda functions.
+
+Every car item carries a monotonically increasing ``data_version``. Each
+handler that mutates a car's parts or miles bumps it *after* its writes
+land, so anything derived from the car's data (cached reports, ETags) can
+be keyed by the version and is invalidated simply by the version moving on.
+The time of the last bump is kept next to it (data_version_at, epoch ms).
+
+Collections that are not scoped to a car (the cars list, part field
+definitions, BOM templates) use named counters in the counters table instead.
+"""
+import time
+
+from botocore.exceptions import ClientError
+
+
+def bump_car_version(cars_table, car_id: str) -> int | None:
+    """Atomically increment the car's data_version and return the new value.
+
+    Returns None when the car item does not exist (the version is never
+    created on a car that was deleted or never registered).
+    """
+    try:
+        resp = cars_table.update_item(
+            Key={"car_id": car_id},
+            UpdateExpression="ADD data_version :one SET data_version_at = :at",
+            ConditionExpression="attribute_exists(car_id)",
+            ExpressionAttributeValues={":one": 1, ":at": int(time.time() * 1000)},
+            ReturnValues="UPDATED_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        raise
+    return int(resp["Attributes"]["data_version"])
+
+
+def car_version_from_item(item: dict | None) -> int | None:
+    """The data_version of a car item (0 if never bumped), or None if there is no car."""
+    if item is None:
+        return None
+    return int(item.get("data_version", 0))
+
+
+def get_car_version(cars_table, car_id: str) -> int | None:
+    resp = cars_table.get_item(
+        Key={"car_id": car_id},
+        ProjectionExpression="car_id, data_version",
+    )
+    return car_version_from_item(resp.get("Item"))
+
+
+# Named counters for collections that are not scoped to one car
+CARS_COUNTER = "cars"
+PART_FIELDS_COUNTER = "part-fields"
+BOM_TEMPLATES_COUNTER = "bom-templates"
+# Bumped whenever a user's role or status changes (see auth_cache.py)
+USERS_COUNTER = "users"
+
+
+def bump_counter(counters_table, name: str) -> int:
+    resp = counters_table.update_item(
+        Key={"counter_id": name},
+        UpdateExpression="ADD #v :one",
+        ExpressionAttributeNames={"#v": "value"},
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(resp["Attributes"]["value"])
+
+
+def get_counter(counters_table, name: str) -> int:
+    resp = counters_table.get_item(Key={"counter_id": name})
+    return int((resp.get("Item") or {}).get("value", 0))
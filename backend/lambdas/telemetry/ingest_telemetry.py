@@ -0,0 +1,124 @@
+"""
+POST /cars/{car_id}/telemetry
+Write access required.
+Derive test sessions and their miles from a GPS / wheel-speed telemetry
+batch and log them as miles, as if each session had been typed into
+POST /cars/{car_id}/miles.
+
+Body: the batch as CSV (Content-Type: text/csv) or NDJSON
+(Content-Type: application/x-ndjson), optionally gzip-compressed
+(Content-Encoding: gzip). See telemetry.py for the columns and for how
+sessions and distances are derived.
+
+Query params:
+  - note: note for the logged sessions (default "Telemetry hh:mm-hh:mm UTC")
+  - dry_run=true: return the sessions found without logging them
+
+Each session is logged under a log_id derived from the car and the
+session's start, so a batch sent again (or overlapping an earlier one) logs
+each session once; repeats are reported with "status": "already_logged",
+or "resumed" when they finished a session whose parts were not all
+updated.
+Send whole sessions: one cut by a batch boundary is logged as two.
+Sessions shorter than MIN_SESSION_MILES are skipped.
+
+Part updates are paced by a WriteScheduler like log_miles. If the time
+budget runs out, the response lists the parts not updated for the session
+being logged ("parts_pending") and the sessions not started
+("sessions_pending"); sending the batch again finishes both.
+"""
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from utils import ok, bad_request, get_header, require_write
+from db import resource
+from scheduler import WriteScheduler
+import miles_log
+import telemetry
+
+dynamodb = resource()
+
+MIN_SESSION_MILES = 0.1
+
+
+def _utc(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+@require_write
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    data = event.get("body") or ""
+    if not data.strip():
+        return bad_request("Request body must be a CSV or NDJSON telemetry batch")
+    try:
+        found = telemetry.read_batch(data, (get_header(event, "Content-Type") or "").lower())
+    except telemetry.TelemetryError as e:
+        return bad_request(str(e))
+
+    qs = event.get("queryStringParameters") or {}
+    dry_run = (qs.get("dry_run") or "").lower() == "true"
+    scheduler = WriteScheduler(context)
+    sessions, pending_sessions, alerts = [], [], []
+    logged_miles = Decimal(0)
+    parts_pending = []
+
+    for found_session in found:
+        start, end = _utc(found_session["start"]), _utc(found_session["end"])
+        session = {
+            **found_session,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "log_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"telemetry:{car_id}:{found_session['start']:.1f}")),
+        }
+        if found_session["miles"] < MIN_SESSION_MILES:
+            sessions.append({**session, "status": "too_short"})
+            continue
+        if dry_run:
+            sessions.append({**session, "status": "found"})
+            continue
+        if parts_pending:
+            pending_sessions.append(session)
+            continue
+
+        miles = Decimal(str(found_session["miles"]))
+        result = miles_log.log_session(
+            dynamodb, scheduler, car_id, miles, session["log_id"],
+            qs.get("note") or f"Telemetry {start:%H:%M}-{end:%H:%M} UTC",
+            start.date().isoformat(), user["email"],
+            extra={"source": "telemetry", "started_at": session["start"], "ended_at": session["end"]},
+        )
+        if result is None:
+            # Removed by an admin; its miles are still being taken back off the parts
+            sessions.append({**session, "status": "removed"})
+            continue
+        if result["resumed"] and not (result["parts_updated"] or result["parts_pending"]):
+            sessions.append({**session, "status": "already_logged"})
+            continue
+        status = "resumed" if result["resumed"] else "logged"
+        sessions.append({**session, "status": status, "parts_updated": result["parts_updated"]})
+        if not result["resumed"]:
+            logged_miles += miles
+        alerts += result["alerts"]
+        parts_pending = result["parts_pending"]
+
+    logged = sum(s["status"] == "logged" for s in sessions)
+    message = f"Found {len(found)} sessions; logged {logged} ({logged_miles} miles)"
+    if dry_run:
+        message = f"Found {len(found)} sessions (dry run, nothing logged)"
+    return ok({
+        "message": message,
+        "sessions": sessions,
+        "miles_logged": logged_miles,
+        "complete": not (parts_pending or pending_sessions),
+        "parts_pending": parts_pending,
+        "sessions_pending": pending_sessions,
+        "alerts": alerts,
+    })
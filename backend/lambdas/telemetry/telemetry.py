@@ -0,0 +1,211 @@
+"""
+Parsing GPS / wheel-speed telemetry and deriving session miles with NumPy.
+
+A batch is NDJSON (one object per sample) or CSV with a header row. Columns,
+by any of these names:
+
+    t       t, time, timestamp     epoch seconds (or milliseconds)
+    lat     lat, latitude          degrees
+    lon     lon, lng, longitude    degrees
+    speed   speed, wheel_speed     wheel speed, m/s
+
+Either lat/lon or speed (or both) must be present. CSV values must be
+numeric, which lets the whole table parse in one np.fromstring call.
+
+Samples are sorted by time and split into sessions wherever no sample
+arrived for SESSION_GAP_S. A session's distance is integrated wheel speed
+(trapezoids; a step longer than MAX_STEP_S is a dropout and counts
+nothing) when the log has speed, else the haversine length of its GPS
+track with jitter rejected:
+
+  - each fix is replaced by the median of the fixes within GPS_STEP_S
+    around it, which removes short glitches (counted as rejected_fixes when
+    the raw fix was further off than MAX_SPEED_MPS covers in GPS_STEP_S)
+    and damps noise;
+  - the track is then thinned to one fix per GPS_STEP_S, so the remaining
+    noise at 10 Hz does not add up as ten tiny zig-zags per second;
+  - a step slower than MIN_MOVING_MPS is the car standing still with the
+    fix wandering, and one faster than MAX_SPEED_MPS is not driving; neither
+    counts.
+
+Everything is computed on whole arrays, so a day at 10 Hz (~860k samples)
+takes well under a second after parsing.
+"""
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_MILE = 1609.344
+
+SESSION_GAP_S = 300
+MIN_SESSION_S = 60
+MAX_STEP_S = 5
+GPS_STEP_S = 1.0
+MAX_SPEED_MPS = 60
+MIN_MOVING_MPS = 0.5
+
+COLUMNS = {
+    "t": ("t", "time", "timestamp"),
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "lng", "longitude"),
+    "speed": ("speed", "wheel_speed"),
+}
+
+
+class TelemetryError(ValueError):
+    """The batch cannot be read; the message is meant for the client."""
+
+
+def _column_map(names: list) -> dict:
+    """Canonical column -> position in names."""
+    lowered = [n.strip().strip('"').lower() for n in names]
+    found = {}
+    for column, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in lowered:
+                found[column] = lowered.index(alias)
+                break
+    if "t" not in found:
+        raise TelemetryError("telemetry needs a time column (t, time or timestamp)")
+    if "speed" not in found and not ("lat" in found and "lon" in found):
+        raise TelemetryError("telemetry needs lat and lon columns, a speed column, or both")
+    return found
+
+
+def parse_csv(text: str) -> dict:
+    header, _, rows = text.lstrip().partition("\n")
+    names = header.split(",")
+    found = _column_map(names)
+    try:
+        values = np.fromstring(rows.replace("\n", ","), sep=",")
+    except ValueError:
+        values = np.empty(1)
+    if len(values) % len(names):
+        raise TelemetryError(f"every CSV row needs {len(names)} numeric values")
+    table = values.reshape(-1, len(names))
+    return {column: table[:, i] for column, i in found.items()}
+
+
+def parse_ndjson(text: str) -> dict:
+    lines = [line for line in text.splitlines() if line.strip()]
+    try:
+        # One C-level parse instead of one json.loads per line
+        samples = json.loads("[" + ",".join(lines) + "]")
+    except json.JSONDecodeError as e:
+        raise TelemetryError(f"invalid NDJSON: {e.msg}") from None
+    if not all(isinstance(s, dict) for s in samples):
+        raise TelemetryError("every NDJSON line must be a JSON object")
+    if not samples:
+        return {}
+    found = _column_map(list(samples[0]))
+    keys = {column: list(samples[0])[i] for column, i in found.items()}
+    try:
+        return {column: np.array([s.get(key, np.nan) for s in samples], dtype=float)
+                for column, key in keys.items()}
+    except (TypeError, ValueError):
+        raise TelemetryError("telemetry values must be numbers") from None
+
+
+def parse(text: str, content_type: str = "") -> dict:
+    """Column arrays from a CSV or NDJSON batch (by Content-Type, else by sniffing)."""
+    if "csv" in content_type or ("json" not in content_type and not text.lstrip().startswith("{")):
+        return parse_csv(text)
+    return parse_ndjson(text)
+
+
+def clean(columns: dict) -> dict:
+    """Samples sorted by time, in seconds, with unusable and repeated timestamps dropped."""
+    if not columns or not len(columns["t"]):
+        return {}
+    t = columns["t"]
+    if np.nanmax(t) > 1e11:
+        t = t / 1000
+    usable = np.isfinite(t)
+    order = np.argsort(t[usable], kind="stable")
+    out = {column: values[usable][order] for column, values in columns.items()}
+    out["t"] = t[usable][order]
+    first = np.r_[True, np.diff(out["t"]) > 0]
+    return {column: values[first] for column, values in out.items()}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def wheel_distance_m(t, speed) -> float:
+    dt = np.diff(t)
+    v = np.nan_to_num(speed, nan=0.0).clip(min=0)
+    steps = (v[1:] + v[:-1]) / 2 * dt
+    return float(steps[dt <= MAX_STEP_S].sum())
+
+
+def _rolling_median(values, window: int):
+    """Centered rolling median; the ends keep their values."""
+    if len(values) < window:
+        return values
+    half = window // 2
+    out = values.copy()
+    out[half:len(values) - half] = np.median(sliding_window_view(values, window), axis=1)
+    return out
+
+
+def gps_distance_m(t, lat, lon) -> tuple:
+    """(track length in meters, fixes rejected as jumps)."""
+    valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    t, lat, lon = t[valid], lat[valid], lon[valid]
+    if len(t) < 2:
+        return 0.0, 0
+
+    # Median of the fixes around each one: removes short glitches, damps noise
+    window = max(1, int(GPS_STEP_S / np.median(np.diff(t)))) | 1
+    smooth_lat, smooth_lon = _rolling_median(lat, window), _rolling_median(lon, window)
+    jumped = haversine_m(lat, lon, smooth_lat, smooth_lon) > MAX_SPEED_MPS * GPS_STEP_S
+
+    thinned = np.r_[True, np.diff(np.floor(t / GPS_STEP_S)) > 0]
+    t, lat, lon = t[thinned], smooth_lat[thinned], smooth_lon[thinned]
+    d = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    dt = np.diff(t)
+    speed = d / dt
+    counted = (dt <= MAX_STEP_S * GPS_STEP_S) & (speed >= MIN_MOVING_MPS) & (speed <= MAX_SPEED_MPS)
+    return float(d[counted].sum()), int(jumped.sum())
+
+
+def sessions(columns: dict) -> list:
+    """One dict per session: start, end (epoch s), samples, miles, source, rejected_fixes."""
+    columns = clean(columns)
+    if not columns:
+        return []
+    t = columns["t"]
+    bounds = np.flatnonzero(np.diff(t) > SESSION_GAP_S) + 1
+    out = []
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(t)]):
+        if t[hi - 1] - t[lo] < MIN_SESSION_S:
+            continue
+        part = {column: values[lo:hi] for column, values in columns.items()}
+        rejected = 0
+        if "speed" in part and np.isfinite(part["speed"]).any():
+            meters, source = wheel_distance_m(part["t"], part["speed"]), "wheel_speed"
+        elif "lat" in part:
+            (meters, rejected), source = gps_distance_m(part["t"], part["lat"], part["lon"]), "gps"
+        else:
+            meters, source = 0.0, "wheel_speed"
+        out.append({
+            "start": float(t[lo]),
+            "end": float(t[hi - 1]),
+            "samples": int(hi - lo),
+            "miles": round(meters / METERS_PER_MILE, 2),
+            "source": source,
+            "rejected_fixes": rejected,
+        })
+    return out
+
+
+def read_batch(data: str, content_type: str = "") -> list:
+    """sessions() of one CSV / NDJSON batch."""
+    return sessions(parse(data, content_type))
+
@@ -0,0 +1,78 @@
+"""
+POST /cars/{car_id}/apply-template
+Write access required.
+Create a bill-of-materials template's parts on a car, with zero miles
+(see shared/bom.py).
+
+Body:
+{
+  "template_id": "<template>",
+  "line_ids": ["..."]   // optional: only these lines (to finish a run that returned pending)
+}
+
+Writes are paced by a WriteScheduler; template lines not created before
+the time budget ran out are returned as "pending" ("complete": false,
+Idempotency-Incomplete: true). Send them back as line_ids to create the
+rest. A line is created on a car at most once (the part's id is derived
+from both), so applying a template again only adds what is missing.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from utils import ok, bad_request, not_found, require_write
+from db import resource
+from scheduler import WriteScheduler
+import bom
+import idempotency
+
+CARS_TABLE = os.environ["CARS_TABLE"]
+BOM_TEMPLATES_TABLE = os.environ["BOM_TEMPLATES_TABLE"]
+BOM_TEMPLATE_PARTS_TABLE = os.environ["BOM_TEMPLATE_PARTS_TABLE"]
+dynamodb = resource()
+cars_table = dynamodb.Table(CARS_TABLE)
+templates_table = dynamodb.Table(BOM_TEMPLATES_TABLE)
+lines_table = dynamodb.Table(BOM_TEMPLATE_PARTS_TABLE)
+
+
+@require_write
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    car_id = (event.get("pathParameters") or {}).get("car_id")
+    if not car_id:
+        return bad_request("car_id path parameter is required")
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return bad_request("Invalid JSON body")
+
+    template_id = body.get("template_id")
+    if not template_id:
+        return bad_request("template_id is required")
+    only = body.get("line_ids")
+    if only is not None and not isinstance(only, list):
+        return bad_request("line_ids must be a list")
+
+    template = templates_table.get_item(Key={"template_id": template_id}).get("Item")
+    if not template:
+        return not_found("Template not found")
+    if not cars_table.get_item(Key={"car_id": car_id}).get("Item"):
+        return not_found("Car not found")
+
+    parts, pending = bom.create_parts(
+        dynamodb, WriteScheduler(context), car_id,
+        bom.template_lines(lines_table, template_id, set(only) if only is not None else None),
+        user["email"], datetime.now(timezone.utc).isoformat(),
+    )
+    message = f"Created {len(parts)} parts from template '{template.get('name')}'"
+    if pending:
+        message += f" ({len(pending)} not created before the time budget ran out)"
+    return ok({
+        "message": message,
+        "created_count": len(parts),
+        "pending_count": len(pending),
+        "pending": [line["line_id"] for line in pending],
+        "complete": not pending,
+    }, {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
@@ -0,0 +1,40 @@
+"""
+DELETE /templates/{template_id}
+Admin only. Delete a bill-of-materials template. Parts already created
+from it are not affected.
+"""
+import os
+from utils import ok, bad_request, not_found, require_admin
+from versions import bump_counter, BOM_TEMPLATES_COUNTER
+from db import resource
+import bom
+
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+BOM_TEMPLATES_TABLE = os.environ["BOM_TEMPLATES_TABLE"]
+BOM_TEMPLATE_PARTS_TABLE = os.environ["BOM_TEMPLATE_PARTS_TABLE"]
+dynamodb = resource()
+counters_table = dynamodb.Table(COUNTERS_TABLE)
+templates_table = dynamodb.Table(BOM_TEMPLATES_TABLE)
+lines_table = dynamodb.Table(BOM_TEMPLATE_PARTS_TABLE)
+
+
+@require_admin
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    template_id = (event.get("pathParameters") or {}).get("template_id")
+    if not template_id:
+        return bad_request("template_id path parameter is required")
+
+    # The template disappears from the list first; its lines go after
+    old = templates_table.delete_item(Key={"template_id": template_id}, ReturnValues="ALL_OLD").get("Attributes")
+    if not old:
+        return not_found("Template not found")
+    bump_counter(counters_table, BOM_TEMPLATES_COUNTER)
+
+    with lines_table.batch_writer() as batch:
+        for page in bom.template_lines(lines_table, template_id):
+            for line in page:
+                batch.delete_item(Key={"template_id": template_id, "line_id": line["line_id"]})
+    return ok({"message": f"Template '{old.get('name')}' deleted"})
@@ -0,0 +1,37 @@
+"""
+GET /templates
+Returns all bill-of-materials templates (without their parts).
+"""
+import os
+from utils import ok, require_auth, make_etag, etag_matches, not_modified, cache_headers
+from versions import get_counter, BOM_TEMPLATES_COUNTER
+from db import resource
+
+BOM_TEMPLATES_TABLE = os.environ["BOM_TEMPLATES_TABLE"]
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+dynamodb = resource()
+templates_table = dynamodb.Table(BOM_TEMPLATES_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
+
+CACHE_CONTROL = "private, no-cache"
+
+
+@require_auth
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    etag = make_etag(get_counter(counters_table, BOM_TEMPLATES_COUNTER), event)
+    if etag_matches(event, etag):
+        return not_modified(etag, CACHE_CONTROL)
+
+    items = []
+    kwargs = {}
+    while True:
+        resp = templates_table.scan(**kwargs)
+        items.extend(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    items.sort(key=lambda t: t.get("created_at", ""), reverse=True)
+    return ok({"templates": items, "count": len(items)}, headers=cache_headers(etag, CACHE_CONTROL))
@@ -0,0 +1,84 @@
+"""
+POST /templates
+Admin only. Save a car's active parts as a bill-of-materials template.
+
+Body:
+{
+  "car_id": "<car to copy>",
+  "name": "2025 season build",
+  "description": "Optional"
+}
+
+The template keeps each part's number, name, group, location, supplier,
+cost and extra_fields (see shared/bom.py); apply it to a car with
+POST /cars/{car_id}/apply-template. A car too large to save within the
+time budget is not saved at all (503), rather than saved in part.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from utils import ok, created, bad_request, not_found, response, require_admin
+from versions import bump_counter, BOM_TEMPLATES_COUNTER
+from db import resource
+from scheduler import WriteScheduler
+import bom
+
+PARTS_TABLE = os.environ["PARTS_TABLE"]
+CARS_TABLE = os.environ["CARS_TABLE"]
+COUNTERS_TABLE = os.environ["COUNTERS_TABLE"]
+BOM_TEMPLATES_TABLE = os.environ["BOM_TEMPLATES_TABLE"]
+BOM_TEMPLATE_PARTS_TABLE = os.environ["BOM_TEMPLATE_PARTS_TABLE"]
+dynamodb = resource()
+parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+counters_table = dynamodb.Table(COUNTERS_TABLE)
+templates_table = dynamodb.Table(BOM_TEMPLATES_TABLE)
+lines_table = dynamodb.Table(BOM_TEMPLATE_PARTS_TABLE)
+
+
+@require_admin
+def handler(event, context, user=None):
+    if event.get("httpMethod") == "OPTIONS":
+        return ok({})
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return bad_request("Invalid JSON body")
+
+    name = (body.get("name") or "").strip()
+    car_id = body.get("car_id")
+    if not name:
+        return bad_request("name is required")
+    if not car_id:
+        return bad_request("car_id is required")
+    if not cars_table.get_item(Key={"car_id": car_id}).get("Item"):
+        return not_found("Car not found")
+
+    template_id = str(uuid.uuid4())
+    lines, pending, error = bom.copy(
+        dynamodb, WriteScheduler(context), BOM_TEMPLATE_PARTS_TABLE, "line_id",
+        bom.car_parts(parts_table, car_id), lambda part: bom.template_line(template_id, part),
+    )
+    if pending or error:
+        with lines_table.batch_writer() as batch:
+            for line in lines:
+                batch.delete_item(Key={"template_id": template_id, "line_id": line["line_id"]})
+        if error is not None:
+            raise error
+        return response(503, {"error": f"Saved {len(lines)} of {len(lines) + len(pending)} parts "
+                                       "before the time budget ran out; nothing was kept, try again"})
+
+    template = {
+        "template_id": template_id,
+        "name": name,
+        "description": body.get("description", ""),
+        "source_car_id": car_id,
+        "part_count": len(lines),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": user["email"],
+    }
+    templates_table.put_item(Item=template)
+    bump_counter(counters_table, BOM_TEMPLATES_COUNTER)
+    return created({"template": template})
@@ -14,7 +14,10 @@ Expected columns (case-insensitive, spaces/underscores interchangeable):
   Required: part_number, part_name, part_group, part_location
   Optional: miles_used, purchased_from, cost, + any extra columns become extra_fields
 
-Returns a summary of imported, skipped, and errored rows.
+Returns a summary of imported, skipped, and errored rows. Writes (parts
+and their index entries) are paced and retried by a WriteScheduler; rows
+not reached before the invocation's time budget ran out are returned as
+"pending" (Idempotency-Incomplete: true) so they can be re-uploaded.
 """
 import base64
 import io
@@ -22,14 +25,31 @@ import json
 import os
 import uuid
 from datetime import datetime, timezone
+from decimal import Decimal
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from utils import ok, bad_request, server_error, require_write
+from versions import bump_car_version
+from db import resource
+from scheduler import WriteScheduler, BudgetExhausted
+import changes
+import field_index
+import idempotency
+import search_index
 
 PARTS_TABLE = os.environ["PARTS_TABLE"]
-dynamodb = boto3.resource("dynamodb")
+CARS_TABLE = os.environ["CARS_TABLE"]
+PART_FIELDS_TABLE = os.environ["PART_FIELDS_TABLE"]
+SEARCH_INDEX_TABLE = os.environ["SEARCH_INDEX_TABLE"]
+FIELD_INDEX_TABLE = os.environ["FIELD_INDEX_TABLE"]
+CHANGE_LOG_TABLE = os.environ["CHANGE_LOG_TABLE"]
+dynamodb = resource()
 parts_table = dynamodb.Table(PARTS_TABLE)
+cars_table = dynamodb.Table(CARS_TABLE)
+fields_table = dynamodb.Table(PART_FIELDS_TABLE)
+index_table = dynamodb.Table(SEARCH_INDEX_TABLE)
+field_index_table = dynamodb.Table(FIELD_INDEX_TABLE)
+changes_table = dynamodb.Table(CHANGE_LOG_TABLE)
 
 VALID_GROUPS = ["suspension", "drivetrain", "engine", "body", "electrical", "brakes", "other"]
 VALID_LOCATIONS = [
@@ -114,7 +134,11 @@ def handler(event, context, user=None):
     imported = []
     skipped = []
     errors = []
+    pending = []
+    logged = []
     now = datetime.now(timezone.utc).isoformat()
+    scheduler = WriteScheduler(context)
+    types = field_index.field_types(fields_table)
 
     for i, row in enumerate(rows, start=2):  # row 1 = header
         row_num = i
@@ -137,10 +161,11 @@ def handler(event, context, user=None):
                            "reason": f"Invalid part_location '{part_location}'"})
             continue
 
+        # boto3 rejects floats; go through str so 12.3 stays 12.3
         try:
-            miles_used = float(row.get("miles_used", 0) or 0)
+            miles_used = Decimal(str(float(row.get("miles_used", 0) or 0)))
         except (TypeError, ValueError):
-            miles_used = 0.0
+            miles_used = Decimal(0)
 
         # Extra fields = any column not in STANDARD_FIELDS
         extra_fields = {
@@ -164,15 +189,36 @@ def handler(event, context, user=None):
             "cost": row.get("cost", ""),
             "extra_fields": extra_fields,
         }
-        parts_table.put_item(Item=part)
+        # Index entries first: until the part is written they point at nothing,
+        # so a row cut short by the budget leaves no part that search cannot find
+        try:
+            with scheduler.batch_writer(dynamodb, SEARCH_INDEX_TABLE) as batch:
+                search_index.index_part(index_table, part, batch=batch)
+            with scheduler.batch_writer(dynamodb, FIELD_INDEX_TABLE) as batch:
+                field_index.index_part(field_index_table, part, types, batch=batch)
+            scheduler.write(parts_table, "put_item", Item=part)
+        except BudgetExhausted as e:
+            pending = [{"row": n, "reason": f"Not imported: {e}"} for n in range(row_num, len(rows) + 2)]
+            break
         imported.append({"row": row_num, "part_number": part_number, "part_name": part_name})
+        logged.append(changes.upsert("part", part, "part_id"))
+
+    if imported:
+        version = bump_car_version(cars_table, car_id)
+        changes.record(changes_table, cars_table, car_id, version, logged)
 
     return ok({
-        "message": f"Import complete: {len(imported)} imported, {len(skipped)} skipped, {len(errors)} errors",
+        "message": (
+            f"Import {'complete' if not pending else 'incomplete'}: {len(imported)} imported, "
+            f"{len(skipped)} skipped, {len(errors)} errors"
+            + (f", {len(pending)} pending" if pending else "")
+        ),
         "imported_count": len(imported),
         "skipped_count": len(skipped),
         "error_count": len(errors),
+        "pending_count": len(pending),
         "imported": imported,
         "skipped": skipped,
         "errors": errors,
-    })
+        "pending": pending,
+    }, {idempotency.INCOMPLETE_HEADER: "true"} if pending else None)
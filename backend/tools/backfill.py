@@ -0,0 +1,376 @@
+"""
+Rewrite existing DynamoDB items with the versioned migrations in
+migrations.py.
+
+A table is scanned as TotalSegments parallel segments, one worker thread
+per segment (the work is DynamoDB round trips, so threads are enough).
+Each changed item is written with a conditional UpdateItem: the item must
+still exist and every attribute the migration changes must still hold
+the value the scan read. When a handler wrote the item in between, it is
+re-read and transformed again rather than overwritten. Migrations marked
+batch write whole items with BatchWriteItem instead.
+
+After every page each segment's LastEvaluatedKey is saved in a JSON
+checkpoint file, so an interrupted run resumes where every segment
+stopped, and a finished migration is skipped by later runs. Items
+scanned and changed per second are printed while it runs.
+
+run_segments() is the scan / checkpoint / progress loop on its own, for
+other bulk jobs (migrate_single_table.py uses it).
+
+Against AWS this uses the usual credentials and region. --local runs the
+migrations against a seeded in-memory fleet (see local.py) instead.
+
+Usage:
+    python backend/tools/backfill.py --env dev --list
+    python backend/tools/backfill.py --env dev
+    python backend/tools/backfill.py --env prod --only 1 --segments 16 --dry-run
+    python backend/tools/backfill.py --local --cars 4 --parts 2000
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "shared"))
+
+import boto3  # noqa: E402
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+
+from migrations import MIGRATIONS, REMOVE  # noqa: E402
+from single_table import ENTITIES  # noqa: E402
+
+# Table environment variable -> table name prefix
+TABLES = {
+    "PARTS_TABLE": "calsol-parts",
+    "PART_HISTORY_TABLE": "calsol-part-history",
+    "MILES_LOG_TABLE": "calsol-miles-log",
+    "FAILURE_STATS_TABLE": "calsol-failure-stats",
+}
+CAR_DATA_TABLE = "calsol-car-data"
+DEFAULT_SEGMENTS = 8
+MAX_ATTEMPTS = 5
+REPORT_EVERY = 5.0
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+# ─── Checkpoints ─────────────────────────────────────────────────────────────
+
+class Checkpoint:
+    """Progress of runs by name, per segment, kept in a JSON file."""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.runs = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.runs = json.load(f)
+
+    def start(self, name: str, total_segments: int) -> dict:
+        with self.lock:
+            run = self.runs.setdefault(name, {"done": False, "total_segments": total_segments, "segments": {}})
+        if run["total_segments"] != total_segments:
+            raise SystemExit(f"{name} was started with {run['total_segments']} segments; "
+                             f"resume it with --segments {run['total_segments']}")
+        return run
+
+    def done(self, name: str) -> bool:
+        return self.runs.get(name, {}).get("done", False)
+
+    def segment(self, name: str, segment: int) -> dict:
+        with self.lock:
+            state = dict(self.runs.get(name, {}).get("segments", {}).get(str(segment), {}))
+        if state.get("last_key"):
+            state["last_key"] = {k: _deserializer.deserialize(v) for k, v in state["last_key"].items()}
+        return state
+
+    def save(self, name: str, segment: int, last_key, counts: Counter):
+        with self.lock:
+            self.runs[name]["segments"][str(segment)] = {
+                "last_key": {k: _serializer.serialize(v) for k, v in last_key.items()} if last_key else None,
+                "done": not last_key,
+                "counts": dict(counts),
+            }
+            self._write()
+
+    def finish(self, name: str):
+        with self.lock:
+            self.runs[name]["done"] = True
+            self._write()
+
+    def _write(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.runs, f, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+
+class Progress:
+    """Counters across all segments, for the periodic throughput line."""
+
+    def __init__(self, name: str, total_segments: int):
+        self.name = name
+        self.total_segments = total_segments
+        self.counts = Counter()
+        self.segments_done = 0
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def add(self, counts: Counter, segment_done: bool = False):
+        with self.lock:
+            self.counts.update(counts)
+            self.segments_done += segment_done
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        with self.lock:
+            counts = dict(self.counts)
+            done = self.segments_done
+        rates = ", ".join(f"{k} {v:,} ({v / elapsed:,.0f}/s)" for k, v in sorted(counts.items()))
+        return f"{self.name}: {elapsed:.1f}s, segments {done}/{self.total_segments}, {rates or 'nothing yet'}"
+
+
+# ─── Parallel scan ───────────────────────────────────────────────────────────
+
+def per_thread(factory):
+    """A function returning factory()'s result, made once per calling thread."""
+    cache = threading.local()
+
+    def get():
+        if not hasattr(cache, "value"):
+            cache.value = factory()
+        return cache.value
+    return get
+
+
+def run_segments(name: str, make_table, process_page, total_segments: int = DEFAULT_SEGMENTS,
+                 checkpoint: Checkpoint | None = None, scan_kwargs: dict | None = None,
+                 report_every: float = REPORT_EVERY) -> Progress:
+    """Scan a table in total_segments parallel segments, handing each page to process_page.
+
+    make_table() is called once per worker (boto3 resources are not
+    thread-safe). process_page(table, items) does the work and returns a
+    Counter of outcomes; "scanned" is counted here. Segments the checkpoint
+    has finished are skipped and the others resume from their last key.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    checkpoint.start(name, total_segments)
+    progress = Progress(name, total_segments)
+
+    def worker(segment):
+        table = make_table()
+        state = checkpoint.segment(name, segment)
+        counts = Counter(state.get("counts", {}))
+        if state.get("done"):
+            progress.add(Counter(), segment_done=True)
+            return
+        kwargs = dict(scan_kwargs or {}, Segment=segment, TotalSegments=total_segments)
+        if state.get("last_key"):
+            kwargs["ExclusiveStartKey"] = state["last_key"]
+        while True:
+            resp = table.scan(**kwargs)
+            page = process_page(table, resp.get("Items", []))
+            page["scanned"] += resp.get("ScannedCount", len(resp.get("Items", [])))
+            counts.update(page)
+            last_key = resp.get("LastEvaluatedKey")
+            checkpoint.save(name, segment, last_key, counts)
+            progress.add(page, segment_done=not last_key)
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(report_every):
+            print(progress.line(), flush=True)
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+    try:
+        with ThreadPoolExecutor(max_workers=total_segments) as pool:
+            # list() re-raises the first worker exception
+            list(pool.map(worker, range(total_segments)))
+    finally:
+        stop.set()
+        reporter.join()
+    checkpoint.finish(name)
+    print(progress.line(), flush=True)
+    return progress
+
+
+# ─── Migrations ──────────────────────────────────────────────────────────────
+
+def _update_kwargs(changes: dict, item: dict, key: tuple) -> dict:
+    """UpdateItem arguments applying changes, conditioned on item being as read."""
+    names = {"#k": key[0]}
+    values = {}
+    sets, removes = [], []
+    conditions = ["attribute_exists(#k)"]
+    for i, (attr, value) in enumerate(changes.items()):
+        names[f"#a{i}"] = attr
+        if value is REMOVE:
+            removes.append(f"#a{i}")
+        else:
+            values[f":n{i}"] = value
+            sets.append(f"#a{i} = :n{i}")
+        if attr in item:
+            values[f":o{i}"] = item[attr]
+            conditions.append(f"#a{i} = :o{i}")
+        else:
+            conditions.append(f"attribute_not_exists(#a{i})")
+    expression = " ".join(
+        clause for clause in (
+            "SET " + ", ".join(sets) if sets else "",
+            "REMOVE " + ", ".join(removes) if removes else "",
+        ) if clause
+    )
+    kwargs = {
+        "UpdateExpression": expression,
+        "ConditionExpression": " AND ".join(conditions),
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        kwargs["ExpressionAttributeValues"] = values
+    return kwargs
+
+
+def migrate_item(table, transform, key: tuple, item: dict, dry_run: bool = False) -> Counter:
+    """Apply transform to one item with a conditional update, re-reading it on conflict."""
+    counts = Counter()
+    item_key = {k: item[k] for k in key}
+    for _ in range(MAX_ATTEMPTS):
+        changes = transform(item) or {}
+        if not changes:
+            return counts
+        if dry_run:
+            counts["changed"] += 1
+            return counts
+        try:
+            table.update_item(Key=item_key, **_update_kwargs(changes, item, key))
+            counts["changed"] += 1
+            return counts
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        counts["conflicts"] += 1
+        item = table.get_item(Key=item_key, ConsistentRead=True).get("Item")
+        if item is None:
+            return counts
+    raise RuntimeError(f"{item_key} kept changing; gave up after {MAX_ATTEMPTS} attempts")
+
+
+def apply_changes(item: dict, changes: dict) -> dict:
+    out = dict(item)
+    for attr, value in changes.items():
+        if value is REMOVE:
+            out.pop(attr, None)
+        else:
+            out[attr] = value
+    return out
+
+
+def migrate_page(migration, key: tuple, dry_run: bool = False):
+    """A process_page for run_segments() applying migration to every item."""
+    def process(table, items):
+        counts = Counter()
+        if not migration.batch:
+            for item in items:
+                counts.update(migrate_item(table, migration.transform, key, item, dry_run))
+            return counts
+        changed = [(item, migration.transform(item)) for item in items]
+        changed = [apply_changes(item, changes) for item, changes in changed if changes]
+        counts["changed"] += len(changed)
+        if changed and not dry_run:
+            with table.batch_writer() as batch:
+                for item in changed:
+                    batch.put_item(Item=item)
+        return counts
+    return process
+
+
+def run_migration(migration, make_table, layout: str = "tables", total_segments: int = DEFAULT_SEGMENTS,
+                  checkpoint: Checkpoint | None = None, dry_run: bool = False) -> Progress:
+    """Run one migration; under the single-table layout, over its entity's items in the car-data table."""
+    key, scan_kwargs = migration.key, {}
+    if layout == "single":
+        key = ("PK", "SK")
+        scan_kwargs["FilterExpression"] = Attr("SK").begins_with(ENTITIES[migration.table].prefix)
+    name = migration.run_name + (" (dry run)" if dry_run else "")
+    return run_segments(
+        name, make_table, migrate_page(migration, key, dry_run), total_segments,
+        checkpoint=None if dry_run else checkpoint, scan_kwargs=scan_kwargs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run versioned data migrations over DynamoDB tables.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--env", choices=["dev", "prod"])
+    target.add_argument("--local", action="store_true", help="run against a seeded in-memory fleet")
+    parser.add_argument("--only", type=int, help="run just the migration with this version")
+    parser.add_argument("--list", action="store_true", help="show migrations and their checkpoint state")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help="parallel scan segments")
+    parser.add_argument("--layout", choices=["tables", "single"], default="tables",
+                        help="where the car data lives (the stack's DataLayout)")
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    parser.add_argument("--checkpoint", help="checkpoint file (default backfill-<env>.json)")
+    parser.add_argument("--cars", type=int, default=4, help="--local: cars to seed")
+    parser.add_argument("--parts", type=int, default=2000, help="--local: parts per car")
+    args = parser.parse_args()
+
+    if args.local:
+        import local
+        from fleet import seed_fleet
+        from memory_dynamodb import TABLE_ENV
+
+        seed_fleet(local.dynamodb, TABLE_ENV, cars=args.cars, parts_per_car=args.parts,
+                   history_rows=args.cars * args.parts, sessions_per_car=args.parts // 10)
+        table_names = {env: TABLE_ENV[env] for env in TABLES}
+        car_data_name = TABLE_ENV["CAR_DATA_TABLE"]
+
+        def resource():
+            return local.dynamodb
+    else:
+        table_names = {env: f"{prefix}-{args.env}" for env, prefix in TABLES.items()}
+        car_data_name = f"{CAR_DATA_TABLE}-{args.env}"
+
+        resource = per_thread(lambda: boto3.session.Session().resource("dynamodb"))
+
+    checkpoint = Checkpoint(args.checkpoint or (None if args.local else f"backfill-{args.env}.json"))
+    migrations = [m for m in MIGRATIONS if args.only in (None, m.version)]
+    if args.list:
+        for m in migrations:
+            run = checkpoint.runs.get(m.run_name)
+            if run is None:
+                state = "pending"
+            elif run["done"]:
+                state = "done"
+            else:
+                finished = sum(s["done"] for s in run["segments"].values())
+                state = f"in progress ({finished}/{run['total_segments']} segments)"
+            print(f"{m.run_name:40} {m.table:22} {state}")
+        return
+
+    for m in migrations:
+        if checkpoint.done(m.run_name) and not args.dry_run:
+            print(f"{m.run_name}: already done")
+            continue
+        name = car_data_name if args.layout == "single" else table_names[m.table]
+        run_migration(m, lambda name=name: resource().Table(name), args.layout, args.segments,
+                      checkpoint, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Per-handler micro-benchmark against the in-memory DynamoDB stand-in.
+
+Seeds a synthetic fleet (default 10 cars x 5,000 parts, 50,000 history
+rows) and invokes each handler in-process, reporting per invocation:
+
+  - latency (median and max over --runs)
+  - DynamoDB requests and items read/written, from the stand-in's counters
+  - read/write capacity units, from the metrics line the handler emits
+  - peak Python memory allocated (tracemalloc, measured on a separate run)
+
+The stand-in is not DynamoDB: absolute latencies only include Python and
+serialization work, not network round trips. Use request counts for the
+I/O side and compare latencies between revisions of the code.
+
+Usage:
+    python backend/tools/bench_handlers.py
+    python backend/tools/bench_handlers.py --cars 2 --parts 500 --history 2000 --runs 5
+    python backend/tools/bench_handlers.py --only reports
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+import local
+import metrics
+import report_cache
+from fleet import seed_fleet
+from memory_dynamodb import TABLE_ENV
+from versions import bump_car_version
+
+
+def scenarios(car_id: str, part_id: str):
+    """(name, handler, kwargs for local.invoke, setup) for every benchmarked handler."""
+    cars = local.dynamodb.Table(TABLE_ENV["CARS_TABLE"])
+    cold = lambda: bump_car_version(cars, car_id)  # noqa: E731 - invalidates cached reports
+    car = {"car_id": car_id}
+
+    def warm():
+        # Reports are only cached once the car's version is SETTLE_MS old:
+        # backdate it and fill the cache (outside the measurement)
+        cars.update_item(
+            Key=car,
+            UpdateExpression="SET data_version_at = :t",
+            ExpressionAttributeValues={":t": int(time.time() * 1000) - report_cache.SETTLE_MS},
+        )
+        local.invoke("reports/car_reports.py", path=car)
+
+    part = {"car_id": car_id, "part_id": part_id}
+    return [
+        ("list_cars", "cars/list_cars.py", {}, None),
+        ("list_fields", "parts/list_fields.py", {}, None),
+        ("list_parts", "parts/list_parts.py", {"path": car}, None),
+        ("list_parts ?fields=", "parts/list_parts.py",
+         {"path": car, "qs": {"fields": "part_name,part_number,miles_used"}}, None),
+        ("get_part", "parts/get_part.py", {"path": part}, None),
+        ("part_history", "parts/part_history.py", {"path": car}, None),
+        ("get_miles_log", "miles/get_miles_log.py", {"path": car}, None),
+        ("reports high_miles (miss)", "reports/high_miles.py", {"path": car}, cold),
+        ("reports mbf (miss)", "reports/miles_between_failures.py", {"path": car}, cold),
+        ("reports likely_to_fail (miss)", "reports/likely_to_fail.py", {"path": car}, cold),
+        ("reports combined (miss)", "reports/car_reports.py", {"path": car}, cold),
+        ("reports combined (hit)", "reports/car_reports.py", {"path": car}, warm),
+        ("update_part", "parts/update_part.py",
+         {"method": "PUT", "path": part, "body": {"cost": "13.00"}}, None),
+        ("create_part", "parts/create_part.py",
+         {"method": "POST", "path": car, "body": {
+             "part_number": "PN-BENCH", "part_name": "Bench part",
+             "part_group": "brakes", "part_location": "front_left"}}, None),
+        ("log_miles", "miles/log_miles.py",
+         {"method": "POST", "path": car, "body": {"miles": 1.5, "note": "bench"}}, None),
+    ]
+
+
+def measure(rel: str, kwargs: dict, setup, runs: int) -> dict:
+    db = local.dynamodb
+    times = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        db.reset_stats()
+        start = time.perf_counter()
+        resp = local.invoke(rel, **kwargs)
+        times.append((time.perf_counter() - start) * 1000)
+        if resp["statusCode"] >= 400:
+            raise RuntimeError(f"{rel} returned {resp['statusCode']}: {local.body(resp)}")
+    calls = sum(db.calls.values())
+    items = sum(db.items_touched.values())
+
+    # One more run with metrics on, for consumed capacity
+    if setup:
+        setup()
+    lines = []
+    metrics.METRICS_ENABLED, metrics.sink = True, lines.append
+    try:
+        local.invoke(rel, **kwargs)
+    finally:
+        metrics.METRICS_ENABLED, metrics.sink = False, metrics.stdout_sink
+    emf = json.loads(lines[-1])
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    local.invoke(rel, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(times),
+        "max_ms": max(times),
+        "calls": calls,
+        "items": items,
+        "rcu": emf["ConsumedRCU"],
+        "wcu": emf["ConsumedWCU"],
+        "peak_kb": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lambda handlers in-process.")
+    parser.add_argument("--cars", type=int, default=10)
+    parser.add_argument("--parts", type=int, default=5000, help="parts per car")
+    parser.add_argument("--history", type=int, default=50_000, help="history rows across the fleet")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--only", help="run scenarios whose name contains this string")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    car_ids = seed_fleet(local.dynamodb, TABLE_ENV, cars=args.cars,
+                         parts_per_car=args.parts, history_rows=args.history)
+    print(f"Seeded {args.cars} cars x {args.parts} parts, {args.history} history rows "
+          f"in {time.perf_counter() - start:.1f}s\n")
+
+    car_id = car_ids[0]
+    part_id = local.body(local.invoke("parts/list_parts.py", path={"car_id": car_id}))["parts"][0]["part_id"]
+
+    print(f"{'handler':<32}{'median ms':>10}{'max ms':>10}{'requests':>10}{'items':>10}"
+          f"{'RCU':>9}{'WCU':>9}{'peak KB':>10}")
+    for name, rel, kwargs, setup in scenarios(car_id, part_id):
+        if args.only and args.only not in name:
+            continue
+        r = measure(rel, kwargs, setup, args.runs)
+        print(f"{name:<32}{r['median_ms']:>10.1f}{r['max_ms']:>10.1f}"
+              f"{r['calls']:>10}{r['items']:>10}{r['rcu']:>9.1f}{r['wcu']:>9.1f}{r['peak_kb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Response encoding benchmark.
+
+Builds a synthetic car with 5000 parts (the shape list_parts returns) and
+compares the old json.dumps(default=str) serialization against
+utils.encode_json, plus the size of the gzip / brotli encoded bodies that
+finalize_response would send.
+
+Usage:
+    python backend/tools/bench_response.py [--parts 5000] [--runs 20]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambdas", "shared"))
+
+import utils  # noqa: E402
+
+
+def synthetic_parts(n: int) -> list:
+    rng = random.Random(0)
+    return [
+        {
+            "part_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "car_id": "bench-car",
+            "part_number": f"PN-{i % 300:04d}",
+            "part_name": f"Wheel bearing {i}",
+            "part_group": rng.choice(["suspension", "brakes", "electrical", "drivetrain"]),
+            "part_location": rng.choice(["front_left", "front_right", "rear_left", "rear_right"]),
+            "miles_used": Decimal(str(round(rng.random() * 900, 1))),
+            "active": True,
+            "created_at": "2024-03-15T12:00:00+00:00",
+            "updated_at": "2024-03-15T12:00:00+00:00",
+            "created_by": "bench@berkeley.edu",
+            "extra_fields": {"wrench_size": "10mm", "torque_nm": Decimal(20)},
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, runs: int):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - start) / runs * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--parts", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    parts = synthetic_parts(args.parts)
+    body = {"parts": parts, "count": len(parts)}
+
+    old_ms, old = timed(lambda: json.dumps(body, default=str), args.runs)
+    new_ms, new = timed(lambda: utils.encode_json(body), args.runs)
+    raw = new.encode()
+    gzip_ms, gz = timed(lambda: gzip.compress(raw, compresslevel=utils.GZIP_LEVEL), args.runs)
+
+    print(f"{args.parts} parts, mean of {args.runs} runs")
+    print(f"  {'encoding':<28}{'ms':>8}{'bytes':>12}")
+    print(f"  {'json.dumps(default=str)':<28}{old_ms:>8.1f}{len(old):>12,}")
+    print(f"  {'encode_json':<28}{new_ms:>8.1f}{len(raw):>12,}")
+    print(f"  {'+ gzip level %d' % utils.GZIP_LEVEL:<28}{gzip_ms:>8.1f}{len(gz):>12,}")
+    if utils.brotli is not None:
+        br_ms, br = timed(lambda: utils.brotli.compress(raw, quality=utils.BROTLI_QUALITY), args.runs)
+        print(f"  {'+ brotli quality %d' % utils.BROTLI_QUALITY:<28}{br_ms:>8.1f}{len(br):>12,}")
+    else:
+        print("  (brotli not installed; skipped)")
+
+    event = {"headers": {"Accept-Encoding": "gzip, deflate, br"}}
+    end_ms, _ = timed(lambda: utils.finalize_response(event, utils.ok(body)), args.runs)
+    print(f"  {'ok() + finalize_response':<28}{end_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
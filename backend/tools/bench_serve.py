@@ -0,0 +1,152 @@
+"""
+Throughput of the HTTP service mode (serve.py) against Lambda-style
+invocation, on the in-memory stand-in.
+
+Runs the same request mix three ways:
+
+  lambda cold   each request loads a fresh copy of its handler module and
+                builds a boto3 resource first, as a cold start does (the
+                Python share of it; the runtime's own init is not counted)
+  lambda warm   one request at a time through local.invoke(), as one
+                warm Lambda container serves them
+  serve         real HTTP over loopback to serve.py's pooled WSGI server,
+                from --clients concurrent connections
+
+--latency-ms delays every DynamoDB request by that much (through the
+stand-in's fault hook) to stand in for the network round trip, which is
+what lets a pool of workers overlap requests; with 0 only Python work is
+measured and the GIL keeps the threads from adding much.
+
+Usage:
+    python backend/tools/bench_serve.py
+    python backend/tools/bench_serve.py --requests 2000 --clients 32 --workers 32 --latency-ms 5
+"""
+import argparse
+import http.client
+import importlib.util
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+import local
+import serve
+from fleet import seed_fleet
+from memory_dynamodb import TABLE_ENV
+
+
+def request_mix(car_ids: list, part_ids: dict) -> list:
+    """(handler file, method, path parameters, resource path) for one pass over the fleet."""
+    mix = []
+    for car_id in car_ids:
+        part_id = part_ids[car_id]
+        mix += [
+            ("cars/list_cars.py", "/cars", {}),
+            ("parts/list_parts.py", "/cars/{car_id}/parts", {"car_id": car_id}),
+            ("parts/get_part.py", "/cars/{car_id}/parts/{part_id}", {"car_id": car_id, "part_id": part_id}),
+            ("miles/get_miles_log.py", "/cars/{car_id}/miles", {"car_id": car_id}),
+            ("reports/car_reports.py", "/cars/{car_id}/reports", {"car_id": car_id}),
+        ]
+    return mix
+
+
+def summarize(name: str, latencies: list, elapsed: float) -> str:
+    ms = sorted(x * 1000 for x in latencies)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    return (f"{name:14} {len(ms) / elapsed:10.0f} {statistics.median(ms):9.1f} {p99:9.1f} "
+            f"{len(ms):9}")
+
+
+def run_lambda(mix: list, requests: int, cold: bool) -> tuple:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        rel, resource, path = mix[i % len(mix)]
+        t0 = time.perf_counter()
+        if cold:
+            spec = importlib.util.spec_from_file_location(
+                f"cold_{i}", os.path.join(local.LAMBDAS_DIR, rel))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            boto3.session.Session().resource("dynamodb", region_name="us-west-2")
+            handler = module.handler
+        else:
+            handler = local.load_handler(rel)
+        resp = handler(local.event("GET", path, resource=resource), local.LambdaContext())
+        latencies.append(time.perf_counter() - t0)
+        assert resp["statusCode"] == 200, (rel, resp["statusCode"])
+    return latencies, time.perf_counter() - start
+
+
+def run_serve(mix: list, requests: int, clients: int, port: int) -> tuple:
+    headers = {"Authorization": f"Bearer {local.token()}", "Accept-Encoding": "gzip"}
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        mine = []
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        for i in counter:
+            _, resource, path = mix[i % len(mix)]
+            url = resource.format(**path)
+            t0 = time.perf_counter()
+            conn.request("GET", url, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            mine.append(time.perf_counter() - t0)
+            assert resp.status == 200, (url, resp.status)
+            if resp.getheader("Connection", "").lower() == "close" or resp.version == 10:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+        with lock:
+            latencies.extend(mine)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serve.py against Lambda-style invocation.")
+    parser.add_argument("--cars", type=int, default=4)
+    parser.add_argument("--parts", type=int, default=500, help="parts per car")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per mode")
+    parser.add_argument("--cold-requests", type=int, default=50, help="requests for the cold mode")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent HTTP connections")
+    parser.add_argument("--workers", type=int, default=16, help="serve.py worker threads")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="added to every DynamoDB request")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    car_ids = seed_fleet(local.dynamodb, TABLE_ENV, cars=args.cars, parts_per_car=args.parts,
+                         history_rows=args.cars * args.parts, sessions_per_car=args.parts // 10)
+    parts = local.dynamodb.Table(TABLE_ENV["PARTS_TABLE"]).scan(Limit=args.cars * args.parts)["Items"]
+    part_ids = {p["car_id"]: p["part_id"] for p in parts}
+    mix = request_mix(car_ids, part_ids)
+    if args.latency_ms:
+        delay = args.latency_ms / 1000
+        local.dynamodb.fault = lambda op, table: time.sleep(delay)
+
+    api = serve.Api(workers=args.workers)
+    serve._api = api
+    api.warm()
+    httpd = serve.serve("127.0.0.1", args.port, quiet=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    print(f"{args.cars} cars x {args.parts} parts, {len(mix)} distinct requests, "
+          f"{args.latency_ms:g} ms per DynamoDB request\n")
+    print(f"{'mode':14} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'requests':>9}")
+    print(summarize("lambda cold", *run_lambda(mix, args.cold_requests, cold=True)))
+    print(summarize("lambda warm", *run_lambda(mix, args.requests, cold=False)))
+    print(summarize(f"serve x{args.clients}", *run_serve(mix, args.requests, args.clients, args.port)))
+    httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Synthetic fleet data for the benchmark and stress tools.
+
+seed_fleet() writes cars, parts (and their search / field index rows), part
+history (and its failure stats), miles log entries and part field
+definitions straight into a DynamoDB resource (normally the in-memory
+stand-in), shaped like the items the handlers themselves write.
+Generation is seeded, so two runs with the same arguments produce the
+same fleet.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import field_index
+import risk_alerts
+import search_index
+
+GROUPS = ["suspension", "drivetrain", "engine", "body", "electrical", "brakes", "other"]
+LOCATIONS = [
+    "front_right", "front_left", "rear_right", "rear_left",
+    "front_center", "rear_center", "center_center",
+]
+REASONS = ["failure", "failure", "scheduled", "upgrade", "other"]
+PART_NUMBERS_PER_CAR = 300
+SEED_EMAIL = "seed@berkeley.edu"
+# Custom fields every synthetic part carries: name -> (field_type, dropdown options)
+FIELDS = {
+    "wrench_size": ("dropdown", [f"{n}mm" for n in range(8, 16)]),
+    "torque_nm": ("number", []),
+}
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _miles(rng: random.Random, high: float = 900.0) -> Decimal:
+    return Decimal(str(round(rng.random() * high, 1)))
+
+
+def make_part(rng: random.Random, car_id: str, n: int, now: str) -> dict:
+    return {
+        "part_id": _uuid(rng),
+        "car_id": car_id,
+        "part_number": f"PN-{n % PART_NUMBERS_PER_CAR:04d}",
+        "part_name": f"Part {n % PART_NUMBERS_PER_CAR}",
+        "part_group": GROUPS[n % len(GROUPS)],
+        "part_location": LOCATIONS[n % len(LOCATIONS)],
+        "miles_used": _miles(rng),
+        "active": True,
+        "created_at": now,
+        "updated_at": now,
+        "created_by": SEED_EMAIL,
+        "purchased_from": "McMaster-Carr",
+        "cost": "12.50",
+        "extra_fields": {"wrench_size": f"{8 + n % 8}mm", "torque_nm": str(10 + n % 40)},
+    }
+
+
+def seed_fleet(dynamodb, tables: dict, cars: int = 10, parts_per_car: int = 5000,
+               history_rows: int = 50_000, sessions_per_car: int = 200, seed: int = 0) -> list:
+    """Populate tables (env var name -> table name) and return the car ids.
+
+    history_rows is the fleet-wide total, spread evenly over the cars.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    now = start.isoformat()
+    car_ids = [f"car-{i:02d}" for i in range(cars)]
+    history_per_car = history_rows // max(cars, 1)
+
+    with dynamodb.Table(tables["CARS_TABLE"]).batch_writer() as batch:
+        for i, car_id in enumerate(car_ids):
+            batch.put_item(Item={
+                "car_id": car_id,
+                "name": f"Zephyr {i}",
+                "description": "Synthetic car",
+                "year": str(2015 + i),
+                "created_at": now,
+                "created_by": SEED_EMAIL,
+            })
+
+    parts = [make_part(rng, car_id, n, now) for car_id in car_ids for n in range(parts_per_car)]
+    with dynamodb.Table(tables["PARTS_TABLE"]).batch_writer() as batch:
+        for part in parts:
+            batch.put_item(Item=part)
+    search_index.index_parts(dynamodb.Table(tables["SEARCH_INDEX_TABLE"]), parts)
+    field_index.index_parts(dynamodb.Table(tables["FIELD_INDEX_TABLE"]), parts,
+                            {name: field_type for name, (field_type, _) in FIELDS.items()})
+
+    history = []
+    with dynamodb.Table(tables["PART_HISTORY_TABLE"]).batch_writer() as batch:
+        for car_id in car_ids:
+            for n in range(history_per_car):
+                replaced_at = (start + timedelta(minutes=n)).isoformat()
+                history.append({
+                    "history_id": _uuid(rng),
+                    "car_id": car_id,
+                    "part_id": _uuid(rng),
+                    "part_number": f"PN-{rng.randrange(PART_NUMBERS_PER_CAR):04d}",
+                    "part_name": "Retired part",
+                    "part_group": rng.choice(GROUPS),
+                    "part_location": rng.choice(LOCATIONS),
+                    "miles_at_retirement": _miles(rng, 1200.0),
+                    "reason": rng.choice(REASONS),
+                    "note": "",
+                    "replaced_by": SEED_EMAIL,
+                    "replaced_at": replaced_at,
+                    "extra_fields": {},
+                })
+                batch.put_item(Item=history[-1])
+    risk_alerts.write_stats(dynamodb.Table(tables["FAILURE_STATS_TABLE"]), history)
+
+    with dynamodb.Table(tables["MILES_LOG_TABLE"]).batch_writer() as batch:
+        for car_id in car_ids:
+            for n in range(sessions_per_car):
+                logged_at = start + timedelta(hours=n)
+                batch.put_item(Item={
+                    "log_id": _uuid(rng),
+                    "car_id": car_id,
+                    "miles": str(round(rng.random() * 30, 1)),
+                    "note": "Test session",
+                    "test_date": logged_at.date().isoformat(),
+                    "logged_at": logged_at.isoformat(),
+                    "logged_by": SEED_EMAIL,
+                })
+
+    with dynamodb.Table(tables["PART_FIELDS_TABLE"]).batch_writer() as batch:
+        for name, (field_type, options) in FIELDS.items():
+            batch.put_item(Item={
+                "field_id": _uuid(rng),
+                "field_name": name,
+                "label": name.replace("_", " ").title(),
+                "field_type": field_type,
+                "options": options,
+                "created_at": now,
+                "created_by": SEED_EMAIL,
+            })
+
+    return car_ids
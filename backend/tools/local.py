@@ -0,0 +1,150 @@
+"""
+Run Lambda handlers in-process against the in-memory DynamoDB stand-in.
+
+Importing this module points every table environment variable at
+memory_dynamodb's tables, puts backend/lambdas/shared on sys.path and
+installs a MemoryDynamoDB instance through db.use() (and a MemoryBroker
+through push.use()), so handler modules can then be loaded and invoked
+without AWS:
+
+    import local
+
+    resp = local.invoke("parts/list_parts.py", path={"car_id": car_id})
+    local.body(resp)["parts"]
+
+With LOCAL_DB=<path> the tables live in that SQLite file instead (see
+sqlite_dynamodb.py), so data written offline survives restarts and can
+be synced to AWS later with sync_local.py.
+
+Used by the benchmark and stress tools in this directory.
+"""
+import base64
+import gzip
+import importlib.util
+import json
+import os
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS_DIR = os.path.join(TOOLS_DIR, "..", "lambdas")
+
+sys.path.insert(0, os.path.join(LAMBDAS_DIR, "shared"))
+sys.path.insert(0, TOOLS_DIR)
+
+from memory_dynamodb import MemoryDynamoDB, TABLE_ENV  # noqa: E402
+
+for _env, _name in TABLE_ENV.items():
+    os.environ.setdefault(_env, _name)
+os.environ.setdefault("GOOGLE_CLIENT_ID", "local")
+os.environ.setdefault("JWT_SECRET", "local-secret")
+# EMF lines would flood tool output; tools that want them turn metrics back on
+os.environ.setdefault("METRICS_ENABLED", "false")
+# The tools drive thousands of requests as one user; they would only measure 429s
+os.environ.setdefault("RATE_LIMITS_ENABLED", "false")
+
+import db  # noqa: E402
+import push  # noqa: E402
+import utils  # noqa: E402
+from memory_broker import MemoryBroker  # noqa: E402
+
+if os.environ.get("LOCAL_DB"):
+    from sqlite_dynamodb import SQLiteDynamoDB
+    dynamodb = SQLiteDynamoDB(os.environ["LOCAL_DB"])
+else:
+    dynamodb = MemoryDynamoDB()
+db.use(dynamodb)
+broker = MemoryBroker()
+push.use(broker)
+
+_handlers = {}
+_users = set()
+
+
+def load_handler(rel: str):
+    """Import backend/lambdas/<rel> (e.g. "parts/list_parts.py") once and return its handler."""
+    if rel not in _handlers:
+        name = "local_" + rel[:-3].replace("/", "_")
+        path = os.path.join(LAMBDAS_DIR, rel)
+        # Modules next to the handler (as in its package); shared ones take precedence
+        if os.path.dirname(path) not in sys.path:
+            sys.path.append(os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _handlers[rel] = module.handler
+    return _handlers[rel]
+
+
+def token(role: str = "admin", email: str = "bench@berkeley.edu") -> str:
+    """A signed token for an active user with role, created in the users table on first use
+    (the auth decorators check the stored status and role, see auth_cache.py)."""
+    user_id = f"local-{role}-{email}"
+    if user_id not in _users:
+        dynamodb.Table(os.environ["USERS_TABLE"]).put_item(Item={
+            "user_id": user_id, "email": email, "name": email, "role": role, "status": "active",
+        })
+        _users.add(user_id)
+    return utils.create_jwt({"user_id": user_id, "email": email, "name": email, "role": role})
+
+
+def event(method: str = "GET", path: dict | None = None, qs: dict | None = None,
+          body=None, headers: dict | None = None, role: str = "admin", resource: str = "") -> dict:
+    """An API Gateway proxy event carrying a valid bearer token."""
+    return {
+        "httpMethod": method,
+        "resource": resource,
+        "path": resource,
+        "pathParameters": path or {},
+        "queryStringParameters": qs,
+        "headers": {"Authorization": f"Bearer {token(role)}", **(headers or {})},
+        "body": json.dumps(body) if body is not None else None,
+    }
+
+
+class LambdaContext:
+    """Just enough of the Lambda context object for handlers that ask for time left."""
+
+    def __init__(self, timeout_ms: int = 30_000):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+        self.function_name = "local"
+        self.aws_request_id = "local"
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def invoke(rel: str, method: str = "GET", path: dict | None = None, qs: dict | None = None,
+           body=None, headers: dict | None = None, role: str = "admin") -> dict:
+    return load_handler(rel)(event(method, path, qs, body, headers, role, resource=rel), LambdaContext())
+
+
+def connect(car_id: str, role: str = "admin") -> str | None:
+    """Open a push connection for car_id through push/connect.py; None if it was refused."""
+    connection_id = broker.open()
+    resp = load_handler("push/connect.py")({
+        "requestContext": {"eventType": "CONNECT", "connectionId": connection_id},
+        "queryStringParameters": {"token": token(role), "car_id": car_id},
+        "headers": {},
+    }, LambdaContext())
+    if resp["statusCode"] != 200:
+        broker.close(connection_id)
+        return None
+    return connection_id
+
+
+def disconnect(connection_id: str):
+    load_handler("push/disconnect.py")(
+        {"requestContext": {"eventType": "DISCONNECT", "connectionId": connection_id}}, LambdaContext())
+    broker.close(connection_id)
+
+
+def body(resp: dict):
+    """The decoded JSON body of a handler response (gzip and base64 aware)."""
+    raw = resp.get("body") or ""
+    if resp.get("isBase64Encoded"):
+        raw = base64.b64decode(raw)
+        if (resp.get("headers") or {}).get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        raw = raw.decode()
+    return json.loads(raw) if raw else None
@@ -0,0 +1,58 @@
+"""
+In-process stand-in for the push API's WebSocket connections.
+
+push.publish() hands each message to a broker's send(); on AWS that posts
+through the API Gateway management API. MemoryBroker keeps an inbox per
+connection instead, so tools can open connections, run handlers and see
+exactly what each client would have received:
+
+    import local
+
+    conn = local.connect(car_id)          # opens + runs push/connect.py
+    local.invoke("miles/log_miles.py", method="POST", path={"car_id": car_id},
+                 body={"miles": 5})
+    local.broker.messages(conn)           # [{"type": "changes", ...}]
+
+local.py installs one with push.use().
+"""
+import itertools
+import json
+import threading
+
+import push
+
+
+class MemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._inboxes = {}
+        self.sent = 0
+
+    def open(self) -> str:
+        """A new connection id, as API Gateway assigns one before $connect runs."""
+        with self._lock:
+            connection_id = f"local-{next(self._ids)}="
+            self._inboxes[connection_id] = []
+        return connection_id
+
+    def close(self, connection_id: str):
+        """Drop the connection without $disconnect, like a laptop going to sleep."""
+        with self._lock:
+            self._inboxes.pop(connection_id, None)
+
+    def send(self, connection_id: str, data: bytes):
+        with self._lock:
+            inbox = self._inboxes.get(connection_id)
+            if inbox is None:
+                raise push.Gone(connection_id)
+            inbox.append(json.loads(data))
+            self.sent += 1
+
+    def messages(self, connection_id: str, clear: bool = True) -> list:
+        with self._lock:
+            inbox = self._inboxes.get(connection_id, [])
+            out = list(inbox)
+            if clear:
+                inbox.clear()
+        return out
@@ -0,0 +1,1112 @@
+"""
+In-memory stand-in for the DynamoDB resource API used by the Lambdas.
+
+Supports the subset of boto3's ``dynamodb`` resource the handlers rely on:
+``Table.query`` (base table and the GSIs declared in template.yaml),
+``scan`` (including parallel segments), ``get_item``, ``put_item``,
+``update_item`` and ``delete_item`` with condition / update / projection
+expressions, ``batch_writer``, resource-level ``batch_get_item`` /
+``batch_write_item`` and ``meta.client.transact_write_items``.
+
+Requests fire ``provide-client-params`` / ``after-call`` events on
+``meta.client.meta.events`` like botocore does, and honour
+ReturnConsumedCapacity, so the shared metrics hooks work against it.
+
+Items are round-tripped through boto3's type serializer on the way in, so
+the same mistakes that fail against real DynamoDB (e.g. storing a float)
+fail here too. Query and scan pages are cut at 1 MB like the real service,
+so handlers that forget ``LastEvaluatedKey`` are caught.
+
+Usage:
+    import db
+    from memory_dynamodb import MemoryDynamoDB
+
+    fake = MemoryDynamoDB()
+    db.use(fake)               # before importing any handler module
+"""
+import copy
+import functools
+import math
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from decimal import Decimal
+from types import SimpleNamespace
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+# Key schemas mirrored from template.yaml: table -> (hash, range, {index: (hash, range)})
+SCHEMAS = {
+    "UsersTable": ("user_id", None, {"email-index": ("email", None)}),
+    "CarsTable": ("car_id", None, {}),
+    "PartsTable": ("part_id", None, {"car-index": ("car_id", None)}),
+    "PartHistoryTable": ("history_id", None, {"car-history-index": ("car_id", "replaced_at")}),
+    "MilesLogTable": ("log_id", None, {"car-miles-index": ("car_id", "logged_at")}),
+    "PartFieldsTable": ("field_id", None, {}),
+    "ReportCacheTable": ("car_id", "cache_key", {}),
+    "CountersTable": ("counter_id", None, {}),
+    "SearchIndexTable": ("bucket", "entry", {}),
+    "FieldIndexTable": ("field_key", "value_key", {}),
+    "ChangeLogTable": ("car_id", "change_key", {}),
+    "ConnectionsTable": ("connection_id", None, {"car-index": ("car_id", None)}),
+    "FailureStatsTable": ("car_id", "part_number", {}),
+    "AlertsTable": ("car_id", "part_id", {}),
+    "RateLimitsTable": ("bucket_id", None, {}),
+    "IdempotencyTable": ("record_id", None, {}),
+    "BomTemplatesTable": ("template_id", None, {}),
+    "BomTemplatePartsTable": ("template_id", "line_id", {}),
+    "CarDataTable": ("PK", "SK", {"ts-index": ("PK", "TS"), "id-index": ("ID", None)}),
+}
+
+# Environment variables the handlers read their table names from.
+TABLE_ENV = {
+    "USERS_TABLE": "UsersTable",
+    "CARS_TABLE": "CarsTable",
+    "PARTS_TABLE": "PartsTable",
+    "PART_HISTORY_TABLE": "PartHistoryTable",
+    "MILES_LOG_TABLE": "MilesLogTable",
+    "PART_FIELDS_TABLE": "PartFieldsTable",
+    "REPORT_CACHE_TABLE": "ReportCacheTable",
+    "COUNTERS_TABLE": "CountersTable",
+    "SEARCH_INDEX_TABLE": "SearchIndexTable",
+    "FIELD_INDEX_TABLE": "FieldIndexTable",
+    "CHANGE_LOG_TABLE": "ChangeLogTable",
+    "CONNECTIONS_TABLE": "ConnectionsTable",
+    "FAILURE_STATS_TABLE": "FailureStatsTable",
+    "ALERTS_TABLE": "AlertsTable",
+    "RATE_LIMITS_TABLE": "RateLimitsTable",
+    "IDEMPOTENCY_TABLE": "IdempotencyTable",
+    "BOM_TEMPLATES_TABLE": "BomTemplatesTable",
+    "BOM_TEMPLATE_PARTS_TABLE": "BomTemplatePartsTable",
+    "CAR_DATA_TABLE": "CarDataTable",
+}
+
+PAGE_BYTES = 1024 * 1024
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def _normalize(value):
+    """Validate and normalize a Python value exactly as boto3 would store it."""
+    return _deserializer.deserialize(_serializer.serialize(value))
+
+
+def _value_size(value) -> int:
+    # Following DynamoDB's item size rules closely enough for the 1 MB / 400 KB limits.
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, "value") and isinstance(value.value, (bytes, bytearray)):  # boto3 Binary
+        return len(value.value)
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, Decimal):
+        return len(str(value)) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(k.encode()) + _value_size(v) + 1 for k, v in value.items())
+    if isinstance(value, (list, set, frozenset)):
+        return 3 + sum(_value_size(v) + 1 for v in value)
+    return len(str(value))
+
+
+def _item_size(item: dict) -> int:
+    return sum(len(k.encode()) + _value_size(v) for k, v in item.items())
+
+
+def _sort_key(value):
+    # Strings sort lexically, numbers numerically; missing values sort first.
+    if value is None:
+        return (0, "")
+    if isinstance(value, Decimal):
+        return (1, value)
+    return (2, str(value))
+
+
+# ─── Expression parsing ──────────────────────────────────────────────────────
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:(<>|<=|>=|[=<>(),.\[\]+\-])|(#[A-Za-z0-9_]+)|(:[A-Za-z0-9_]+)|([A-Za-z_][A-Za-z0-9_]*)|(\d+))"
+)
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+
+
+def _tokenize(expr: str) -> list:
+    tokens, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise _error("ValidationException", f"Invalid expression near: {expr[pos:]!r}", "Parse")
+        punct, name, value, ident, number = m.groups()
+        if punct:
+            tokens.append(("P", punct))
+        elif name:
+            tokens.append(("NAME", name))
+        elif value:
+            tokens.append(("VALUE", value))
+        elif ident:
+            upper = ident.upper()
+            tokens.append(("KW", upper) if upper in _KEYWORDS else ("ID", ident))
+        else:
+            tokens.append(("NUM", int(number)))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expr: str, names: dict | None, values: dict | None):
+        self.tokens = _tokenize(expr)
+        self.i = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, kind=None, text=None):
+        if self.i >= len(self.tokens):
+            return None
+        tok = self.tokens[self.i]
+        if kind and tok[0] != kind:
+            return None
+        if text is not None and tok[1] != text:
+            return None
+        return tok
+
+    def take(self, kind=None, text=None):
+        tok = self.peek(kind, text)
+        if tok is None:
+            found = self.tokens[self.i] if self.i < len(self.tokens) else "end of expression"
+            raise _error("ValidationException", f"Expected {text or kind}, found {found}", "Parse")
+        self.i += 1
+        return tok
+
+    def done(self):
+        return self.i >= len(self.tokens)
+
+    # Paths: a.b[0].#c
+    def path(self) -> list:
+        parts = [self._element()]
+        while True:
+            if self.peek("P", "."):
+                self.take()
+                parts.append(self._element())
+            elif self.peek("P", "["):
+                self.take()
+                parts.append(self.take("NUM")[1])
+                self.take("P", "]")
+            else:
+                return parts
+
+    def _element(self) -> str:
+        tok = self.peek("NAME")
+        if tok:
+            self.take()
+            if tok[1] not in self.names:
+                raise _error("ValidationException", f"Undefined attribute name {tok[1]}", "Parse")
+            return self.names[tok[1]]
+        return self.take("ID")[1]
+
+    def value(self):
+        tok = self.take("VALUE")
+        if tok[1] not in self.values:
+            raise _error("ValidationException", f"Undefined attribute value {tok[1]}", "Parse")
+        return _normalize(self.values[tok[1]])
+
+
+def _get_path(item, path):
+    cur = item
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(cur, list) or part >= len(cur):
+                return _MISSING
+            cur = cur[part]
+        else:
+            if not isinstance(cur, dict) or part not in cur:
+                return _MISSING
+            cur = cur[part]
+    return cur
+
+
+def _set_path(item, path, value):
+    cur = item
+    for part in path[:-1]:
+        cur = cur[part] if isinstance(part, int) else cur.setdefault(part, {})
+    last = path[-1]
+    if isinstance(last, int) and isinstance(cur, list):
+        if last >= len(cur):
+            cur.append(value)
+        else:
+            cur[last] = value
+    else:
+        cur[last] = value
+
+
+def _remove_path(item, path):
+    parent = _get_path(item, path[:-1]) if len(path) > 1 else item
+    if parent is _MISSING:
+        return
+    last = path[-1]
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and isinstance(last, int) and last < len(parent):
+        parent.pop(last)
+
+
+class _Missing:
+    def __repr__(self):
+        return "<missing>"
+
+
+_MISSING = _Missing()
+
+_TYPE_CODES = {
+    "S": str, "N": Decimal, "BOOL": bool, "M": dict, "L": list, "NULL": type(None),
+}
+
+
+class _ConditionParser(_Parser):
+    """Compiles a condition / filter / key-condition expression into a predicate."""
+
+    def compile(self):
+        pred = self._or()
+        if not self.done():
+            raise _error("ValidationException", f"Unexpected token {self.tokens[self.i]}", "Parse")
+        return pred
+
+    def _or(self):
+        left = self._and()
+        while self.peek("KW", "OR"):
+            self.take()
+            right = self._and()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def _and(self):
+        left = self._not()
+        while self.peek("KW", "AND"):
+            self.take()
+            right = self._not()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def _not(self):
+        if self.peek("KW", "NOT"):
+            self.take()
+            inner = self._not()
+            return lambda item: not inner(item)
+        return self._primary()
+
+    def _primary(self):
+        if self.peek("P", "("):
+            self.take()
+            inner = self._or()
+            self.take("P", ")")
+            return inner
+        tok = self.peek("ID")
+        nxt = self.tokens[self.i + 1] if self.i + 1 < len(self.tokens) else None
+        if tok and nxt == ("P", "(") and tok[1] != "size":
+            return self._function()
+        left = self._operand()
+        if self.peek("KW", "BETWEEN"):
+            self.take()
+            low = self._operand()
+            self.take("KW", "AND")
+            high = self._operand()
+
+            def between(item):
+                v, lo, hi = left(item), low(item), high(item)
+                return _comparable(v, lo) and _comparable(v, hi) and lo <= v <= hi
+            return between
+        if self.peek("KW", "IN"):
+            self.take()
+            self.take("P", "(")
+            options = [self._operand()]
+            while self.peek("P", ","):
+                self.take()
+                options.append(self._operand())
+            self.take("P", ")")
+            return lambda item: any(left(item) == o(item) for o in options if left(item) is not _MISSING)
+        op = self.take("P")[1]
+        right = self._operand()
+        return _comparison(op, left, right)
+
+    def _operand(self):
+        if self.peek("VALUE"):
+            v = self.value()
+            return lambda item: v
+        tok = self.peek("ID")
+        if tok and tok[1] == "size" and self.tokens[self.i + 1] == ("P", "("):
+            self.take()
+            self.take("P", "(")
+            path = self.path()
+            self.take("P", ")")
+
+            def size(item):
+                v = _get_path(item, path)
+                if v is _MISSING or not hasattr(v, "__len__"):
+                    return _MISSING
+                return Decimal(len(v))
+            return size
+        path = self.path()
+        return lambda item: _get_path(item, path)
+
+    def _function(self):
+        name = self.take("ID")[1]
+        self.take("P", "(")
+        path = self.path()
+        arg = None
+        if self.peek("P", ","):
+            self.take()
+            arg = self._operand()
+        self.take("P", ")")
+        if name == "attribute_exists":
+            return lambda item: _get_path(item, path) is not _MISSING
+        if name == "attribute_not_exists":
+            return lambda item: _get_path(item, path) is _MISSING
+        if name == "begins_with":
+            return lambda item: (
+                isinstance(_get_path(item, path), str) and _get_path(item, path).startswith(arg(item))
+            )
+        if name == "contains":
+            def contains(item):
+                v = _get_path(item, path)
+                if isinstance(v, str):
+                    return isinstance(arg(item), str) and arg(item) in v
+                if isinstance(v, (list, set)):
+                    return arg(item) in v
+                return False
+            return contains
+        if name == "attribute_type":
+            return lambda item: isinstance(_get_path(item, path), _TYPE_CODES.get(arg(item), ()))
+        raise _error("ValidationException", f"Unsupported function {name}", "Parse")
+
+
+def _comparable(a, b):
+    if a is _MISSING or b is _MISSING:
+        return False
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool)
+    return (isinstance(a, Decimal) and isinstance(b, Decimal)) or (isinstance(a, str) and isinstance(b, str))
+
+
+def _comparison(op, left, right):
+    def compare(item):
+        a, b = left(item), right(item)
+        if op == "=":
+            return a is not _MISSING and a == b
+        if op == "<>":
+            return a is not _MISSING and a != b
+        if not _comparable(a, b):
+            return False
+        return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+    return compare
+
+
+class _UpdateParser(_Parser):
+    """Compiles an update expression into a function that mutates an item."""
+
+    def compile(self):
+        actions = []
+        while not self.done():
+            clause = self.take("KW")[1]
+            while True:
+                actions.append(self._action(clause))
+                if self.peek("P", ","):
+                    self.take()
+                    continue
+                break
+
+        def apply(item):
+            for action in actions:
+                action(item)
+        return apply
+
+    def _action(self, clause):
+        path = self.path()
+        if clause == "SET":
+            self.take("P", "=")
+            expr = self._set_value()
+            return lambda item: _set_path(item, path, expr(item))
+        if clause == "REMOVE":
+            return lambda item: _remove_path(item, path)
+        if clause == "ADD":
+            v = self.value()
+
+            def add(item):
+                cur = _get_path(item, path)
+                if cur is _MISSING:
+                    _set_path(item, path, copy.deepcopy(v))
+                elif isinstance(cur, set):
+                    cur |= v
+                else:
+                    _set_path(item, path, cur + v)
+            return add
+        if clause == "DELETE":
+            v = self.value()
+
+            def delete(item):
+                cur = _get_path(item, path)
+                if isinstance(cur, set):
+                    cur -= v
+                    if not cur:
+                        _remove_path(item, path)
+            return delete
+        raise _error("ValidationException", f"Unsupported update clause {clause}", "Parse")
+
+    def _set_value(self):
+        left = self._set_term()
+        if self.peek("P", "+") or self.peek("P", "-"):
+            op = self.take()[1]
+            right = self._set_term()
+
+            def arith(item):
+                a, b = left(item), right(item)
+                if not isinstance(a, Decimal) or not isinstance(b, Decimal):
+                    raise _error("ValidationException",
+                                 "An operand in the update expression has an incorrect data type",
+                                 "UpdateItem")
+                return a + b if op == "+" else a - b
+            return arith
+        return left
+
+    def _set_term(self):
+        if self.peek("VALUE"):
+            v = self.value()
+            return lambda item: copy.deepcopy(v)
+        tok = self.peek("ID")
+        if tok and self.i + 1 < len(self.tokens) and self.tokens[self.i + 1] == ("P", "("):
+            name = self.take()[1]
+            self.take("P", "(")
+            if name == "if_not_exists":
+                path = self.path()
+                self.take("P", ",")
+                default = self._set_term()
+                self.take("P", ")")
+
+                def if_not_exists(item):
+                    cur = _get_path(item, path)
+                    return copy.deepcopy(cur) if cur is not _MISSING else default(item)
+                return if_not_exists
+            if name == "list_append":
+                a = self._set_term()
+                self.take("P", ",")
+                b = self._set_term()
+                self.take("P", ")")
+                return lambda item: list(a(item) or []) + list(b(item) or [])
+            raise _error("ValidationException", f"Unsupported function {name}", "Parse")
+        path = self.path()
+
+        def read(item):
+            v = _get_path(item, path)
+            if v is _MISSING:
+                raise _error("ValidationException",
+                             "The provided expression refers to an attribute that does not exist in the item",
+                             "UpdateItem")
+            return copy.deepcopy(v)
+        return read
+
+
+def _projector(expr, names):
+    if not expr:
+        return None
+    parser = _Parser(expr, names, {})
+    paths = [parser.path()]
+    while parser.peek("P", ","):
+        parser.take()
+        paths.append(parser.path())
+
+    def project(item):
+        out = {}
+        for path in paths:
+            # List elements are projected as their whole enclosing list.
+            cut = next((n for n, p in enumerate(path) if isinstance(p, int)), len(path))
+            v = _get_path(item, path[:cut])
+            if v is not _MISSING:
+                _set_path(out, path[:cut], copy.deepcopy(v))
+        return out
+    return project
+
+
+def _resolve(kwargs: dict, *fields: str) -> dict:
+    """Turn boto3 condition objects into expression strings, as boto3 does client-side."""
+    kwargs = dict(kwargs)
+    builder = ConditionExpressionBuilder()
+    names = dict(kwargs.get("ExpressionAttributeNames") or {})
+    values = dict(kwargs.get("ExpressionAttributeValues") or {})
+    for field in fields:
+        cond = kwargs.get(field)
+        if isinstance(cond, ConditionBase):
+            built = builder.build_expression(cond, is_key_condition=(field == "KeyConditionExpression"))
+            kwargs[field] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+    kwargs["ExpressionAttributeNames"] = names
+    kwargs["ExpressionAttributeValues"] = values
+    return kwargs
+
+
+def _hash_value(expr, kwargs, hash_key):
+    """The value a key condition pins the partition key to (``hash = :v``)."""
+    parser = _Parser(expr, kwargs.get("ExpressionAttributeNames"), kwargs.get("ExpressionAttributeValues"))
+    tokens = parser.tokens
+    for i in range(len(tokens) - 2):
+        left, op, right = tokens[i:i + 3]
+        if op != ("P", "="):
+            continue
+        if left[0] == "VALUE":
+            left, right = right, left
+        name = parser.names.get(left[1]) if left[0] == "NAME" else left[1]
+        if name == hash_key and right[0] == "VALUE":
+            parser.i = i + 2
+            return parser.value()
+    raise _error("ValidationException", "Query condition missed key schema element: " + hash_key, "Query")
+
+
+def _compile_condition(expr, kwargs):
+    if not expr:
+        return None
+    return _ConditionParser(expr, kwargs.get("ExpressionAttributeNames"),
+                            kwargs.get("ExpressionAttributeValues")).compile()
+
+
+# ─── Request plumbing ────────────────────────────────────────────────────────
+
+READ_OPS = {"GetItem", "Query", "Scan", "BatchGetItem"}
+
+
+def _read_units(size: int, consistent: bool = False) -> float:
+    units = max(1, math.ceil(size / 4096))
+    return float(units) if consistent else units / 2
+
+
+def _write_units(size: int) -> float:
+    return float(max(1, math.ceil(size / 1024)))
+
+
+class _Events:
+    """Minimal stand-in for botocore's event emitter (``client.meta.events``).
+
+    Handlers registered for ``provide-client-params.dynamodb`` and
+    ``after-call.dynamodb`` (or a specific operation, e.g.
+    ``after-call.dynamodb.Query``) are called with the same keyword
+    arguments botocore passes, so instrumentation written for the real
+    client works unchanged.
+    """
+
+    def __init__(self):
+        self._handlers = []
+
+    def register(self, event_name, handler, unique_id=None, **kwargs):
+        if unique_id and any(uid == unique_id for _, _, uid in self._handlers):
+            return
+        self._handlers.append((event_name, handler, unique_id))
+
+    def unregister(self, event_name, handler=None, unique_id=None, **kwargs):
+        self._handlers = [
+            h for h in self._handlers
+            if not (h[0] == event_name and (h[1] is handler or (unique_id and h[2] == unique_id)))
+        ]
+
+    def emit(self, event_name, **kwargs):
+        for name, handler, _ in list(self._handlers):
+            if event_name == name or event_name.startswith(name + "."):
+                handler(event_name=event_name, **kwargs)
+
+
+_charges = threading.local()
+
+
+def _operation(op: str):
+    """Run a public method as one DynamoDB request.
+
+    Fires the client events, the fault hook and, when ReturnConsumedCapacity
+    is requested, adds ConsumedCapacity built from what the method charged
+    through MemoryDynamoDB._record.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def call(self, **kwargs):
+            db = self if isinstance(self, MemoryDynamoDB) else self._db
+            table = getattr(self, "name", None)
+            params = dict(kwargs, TableName=table) if table else dict(kwargs)
+            model = SimpleNamespace(name=op)
+            context = {}
+            events = db.meta.client.meta.events
+            events.emit(f"provide-client-params.dynamodb.{op}", params=params, model=model, context=context)
+            events.emit(f"before-call.dynamodb.{op}", params=params, model=model, context=context)
+            if table:
+                params.pop("TableName")
+            db._before(op, table)
+            _charges.records = []
+            try:
+                result = method(self, **params)
+                records = _charges.records
+            finally:
+                _charges.records = None
+            capacity = _consumed_capacity(op, records, params.get("ReturnConsumedCapacity"))
+            if capacity is not None:
+                result = dict(result, ConsumedCapacity=capacity)
+            events.emit(f"after-call.dynamodb.{op}", http_response=None, parsed=result,
+                        model=model, context=context)
+            return result
+        return call
+    return decorate
+
+
+def _consumed_capacity(op, records, mode):
+    if mode not in ("TOTAL", "INDEXES") or records is None:
+        return None
+    kind = "ReadCapacityUnits" if op in READ_OPS else "WriteCapacityUnits"
+    by_table = {}
+    for table, index, units in records:
+        entry = by_table.setdefault(table, {"TableName": table, "CapacityUnits": 0.0, kind: 0.0})
+        entry["CapacityUnits"] += units
+        entry[kind] += units
+        if mode == "INDEXES":
+            if index:
+                gsis = entry.setdefault("GlobalSecondaryIndexes", {})
+                gsis.setdefault(index, {"CapacityUnits": 0.0, kind: 0.0})
+                gsis[index]["CapacityUnits"] += units
+                gsis[index][kind] += units
+            else:
+                entry.setdefault("Table", {"CapacityUnits": 0.0, kind: 0.0})
+                entry["Table"]["CapacityUnits"] += units
+                entry["Table"][kind] += units
+    entries = list(by_table.values())
+    if op in ("BatchGetItem", "BatchWriteItem", "TransactWriteItems"):
+        return entries
+    return entries[0] if entries else None
+
+
+# ─── Tables ──────────────────────────────────────────────────────────────────
+
+class MemoryTable:
+    def __init__(self, resource: "MemoryDynamoDB", name: str, schema: tuple):
+        self._db = resource
+        self.name = self.table_name = name
+        self.hash_key, self.range_key, self.indexes = schema
+        self.items: dict = {}
+        self._sizes: dict = {}
+        # index (None for the table itself) -> partition key value -> primary keys
+        self._partitions = {name: defaultdict(set) for name in (None, *self.indexes)}
+        self.meta = resource.meta
+
+    # -- helpers ---------------------------------------------------------------
+
+    def _key_of(self, item: dict) -> tuple:
+        key = (item.get(self.hash_key),)
+        if self.range_key:
+            key += (item.get(self.range_key),)
+        return key
+
+    def _key_dict(self, item: dict, index: str | None = None) -> dict:
+        fields = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        if index:
+            fields += [f for f in self.indexes[index] if f]
+        return {f: item[f] for f in dict.fromkeys(fields) if f in item}
+
+    def _store(self, key: tuple, item: dict):
+        self._drop(key)
+        self.items[key] = item
+        self._sizes[key] = _item_size(item)
+        for index, (hash_key, range_key) in self._index_keys():
+            if hash_key in item and (not range_key or range_key in item):
+                self._partitions[index][item[hash_key]].add(key)
+
+    def _drop(self, key: tuple):
+        old = self.items.pop(key, None)
+        if old is None:
+            return
+        del self._sizes[key]
+        for index, (hash_key, _) in self._index_keys():
+            bucket = self._partitions[index].get(old.get(hash_key))
+            if bucket is not None:
+                bucket.discard(key)
+
+    def _index_keys(self):
+        yield None, (self.hash_key, self.range_key)
+        yield from self.indexes.items()
+
+    # Storage. sqlite_dynamodb.SQLiteTable overrides these five methods plus
+    # _store and _drop; everything else only goes through them.
+
+    def _lookup(self, key: tuple) -> tuple:
+        """(stored item or None, its size). The item must not be mutated."""
+        return self.items.get(key), self._sizes.get(key, 0)
+
+    def _size(self, key: tuple) -> int:
+        return self._sizes.get(key, 0)
+
+    def _partition(self, index, value) -> list:
+        """(item, size) for every item in one partition of the table or an index."""
+        return [(self.items[k], self._sizes[k]) for k in self._partitions[index].get(value, ())]
+
+    def _all(self) -> list:
+        return [(item, self._sizes[k]) for k, item in self.items.items()]
+
+    def _copy(self, item: dict) -> dict:
+        """An item the caller may hand out or change."""
+        return copy.deepcopy(item)
+
+    def _check_key(self, key: dict, operation: str):
+        expected = {self.hash_key} | ({self.range_key} if self.range_key else set())
+        if set(key) != expected:
+            raise _error("ValidationException",
+                         "The provided key element does not match the schema", operation)
+
+    def _condition(self, kwargs, current, operation):
+        pred = _compile_condition(kwargs.get("ConditionExpression"), kwargs)
+        if pred and not pred(current or {}):
+            raise _error("ConditionalCheckFailedException", "The conditional request failed", operation)
+
+    def _record(self, op, index=None, items=0, units=0.0):
+        self._db._record(op, self.name, index, items, units)
+
+    # -- single-item operations -------------------------------------------------
+
+    @_operation("GetItem")
+    def get_item(self, Key, **kwargs):
+        key = _normalize(Key)
+        self._check_key(key, "GetItem")
+        with self._db.lock:
+            item, size = self._lookup(self._key_of(key))
+            item = self._copy(item) if item else None
+        project = _projector(kwargs.get("ProjectionExpression"), kwargs.get("ExpressionAttributeNames"))
+        self._record("GetItem", items=1 if item else 0,
+                     units=_read_units(size, kwargs.get("ConsistentRead", False)))
+        if item is None:
+            return {}
+        return {"Item": project(item) if project else item}
+
+    @_operation("PutItem")
+    def put_item(self, Item, **kwargs):
+        kwargs = _resolve(kwargs, "ConditionExpression")
+        item = _normalize(Item)
+        if self.hash_key not in item:
+            raise _error("ValidationException", "Missing the key in the item", "PutItem")
+        if _item_size(item) > 400 * 1024:
+            raise _error("ValidationException", "Item size has exceeded the maximum allowed size", "PutItem")
+        with self._db.transaction():
+            key = self._key_of(item)
+            old, old_size = self._lookup(key)
+            size = max(old_size, _item_size(item))
+            self._condition(kwargs, old, "PutItem")
+            self._store(key, item)
+        self._record("PutItem", items=1, units=_write_units(size))
+        if kwargs.get("ReturnValues") == "ALL_OLD" and old:
+            return {"Attributes": self._copy(old)}
+        return {}
+
+    @_operation("UpdateItem")
+    def update_item(self, Key, **kwargs):
+        kwargs = _resolve(kwargs, "ConditionExpression")
+        key = _normalize(Key)
+        self._check_key(key, "UpdateItem")
+        apply = _UpdateParser(kwargs.get("UpdateExpression", ""), kwargs.get("ExpressionAttributeNames"),
+                              kwargs.get("ExpressionAttributeValues")).compile()
+        with self._db.transaction():
+            k = self._key_of(key)
+            old, old_size = self._lookup(k)
+            self._condition(kwargs, old, "UpdateItem")
+            new = self._copy(old) if old else dict(key)
+            apply(new)
+            new = _normalize(new)
+            size = max(old_size, _item_size(new))
+            self._store(k, new)
+        self._record("UpdateItem", items=1, units=_write_units(size))
+        rv = kwargs.get("ReturnValues", "NONE")
+        if rv in ("ALL_NEW", "UPDATED_NEW"):
+            return {"Attributes": self._copy(new)}
+        if rv in ("ALL_OLD", "UPDATED_OLD") and old:
+            return {"Attributes": self._copy(old)}
+        return {}
+
+    @_operation("DeleteItem")
+    def delete_item(self, Key, **kwargs):
+        kwargs = _resolve(kwargs, "ConditionExpression")
+        key = _normalize(Key)
+        self._check_key(key, "DeleteItem")
+        with self._db.transaction():
+            k = self._key_of(key)
+            old, size = self._lookup(k)
+            self._condition(kwargs, old, "DeleteItem")
+            self._drop(k)
+        self._record("DeleteItem", items=1 if old else 0, units=_write_units(size))
+        if kwargs.get("ReturnValues") == "ALL_OLD" and old:
+            return {"Attributes": old}
+        return {}
+
+    # -- multi-item operations --------------------------------------------------
+
+    @_operation("Query")
+    def query(self, **kwargs):
+        kwargs = _resolve(kwargs, "KeyConditionExpression", "FilterExpression")
+        index = kwargs.get("IndexName")
+        if index and index not in self.indexes:
+            raise _error("ValidationException", f"The table does not have the specified index: {index}", "Query")
+        hash_key, range_key = self.indexes[index] if index else (self.hash_key, self.range_key)
+        key_pred = _compile_condition(kwargs["KeyConditionExpression"], kwargs)
+        partition = _hash_value(kwargs["KeyConditionExpression"], kwargs, hash_key)
+        with self._db.lock:
+            candidates = [(i, size) for i, size in self._partition(index, partition) if key_pred(i)]
+        candidates.sort(key=lambda c: (_sort_key(c[0].get(range_key)) if range_key else (0, ""),
+                                       _sort_key(c[0].get(self.hash_key))))
+        if kwargs.get("ScanIndexForward") is False:
+            candidates.reverse()
+        return self._page("Query", candidates, kwargs, index)
+
+    @_operation("Scan")
+    def scan(self, **kwargs):
+        kwargs = _resolve(kwargs, "FilterExpression")
+        index = kwargs.get("IndexName")
+        with self._db.lock:
+            candidates = self._all()
+        if index:
+            candidates = [c for c in candidates if all(f in c[0] for f in self.indexes[index] if f)]
+        total = kwargs.get("TotalSegments")
+        if total:
+            segment = kwargs["Segment"]
+            candidates = [c for c in candidates
+                          if zlib.crc32(repr(self._key_of(c[0])).encode()) % total == segment]
+        candidates.sort(key=lambda c: tuple(_sort_key(v) for v in self._key_of(c[0])))
+        return self._page("Scan", candidates, kwargs, index)
+
+    def _page(self, op, candidates, kwargs, index):
+        """One page of candidates, a sorted list of (item, size)."""
+        start = kwargs.get("ExclusiveStartKey")
+        if start:
+            start = _normalize(start)
+            marker = self._key_of(start)
+            for pos, (item, _) in enumerate(candidates):
+                if self._key_of(item) == marker:
+                    candidates = candidates[pos + 1:]
+                    break
+        limit = kwargs.get("Limit")
+        filt = _compile_condition(kwargs.get("FilterExpression"), kwargs)
+        project = _projector(kwargs.get("ProjectionExpression"), kwargs.get("ExpressionAttributeNames"))
+        page_bytes = self._db.page_bytes
+        out, scanned, size, last = [], 0, 0, None
+        for item, item_size in candidates:
+            if limit is not None and scanned >= limit:
+                break
+            if size >= page_bytes:
+                break
+            scanned += 1
+            size += item_size
+            last = item
+            if filt and not filt(item):
+                continue
+            out.append(project(item) if project else self._copy(item))
+        result = {"Count": len(out), "ScannedCount": scanned}
+        if kwargs.get("Select") != "COUNT":
+            result["Items"] = out
+        if last is not None and scanned < len(candidates):
+            result["LastEvaluatedKey"] = self._key_dict(last, index)
+        self._record(op, index, items=scanned,
+                     units=_read_units(size, kwargs.get("ConsistentRead", False)))
+        return result
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    """Buffers puts/deletes and flushes them 25 at a time like boto3's BatchWriter."""
+
+    def __init__(self, table: MemoryTable):
+        self._table = table
+        self._buffer = []
+
+    def put_item(self, Item):
+        self._buffer.append({"PutRequest": {"Item": Item}})
+        self._maybe_flush()
+
+    def delete_item(self, Key):
+        self._buffer.append({"DeleteRequest": {"Key": Key}})
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._buffer) >= 25:
+            self._flush()
+
+    def _flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer[:25], self._buffer[25:]
+            self._table._db.batch_write_item(RequestItems={self._table.name: batch})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class _Client:
+    """The slice of the low-level client reached through ``table.meta.client``."""
+
+    def __init__(self, resource: "MemoryDynamoDB"):
+        self._db = resource
+        self.meta = SimpleNamespace(events=_Events())
+
+    @_operation("TransactWriteItems")
+    def transact_write_items(self, TransactItems, **kwargs):
+        if len(TransactItems) > 100:
+            raise _error("ValidationException", "Member must have length less than or equal to 100",
+                         "TransactWriteItems")
+        ops = []
+        for entry in TransactItems:
+            (kind, spec), = entry.items()
+            spec = dict(spec)
+            table = self._db.Table(spec["TableName"])
+            for field in ("Item", "Key"):
+                if field in spec:
+                    spec[field] = {k: _deserializer.deserialize(v) for k, v in spec[field].items()}
+            if "ExpressionAttributeValues" in spec:
+                spec["ExpressionAttributeValues"] = {
+                    k: _deserializer.deserialize(v) for k, v in spec["ExpressionAttributeValues"].items()
+                }
+            ops.append((kind, table, spec))
+        with self._db.transaction():
+            reasons, failed = [], False
+            for kind, table, spec in ops:
+                key = spec.get("Key") or spec["Item"]
+                current, _ = table._lookup(table._key_of(key))
+                pred = _compile_condition(spec.get("ConditionExpression"), spec)
+                ok = pred is None or pred(current or {})
+                reasons.append({"Code": "None" if ok else "ConditionalCheckFailed"})
+                failed = failed or not ok
+            if failed:
+                err = _error("TransactionCanceledException",
+                             "Transaction cancelled, please refer cancellation reasons for specific reasons "
+                             f"[{', '.join(r['Code'] for r in reasons)}]", "TransactWriteItems")
+                err.response["CancellationReasons"] = reasons
+                raise err
+            for kind, table, spec in ops:
+                if kind == "Put":
+                    table._store(table._key_of(spec["Item"]), _normalize(spec["Item"]))
+                elif kind == "Delete":
+                    table._drop(table._key_of(spec["Key"]))
+                elif kind == "Update":
+                    apply = _UpdateParser(spec["UpdateExpression"], spec.get("ExpressionAttributeNames"),
+                                          spec.get("ExpressionAttributeValues")).compile()
+                    k = table._key_of(spec["Key"])
+                    old, _ = table._lookup(k)
+                    new = table._copy(old) if old else dict(spec["Key"])
+                    apply(new)
+                    table._store(k, _normalize(new))
+            # Transactional writes cost twice the standard write units
+            sizes = [table._size(table._key_of(spec.get("Key") or spec["Item"])) for _, table, spec in ops]
+        for (kind, table, spec), size in zip(ops, sizes):
+            self._db._record("TransactWriteItems", table.name, None, 1, 2 * _write_units(size))
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        return self._db.batch_write_item(RequestItems=RequestItems, **kwargs)
+
+
+# ─── Resource ────────────────────────────────────────────────────────────────
+
+class MemoryDynamoDB:
+    """Drop-in for ``boto3.resource("dynamodb")`` backed by Python dicts.
+
+    ``calls`` counts every request as ``(operation, table, index) -> n`` and
+    ``items_touched`` the number of items read or written, which is what the
+    benchmark and stress tools report. Requests that ask for
+    ReturnConsumedCapacity get a ConsumedCapacity computed from item sizes
+    with DynamoDB's 4 KB read / 1 KB write unit rules.
+    """
+
+    table_class = MemoryTable
+
+    def __init__(self, schemas: dict | None = None, page_bytes: int = PAGE_BYTES):
+        self.schemas = dict(SCHEMAS, **(schemas or {}))
+        self.page_bytes = page_bytes
+        self.lock = threading.RLock()
+        self.tables: dict = {}
+        self.calls = Counter()
+        self.items_touched = Counter()
+        self.meta = _Meta(_Client(self))
+        self.fault = None
+
+    def Table(self, name: str) -> MemoryTable:
+        with self.lock:
+            if name not in self.tables:
+                if name not in self.schemas:
+                    raise _error("ResourceNotFoundException", f"Requested resource not found: {name}",
+                                 "DescribeTable")
+                self.tables[name] = self.table_class(self, name, self.schemas[name])
+            return self.tables[name]
+
+    def transaction(self):
+        """Context manager around a write: its checks and changes happen as one."""
+        return self.lock
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.items_touched.clear()
+
+    def _before(self, op, table):
+        # Fault-injection hook: ``fault(op, table)`` may raise, e.g. a throttling ClientError.
+        if self.fault:
+            self.fault(op, table)
+
+    def _record(self, op, table, index, items, units=0.0):
+        with self.lock:
+            self.calls[(op, table, index)] += 1
+            self.items_touched[(op, table, index)] += items
+        records = getattr(_charges, "records", None)
+        if records is not None:
+            records.append((table, index, units))
+
+    @_operation("BatchGetItem")
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, spec in RequestItems.items():
+            table = self.Table(name)
+            project = _projector(spec.get("ProjectionExpression"), spec.get("ExpressionAttributeNames"))
+            found, units = [], 0.0
+            with self.lock:
+                for key in spec["Keys"]:
+                    item, size = table._lookup(table._key_of(_normalize(key)))
+                    if item is not None:
+                        units += _read_units(size, spec.get("ConsistentRead", False))
+                        item = table._copy(item)
+                        found.append(project(item) if project else item)
+            responses[name] = found
+            self._record("BatchGetItem", name, None, len(found), units)
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    @_operation("BatchWriteItem")
+    def batch_write_item(self, RequestItems, **kwargs):
+        if sum(len(v) for v in RequestItems.values()) > 25:
+            raise _error("ValidationException", "Too many items requested for the BatchWriteItem call",
+                         "BatchWriteItem")
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            units = 0.0
+            with self.transaction():
+                for req in requests:
+                    if "PutRequest" in req:
+                        item = _normalize(req["PutRequest"]["Item"])
+                        k = table._key_of(item)
+                        units += _write_units(max(table._size(k), _item_size(item)))
+                        table._store(k, item)
+                    else:
+                        k = table._key_of(_normalize(req["DeleteRequest"]["Key"]))
+                        units += _write_units(table._size(k))
+                        table._drop(k)
+            self._record("BatchWriteItem", name, None, len(requests), units)
+        return {"UnprocessedItems": {}}
@@ -0,0 +1,145 @@
+"""
+Copy a deployment's parts, part history, miles log and failure stats from
+their own tables into the single car-data table (see
+backend/lambdas/shared/single_table.py), with the app serving throughout:
+
+  1. Deploy with DataLayout=dual. Handlers keep reading the per-entity
+     tables and mirror every write into the car-data table.
+  2. Copy the existing rows:
+         python backend/tools/migrate_single_table.py --env prod
+  3. Compare the layouts and repair differences (a row the copy read just
+     before a handler changed it), until a pass reports none:
+         python backend/tools/migrate_single_table.py --env prod --verify
+  4. Deploy with DataLayout=single.
+
+The per-entity tables are left as they are. Until step 4 going back is a
+deploy with DataLayout=tables; after it, writes only reach the car-data
+table.
+
+Both passes scan each table in parallel segments through backfill.py's
+run_segments(). The copy checkpoints every segment, so rerunning an
+interrupted copy resumes it; verify passes always start over.
+
+Unlike the other tools this talks to real DynamoDB, with the usual AWS
+credentials and region.
+
+Usage:
+    python backend/tools/migrate_single_table.py --env dev
+    python backend/tools/migrate_single_table.py --env dev --verify --only PARTS_TABLE --segments 16
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "shared"))
+
+import boto3  # noqa: E402
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+
+from backfill import TABLES, CAR_DATA_TABLE, DEFAULT_SEGMENTS, Checkpoint, per_thread, run_segments  # noqa: E402
+from db import batch_get  # noqa: E402
+from single_table import ENTITIES, strip  # noqa: E402
+
+
+def source_key(entity, item: dict) -> dict:
+    """The key of item in its per-entity table."""
+    if entity.index:
+        return {entity.id_attr: item[entity.id_attr]}
+    return {"car_id": item["car_id"], entity.id_attr: item[entity.id_attr]}
+
+
+def copy_page(resource, target_name: str, entity):
+    """A run_segments() page handler putting source items into the car-data table."""
+    def process(source, items):
+        with resource().Table(target_name).batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=entity.to_item(item))
+        return Counter(copied=len(items))
+    return process
+
+
+def verify_page(resource, target_name: str, entity):
+    """A page handler rewriting copies that are missing or differ from their source item."""
+    def process(source, items):
+        dynamodb = resource()
+        keys = [entity.key(item["car_id"], item[entity.id_attr]) for item in items]
+        copies = {(c["PK"], c["SK"]): c for c in batch_get(dynamodb, target_name, keys)}
+        repaired = 0
+        with dynamodb.Table(target_name).batch_writer() as batch:
+            for item, key in zip(items, keys):
+                copy = copies.get((key["PK"], key["SK"]))
+                if copy is None or strip(copy) != item:
+                    batch.put_item(Item=entity.to_item(item))
+                    repaired += 1
+        return Counter(repaired=repaired)
+    return process
+
+
+def orphans_page(resource, source_name: str, entity):
+    """A page handler deleting copies of items deleted from source while the copy ran."""
+    def process(target, items):
+        dynamodb = resource()
+        keys = [source_key(entity, strip(c)) for c in items]
+        found = {tuple(sorted(source_key(entity, i).items())) for i in batch_get(dynamodb, source_name, keys)}
+        deleted = 0
+        with target.batch_writer() as batch:
+            for copy, key in zip(items, keys):
+                if tuple(sorted(key.items())) not in found:
+                    batch.delete_item(Key={"PK": copy["PK"], "SK": copy["SK"]})
+                    deleted += 1
+        return Counter(deleted=deleted)
+    return process
+
+
+def copy_table(resource, source_name: str, target_name: str, entity,
+               segments: int = DEFAULT_SEGMENTS, checkpoint: Checkpoint | None = None) -> int:
+    """Put every item of source into the car-data table; returns how many."""
+    progress = run_segments(
+        f"copy {source_name}", lambda: resource().Table(source_name),
+        copy_page(resource, target_name, entity), segments, checkpoint,
+    )
+    return progress.counts["copied"]
+
+
+def verify_table(resource, source_name: str, target_name: str, entity,
+                 segments: int = DEFAULT_SEGMENTS) -> tuple:
+    """Make the car-data table match source for entity; returns (items checked, items repaired)."""
+    checked = run_segments(
+        f"verify {source_name}", lambda: resource().Table(source_name),
+        verify_page(resource, target_name, entity), segments,
+    )
+    orphans = run_segments(
+        f"orphans {source_name}", lambda: resource().Table(target_name),
+        orphans_page(resource, source_name, entity), segments,
+        scan_kwargs={"FilterExpression": Attr("SK").begins_with(entity.prefix)},
+    )
+    return checked.counts["scanned"], checked.counts["repaired"] + orphans.counts["deleted"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate car data into the single-table layout.")
+    parser.add_argument("--env", required=True, choices=["dev", "prod"])
+    parser.add_argument("--only", choices=sorted(TABLES), help="migrate just this table")
+    parser.add_argument("--verify", action="store_true", help="compare and repair instead of copying")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help="parallel scan segments")
+    parser.add_argument("--checkpoint", help="copy checkpoint file (default migrate-single-table-<env>.json)")
+    args = parser.parse_args()
+
+    resource = per_thread(lambda: boto3.session.Session().resource("dynamodb"))
+    target_name = f"{CAR_DATA_TABLE}-{args.env}"
+    checkpoint = Checkpoint(args.checkpoint or f"migrate-single-table-{args.env}.json")
+    for env_name, prefix in TABLES.items():
+        if args.only and args.only != env_name:
+            continue
+        source_name = f"{prefix}-{args.env}"
+        entity = ENTITIES[env_name]
+        if args.verify:
+            checked, repaired = verify_table(resource, source_name, target_name, entity, args.segments)
+            print(f"{source_name}: checked {checked}, repaired {repaired}")
+        else:
+            copy_table(resource, source_name, target_name, entity, args.segments, checkpoint)
+
+
+if __name__ == "__main__":
+    main()
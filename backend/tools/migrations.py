@@ -0,0 +1,78 @@
+"""
+Versioned data migrations, run by backfill.py.
+
+Each Migration rewrites the items of one table: transform(item) returns
+the attributes to change, mapped to their new value or to REMOVE, and
+{} when the item needs nothing. Transforms must be idempotent - a resumed
+or repeated run hands them items they have already migrated - and look
+at nothing but the item.
+
+Add a migration with the next version number. Never renumber, or change
+what an existing migration does once it has run anywhere: backfill.py
+records runs by version and name.
+"""
+from decimal import Decimal, InvalidOperation
+
+# Value for an attribute the migration deletes
+REMOVE = object()
+
+
+class Migration:
+    def __init__(self, version: int, name: str, table: str, key: tuple, transform, batch: bool = False):
+        self.version = version
+        self.name = name
+        # Environment variable of the table (as in template.yaml) and its key attributes
+        self.table = table
+        self.key = key
+        self.transform = transform
+        # Write whole items with BatchWriteItem instead of conditional updates.
+        # Only for tables nothing else writes while the migration runs.
+        self.batch = batch
+
+    @property
+    def run_name(self) -> str:
+        return f"{self.version:04d}-{self.name}"
+
+
+def _number(value):
+    """value as a DynamoDB number, or None when it is one already or is not numeric."""
+    if not isinstance(value, str):
+        return None
+    try:
+        number = Decimal(value.strip())
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+def number_attrs(*attrs):
+    """A transform storing each of attrs as a number where it is a numeric string."""
+    def transform(item):
+        changes = {}
+        for attr in attrs:
+            number = _number(item.get(attr))
+            if number is not None:
+                changes[attr] = number
+        return changes
+    return transform
+
+
+def remove_attrs(*attrs):
+    """A transform deleting each of attrs where the item has it."""
+    def transform(item):
+        return {attr: REMOVE for attr in attrs if attr in item}
+    return transform
+
+
+MIGRATIONS = [
+    # log_miles stored miles as a string until it was changed to write numbers
+    Migration(1, "miles-log-miles-number", "MILES_LOG_TABLE", ("log_id",), number_attrs("miles")),
+    # The other miles attributes; a no-op where they are numbers already
+    Migration(2, "part-miles-number", "PARTS_TABLE", ("part_id",), number_attrs("miles_used")),
+    Migration(3, "history-miles-number", "PART_HISTORY_TABLE", ("history_id",),
+              number_attrs("miles_at_retirement")),
+    # Sessions stamped every part they reached with their log_id; their
+    # progress is kept on the miles log entry now
+    Migration(4, "part-drop-miles-log-ids", "PARTS_TABLE", ("part_id",), remove_attrs("miles_log_ids")),
+    Migration(5, "miles-log-drop-incomplete", "MILES_LOG_TABLE", ("log_id",), remove_attrs("incomplete")),
+]
@@ -0,0 +1,116 @@
+"""
+Rebuild the parts search index and the custom field value index from the
+parts table of a deployment, and the failure stats behind risk alerts
+from the part history table. "alerts" raises an alert for every active
+part already at MEDIUM risk or above; log_miles only alerts on a
+crossing, so run it once when alerts are first deployed.
+
+The handlers keep all of these up to date as parts change; run this once
+after deploying a new index table (to index the existing parts), after
+changing the type of a custom field, or any time an index is suspected
+to have drifted. Existing rows are overwritten, not cleared first, so
+rows for values a part no longer has stay until --clear is given.
+
+Unlike the other tools this talks to real DynamoDB, with the usual AWS
+credentials and region.
+
+Usage:
+    python backend/tools/rebuild_indexes.py --env dev
+    python backend/tools/rebuild_indexes.py --env prod --only fields --clear
+    python backend/tools/rebuild_indexes.py --env prod --only failures
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "shared"))
+
+import boto3  # noqa: E402
+
+import field_index  # noqa: E402
+import risk_alerts  # noqa: E402
+import search_index  # noqa: E402
+
+# index name -> (table name prefix, key attributes)
+INDEXES = {
+    "search": ("calsol-search-index", ("bucket", "entry")),
+    "fields": ("calsol-field-index", ("field_key", "value_key")),
+    "failures": ("calsol-failure-stats", ("car_id", "part_number")),
+    "alerts": ("calsol-alerts", ("car_id", "part_id")),
+}
+
+
+def scan_all(table, **kwargs):
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if not resp.get("LastEvaluatedKey"):
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def clear(table, keys) -> int:
+    cleared = 0
+    names = {f"#k{i}": k for i, k in enumerate(keys)}
+    with table.batch_writer() as batch:
+        for row in scan_all(table, ProjectionExpression=", ".join(names), ExpressionAttributeNames=names):
+            batch.delete_item(Key=row)
+            cleared += 1
+    return cleared
+
+
+def backfill_alerts(dynamodb, env: str, table, parts) -> int:
+    stats_table = dynamodb.Table(f"calsol-failure-stats-{env}")
+    now = datetime.now(timezone.utc).isoformat()
+    by_car = defaultdict(list)
+    for part in parts:
+        if part.get("active", True):
+            by_car[part["car_id"]].append(part)
+    raised = 0
+    for car_id, car_parts in by_car.items():
+        avg_by_pn = risk_alerts.thresholds(stats_table, car_id)
+        alerts = [risk_alerts.evaluate(p, 0, p.get("miles_used", 0), avg_by_pn) for p in car_parts]
+        raised += len(risk_alerts.raise_alerts(table, car_id, [a for a in alerts if a], None, now))
+    return raised
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the search / custom field indexes and failure stats.")
+    parser.add_argument("--env", required=True, choices=["dev", "prod"])
+    parser.add_argument("--only", choices=sorted(INDEXES), help="rebuild just this index")
+    parser.add_argument("--clear", action="store_true", help="delete every existing row first")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    if args.only != "failures":
+        parts = list(scan_all(dynamodb.Table(f"calsol-parts-{args.env}")))
+        types = field_index.field_types(dynamodb.Table(f"calsol-part-fields-{args.env}"))
+
+    for name, (prefix, keys) in INDEXES.items():
+        if args.only and args.only != name:
+            continue
+        start = time.perf_counter()
+        table = dynamodb.Table(f"{prefix}-{args.env}")
+        if args.clear:
+            print(f"{name}: cleared {clear(table, keys)} rows")
+        if name == "failures":
+            history = list(scan_all(dynamodb.Table(f"calsol-part-history-{args.env}")))
+            risk_alerts.write_stats(table, history)
+            print(f"{name}: summarized {len(history)} history rows in {time.perf_counter() - start:.1f}s")
+            continue
+        if name == "alerts":
+            print(f"{name}: raised {backfill_alerts(dynamodb, args.env, table, parts)} alerts "
+                  f"in {time.perf_counter() - start:.1f}s")
+            continue
+        if name == "search":
+            search_index.index_parts(table, parts)
+        else:
+            field_index.index_parts(table, parts, types)
+        print(f"{name}: indexed {len(parts)} parts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
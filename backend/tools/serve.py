@@ -0,0 +1,344 @@
+"""
+Serve the API handlers over HTTP from one long-running process, for heavy
+batch work (imports, exports, fleet reports) without Lambda's timeout and
+cold starts.
+
+Routes come from the Api events in template.yaml. A request is turned
+into the API Gateway proxy event the handler would get from Lambda and
+its response back into HTTP, so the handlers run unchanged. Each handler
+module is loaded once and stays warm, along with everything it keeps at
+module level: the shared boto3 resource (its connection pool sized to the
+worker count), report and JWT caches. Handlers block, so requests run on
+a pool of worker threads; the boto3 client underneath is thread-safe.
+
+    app       WSGI application (gunicorn, waitress, ...: "serve:app")
+    asgi_app  ASGI application (uvicorn, hypercorn: "serve:asgi_app")
+
+or run it directly, on the standard library's WSGI server with a pooled
+request loop:
+
+    python backend/tools/serve.py --env prod --workers 32
+    python backend/tools/serve.py --local                   # in-memory fleet (LOCAL_DB: SQLite file)
+
+Against AWS the table environment variables are derived from
+template.yaml for --env; GOOGLE_CLIENT_ID, JWT_SECRET, ALLOWED_ORIGIN and
+PUSH_ENDPOINT must be set as in the Lambda environment. Without --env or
+--local (as in the app/asgi_app imports) the environment is used as is.
+SERVE_TIMEOUT_S is what handlers see as their time budget (default 900).
+"""
+import argparse
+import asyncio
+import base64
+import importlib.util
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(TOOLS_DIR, "..", "..")
+LAMBDAS_DIR = os.path.join(ROOT, "backend", "lambdas")
+TEMPLATE = os.path.join(ROOT, "template.yaml")
+
+sys.path.insert(0, os.path.join(LAMBDAS_DIR, "shared"))
+sys.path.insert(0, TOOLS_DIR)
+
+DEFAULT_WORKERS = 16
+TIMEOUT_S = int(os.environ.get("SERVE_TIMEOUT_S", 900))
+
+
+# ─── Routes ──────────────────────────────────────────────────────────────────
+
+class Route:
+    def __init__(self, method: str, path: str, rel: str):
+        self.method = method
+        # API Gateway resource path, e.g. /cars/{car_id}/parts/{part_id}
+        self.path = path
+        # Handler file under backend/lambdas, e.g. parts/get_part.py
+        self.rel = rel
+        pattern = re.sub(r"\\\{(\w+)\\\+\\\}", r"(?P<\1>.+)", re.escape(path))
+        self.pattern = re.compile("^" + re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^/]+)", pattern) + "$")
+        # Literal segments win over parameters, as in API Gateway
+        self.rank = (path.count("{"), -len(path))
+
+
+def load_routes(template: str = TEMPLATE) -> list:
+    """One Route per Api event of the functions in template.yaml."""
+    routes = []
+    code_uri = handler = path = None
+    with open(template) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("CodeUri:"):
+                code_uri, handler = line.split(":", 1)[1].strip(), None
+            elif line.startswith("Handler:"):
+                handler = line.split(":", 1)[1].strip()
+            elif line.startswith("Path:"):
+                path = line.split(":", 1)[1].strip()
+            elif line.startswith("Method:") and path and code_uri and handler:
+                folder = os.path.basename(code_uri.rstrip("/"))
+                module = handler.rsplit(".", 1)[0]
+                routes.append(Route(line.split(":", 1)[1].strip().upper(), path, f"{folder}/{module}.py"))
+                path = None
+    return sorted(routes, key=lambda r: r.rank)
+
+
+def table_env(env: str, template: str = TEMPLATE) -> dict:
+    """Table environment variables (as in Globals) -> table names of the env deployment."""
+    with open(template) as f:
+        text = f.read()
+    names = dict(re.findall(r'^  (\w+Table):\n    Type: AWS::DynamoDB::Table\n    Properties:\n'
+                            r'      TableName: !Sub "([\w-]+)-\$\{Environment\}"', text, re.M))
+    refs = re.findall(r"^        (\w+_TABLE): !Ref (\w+)", text, re.M)
+    return {var: f"{names[resource]}-{env}" for var, resource in refs if resource in names}
+
+
+# ─── Invocation ──────────────────────────────────────────────────────────────
+
+class Context:
+    """The parts of the Lambda context object handlers use."""
+
+    def __init__(self, function_name: str, timeout_s: int = TIMEOUT_S):
+        self._deadline = time.monotonic() + timeout_s
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+class Api:
+    """Routes requests to handlers, loading each handler module once."""
+
+    def __init__(self, routes: list | None = None, workers: int = DEFAULT_WORKERS):
+        self.routes = routes if routes is not None else load_routes()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    def handler(self, rel: str):
+        with self._lock:
+            if rel not in self._handlers:
+                name = "serve_" + rel[:-3].replace("/", "_")
+                path = os.path.join(LAMBDAS_DIR, rel)
+                # Modules next to the handler (as in its package); shared ones take precedence
+                if os.path.dirname(path) not in sys.path:
+                    sys.path.append(os.path.dirname(path))
+                spec = importlib.util.spec_from_file_location(name, path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._handlers[rel] = module.handler
+            return self._handlers[rel]
+
+    def warm(self):
+        """Load every handler now instead of on its first request."""
+        for route in self.routes:
+            self.handler(route.rel)
+
+    def match(self, method: str, path: str) -> tuple:
+        """(route, path parameters); route is None when nothing matches."""
+        for route in self.routes:
+            m = route.pattern.match(path)
+            if m and route.method in (method, "ANY"):
+                return route, m.groupdict()
+        return None, {}
+
+    def exists(self, path: str) -> bool:
+        return any(route.pattern.match(path) for route in self.routes)
+
+    def invoke(self, method: str, path: str, query: str, headers: dict, body: bytes,
+               source_ip: str = "") -> tuple:
+        """Handle one request; returns (status, [(header, value)], body bytes)."""
+        # Imported late: utils reads its settings from the environment configure() prepares
+        import utils
+
+        route, params = self.match(method, path)
+        if route is None:
+            if not self.exists(path):
+                return _http_response(utils.not_found("No such route"))
+            if method == "OPTIONS":
+                # CORS preflight, answered as the API's Cors settings do
+                return _http_response(utils.ok({}))
+            return _http_response(utils.response(405, {"error": "Method not allowed"}))
+
+        qs = parse_qs(query, keep_blank_values=True)
+        try:
+            text, binary = body.decode("utf-8"), False
+        except UnicodeDecodeError:
+            text, binary = base64.b64encode(body).decode(), True
+        event = {
+            "httpMethod": method,
+            "resource": route.path,
+            "path": path,
+            "pathParameters": params or None,
+            "queryStringParameters": {k: v[-1] for k, v in qs.items()} or None,
+            "multiValueQueryStringParameters": qs or None,
+            "headers": headers,
+            "body": text or None,
+            "isBase64Encoded": binary,
+            "requestContext": {
+                "resourcePath": route.path,
+                "httpMethod": method,
+                "requestId": str(uuid.uuid4()),
+                "identity": {"sourceIp": source_ip},
+            },
+        }
+        try:
+            resp = self.handler(route.rel)(event, Context(route.rel))
+        except Exception as e:  # what Lambda + API Gateway would turn into a 502
+            print(f"{method} {path}: {e!r}", file=sys.stderr)
+            resp = utils.response(502, {"error": "Internal server error"})
+        return _http_response(resp)
+
+
+def _http_response(resp: dict) -> tuple:
+    body = resp.get("body") or ""
+    body = base64.b64decode(body) if resp.get("isBase64Encoded") else body.encode("utf-8")
+    headers = [(k, str(v)) for k, v in (resp.get("headers") or {}).items()]
+    for k, values in (resp.get("multiValueHeaders") or {}).items():
+        headers += [(k, str(v)) for v in values]
+    headers.append(("Content-Length", str(len(body))))
+    return resp.get("statusCode", 200), headers, body
+
+
+def _status_line(status: int) -> str:
+    try:
+        return f"{status} {HTTPStatus(status).phrase}"
+    except ValueError:
+        return f"{status} Unknown"
+
+
+# ─── WSGI / ASGI ─────────────────────────────────────────────────────────────
+
+_api = None
+
+
+def api() -> Api:
+    global _api
+    if _api is None:
+        _api = Api()
+    return _api
+
+
+def app(environ, start_response):
+    """WSGI entry point."""
+    headers = {
+        key[5:].replace("_", "-").title(): value
+        for key, value in environ.items() if key.startswith("HTTP_")
+    }
+    for key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+        if environ.get(key):
+            headers[key.replace("_", "-").title()] = environ[key]
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    body = environ["wsgi.input"].read(length) if length else b""
+    path = environ.get("PATH_INFO", "/").encode("latin-1").decode("utf-8")
+    status, out_headers, out = api().invoke(environ["REQUEST_METHOD"], path, environ.get("QUERY_STRING", ""),
+                                            headers, body, environ.get("REMOTE_ADDR", ""))
+    start_response(_status_line(status), out_headers)
+    return [out]
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point; handlers run on the worker pool, not the event loop."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.get_running_loop().run_in_executor(api().pool, api().warm)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    headers = {k.decode("latin-1").title(): v.decode("latin-1") for k, v in scope["headers"]}
+    client = scope.get("client") or ("", 0)
+    status, out_headers, out = await asyncio.get_running_loop().run_in_executor(
+        api().pool, api().invoke, scope["method"], scope["path"], scope.get("query_string", b"").decode(),
+        headers, b"".join(chunks), client[0],
+    )
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in out_headers]})
+    await send({"type": "http.response.body", "body": out})
+
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """wsgiref's server with each connection handled on the Api's worker pool."""
+
+    def process_request(self, request, client_address):
+        api().pool.submit(self.process_request_thread, request, client_address)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, quiet: bool = False) -> PooledWSGIServer:
+    """A started-up server (call serve_forever() on it)."""
+    return make_server(host, port, app, server_class=PooledWSGIServer,
+                       handler_class=QuietHandler if quiet else WSGIRequestHandler)
+
+
+def configure(env: str | None = None, local: bool = False, workers: int = DEFAULT_WORKERS) -> Api:
+    """Point the handlers at a deployment's tables (or the local stand-in) and build the Api."""
+    global _api
+    if local:
+        import local as _local  # noqa: F401  (installs the in-memory / SQLite resource)
+    else:
+        if env:
+            for var, name in table_env(env).items():
+                os.environ.setdefault(var, name)
+        import boto3
+        from botocore.config import Config
+
+        import db
+        db.use(boto3.resource("dynamodb", config=Config(max_pool_connections=workers)))
+    _api = Api(workers=workers)
+    return _api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API handlers over HTTP.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--env", choices=["dev", "prod"], help="use this deployment's tables")
+    target.add_argument("--local", action="store_true", help="use the local stand-in (see local.py)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="handler threads")
+    parser.add_argument("--seed", type=int, default=0, help="--local: cars to seed (parts via --parts)")
+    parser.add_argument("--parts", type=int, default=500, help="--local: parts per seeded car")
+    args = parser.parse_args()
+
+    server_api = configure(args.env, args.local, args.workers)
+    if args.local and args.seed:
+        import local
+        from fleet import seed_fleet
+        from memory_dynamodb import TABLE_ENV
+        seed_fleet(local.dynamodb, TABLE_ENV, cars=args.seed, parts_per_car=args.parts,
+                   history_rows=args.seed * args.parts, sessions_per_car=args.parts // 10)
+    server_api.warm()
+    httpd = serve(args.host, args.port)
+    print(f"Serving {len(server_api.routes)} routes on http://{args.host}:{args.port} "
+          f"with {args.workers} workers", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+SQLite-backed stand-in for the DynamoDB resource API, for running the
+handlers offline (trackside, without connectivity) against a file that
+survives restarts.
+
+Everything above storage - expressions, conditions, paging, capacity,
+client events - is memory_dynamodb's; only where items live differs.
+Each table in SCHEMAS becomes a SQLite table
+
+    pk, sk        the item's key ("" for tables without a range key)
+    item          the item as JSON (see encode(); sorted keys, so equal items encode equally)
+    size          its DynamoDB size in bytes
+    h_<n>, r_<n>  key values of the item in GSI n, NULL when it is not in the index
+
+with an index on (h_<n>, r_<n>) per GSI, e.g. PartsTable_car_index,
+PartHistoryTable_car_history_index, MilesLogTable_car_miles_index, so
+a Query reads one partition through an index instead of the whole table.
+The database runs in WAL mode; every write request is one transaction and
+statements are parameterized, so sqlite3 reuses their prepared forms.
+
+The _base table holds every item as it was at the last sync with AWS
+(see sync_local.py); comparing it with the tables gives what changed
+offline.
+
+Usage:
+    import db
+    from sqlite_dynamodb import SQLiteDynamoDB
+
+    db.use(SQLiteDynamoDB("trackside.db"))   # before importing any handler module
+
+or LOCAL_DB=trackside.db with local.py.
+"""
+import base64
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary, TypeSerializer
+
+from memory_dynamodb import MemoryDynamoDB, MemoryTable, _item_size
+
+_serializer = TypeSerializer()
+
+
+# ─── Encoding ────────────────────────────────────────────────────────────────
+
+def _wire(value):
+    """A stored (already normalized) attribute value as canonical DynamoDB JSON."""
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, Decimal):
+        return {"N": str(value)}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, dict):
+        return {"M": {k: _wire(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"L": [_wire(v) for v in value]}
+    if isinstance(value, Binary):
+        return {"B": base64.b64encode(bytes(value)).decode()}
+    # A set; DynamoDB keeps its members in no particular order
+    return _serializer_set(value)
+
+
+def _serializer_set(value) -> dict:
+    kind, members = next(iter(_serializer.serialize(value).items()))
+    if kind == "BS":
+        return {"BS": sorted(base64.b64encode(bytes(b)).decode() for b in members)}
+    return {kind: sorted(members)}
+
+
+_UNWIRE = {
+    "S": lambda v: v,
+    "N": Decimal,
+    "BOOL": lambda v: v,
+    "NULL": lambda v: None,
+    "M": lambda v: {k: _unwire(x) for k, x in v.items()},
+    "L": lambda v: [_unwire(x) for x in v],
+    "B": lambda v: Binary(base64.b64decode(v)),
+    "SS": set,
+    "NS": lambda v: {Decimal(n) for n in v},
+    "BS": lambda v: {Binary(base64.b64decode(b)) for b in v},
+}
+
+
+def _unwire(value: dict):
+    (kind, v), = value.items()
+    return _UNWIRE[kind](v)
+
+
+def _plain(value):
+    """value as plain JSON types when that loses nothing, else raise TypeError."""
+    if isinstance(value, Decimal):
+        number = int(value) if value == value.to_integral_value() else float(value)
+        if Decimal(repr(number)) != value:
+            raise TypeError(value)
+        return number
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    raise TypeError(value)
+
+
+def encode(item: dict) -> str:
+    """item as canonical JSON: plain when it only holds JSON types, else "T" + DynamoDB JSON.
+
+    Plain JSON decodes in one C call, which is most of a Query's cost.
+    """
+    try:
+        return json.dumps(_plain(item), sort_keys=True, separators=(",", ":"))
+    except TypeError:
+        return "T" + json.dumps({k: _wire(v) for k, v in item.items()}, sort_keys=True, separators=(",", ":"))
+
+
+def decode(text: str) -> dict:
+    if text[0] == "T":
+        return {k: _unwire(v) for k, v in json.loads(text[1:]).items()}
+    return json.loads(text, parse_float=Decimal, parse_int=Decimal)
+
+
+def _column(value):
+    """A key attribute as a SQLite value; None (NULL) when absent."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Binary):
+        return bytes(value)
+    return value
+
+
+def _ident(name: str) -> str:
+    return re.sub(r"\W", "_", name)
+
+
+# ─── Tables ──────────────────────────────────────────────────────────────────
+
+class SQLiteTable(MemoryTable):
+    def __init__(self, resource: "SQLiteDynamoDB", name: str, schema: tuple):
+        self._db = resource
+        self.name = self.table_name = name
+        self.hash_key, self.range_key, self.indexes = schema
+        self.meta = resource.meta
+        self._conn = resource.conn
+        self._columns = [(f"h_{_ident(n)}", f"r_{_ident(n)}", h, r) for n, (h, r) in self.indexes.items()]
+
+        t = f'"{name}"'
+        index_columns = "".join(f", {h}, {r}" for h, r, _, _ in self._columns)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {t} (pk NOT NULL, sk NOT NULL, item TEXT NOT NULL, "
+            f"size INTEGER NOT NULL{index_columns}, PRIMARY KEY (pk, sk)) WITHOUT ROWID"
+        )
+        for index, (h, r, _, _) in zip(self.indexes, self._columns):
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{_ident(name)}_{_ident(index)}" ON {t} ({h}, {r})')
+
+        placeholders = ", ".join("?" * (4 + 2 * len(self._columns)))
+        names = "".join(f", {h}, {r}" for h, r, _, _ in self._columns)
+        self._sql = {
+            "store": f"INSERT OR REPLACE INTO {t} (pk, sk, item, size{names}) VALUES ({placeholders})",
+            "drop": f"DELETE FROM {t} WHERE pk = ? AND sk = ?",
+            "lookup": f"SELECT item, size FROM {t} WHERE pk = ? AND sk = ?",
+            "size": f"SELECT size FROM {t} WHERE pk = ? AND sk = ?",
+            "all": f"SELECT item, size FROM {t}",
+            None: f"SELECT item, size FROM {t} WHERE pk = ?",
+        }
+        for index, (h, r, _, _) in zip(self.indexes, self._columns):
+            self._sql[index] = f"SELECT item, size FROM {t} WHERE {h} = ? ORDER BY {r}"
+
+    def _pk(self, key: tuple) -> tuple:
+        return _column(key[0]), _column(key[1]) if len(key) > 1 else ""
+
+    def _store(self, key: tuple, item: dict):
+        row = [*self._pk(key), encode(item), _item_size(item)]
+        for _, _, hash_key, range_key in self._columns:
+            if hash_key in item and (not range_key or range_key in item):
+                row += [_column(item[hash_key]), _column(item[range_key]) if range_key else ""]
+            else:
+                row += [None, None]
+        self._conn.execute(self._sql["store"], row)
+
+    def _drop(self, key: tuple):
+        self._conn.execute(self._sql["drop"], self._pk(key))
+
+    def _lookup(self, key: tuple) -> tuple:
+        row = self._conn.execute(self._sql["lookup"], self._pk(key)).fetchone()
+        return (decode(row[0]), row[1]) if row else (None, 0)
+
+    def _size(self, key: tuple) -> int:
+        row = self._conn.execute(self._sql["size"], self._pk(key)).fetchone()
+        return row[0] if row else 0
+
+    def _partition(self, index, value) -> list:
+        rows = self._conn.execute(self._sql[index], (_column(value),)).fetchall()
+        return [(decode(item), size) for item, size in rows]
+
+    def _all(self) -> list:
+        return [(decode(item), size) for item, size in self._conn.execute(self._sql["all"])]
+
+    def _copy(self, item: dict) -> dict:
+        # Items are decoded afresh on every read; nothing else holds them
+        return item
+
+
+# ─── Resource ────────────────────────────────────────────────────────────────
+
+class SQLiteDynamoDB(MemoryDynamoDB):
+    """Drop-in for ``boto3.resource("dynamodb")`` backed by a SQLite file.
+
+    Tables are created on first use. One connection is shared by all
+    threads under the resource lock, as MemoryDynamoDB shares its dicts.
+    """
+
+    table_class = SQLiteTable
+
+    def __init__(self, path: str, schemas: dict | None = None, **kwargs):
+        super().__init__(schemas, **kwargs)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                    cached_statements=256)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS _base (tbl TEXT NOT NULL, pk NOT NULL, sk NOT NULL, "
+            "item TEXT NOT NULL, PRIMARY KEY (tbl, pk, sk)) WITHOUT ROWID"
+        )
+        self._depth = threading.local()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            outer = not getattr(self._depth, "n", 0)
+            if outer:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth.n = getattr(self._depth, "n", 0) + 1
+            try:
+                yield
+            except BaseException:
+                self._depth.n -= 1
+                if outer:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth.n -= 1
+            if outer:
+                self.conn.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # -- sync state (sync_local.py) ---------------------------------------------
+
+    def load(self, name: str, items) -> int:
+        """Replace table name with items, recorded as in sync with AWS; returns how many."""
+        table = self.Table(name)
+        count = 0
+        with self.transaction():
+            self.conn.execute(f'DELETE FROM "{name}"')
+            self.conn.execute("DELETE FROM _base WHERE tbl = ?", (name,))
+            for item in items:
+                self.synced(name, item)
+                table._store(table._key_of(item), item)
+                count += 1
+        return count
+
+    def synced(self, name: str, item: dict, key: dict | None = None):
+        """Record item (None once deleted, given its key) as what AWS holds."""
+        table = self.Table(name)
+        pk = table._pk(table._key_of(key or item))
+        with self.transaction():
+            if item is None:
+                self.conn.execute("DELETE FROM _base WHERE tbl = ? AND pk = ? AND sk = ?", (name, *pk))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO _base VALUES (?, ?, ?, ?)", (name, *pk, encode(item)))
+
+    def pending(self, name: str) -> list:
+        """(base, local) for each item of name changed since the last sync; None where absent."""
+        t = f'"{self.Table(name).name}"'
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT b.item, t.item FROM _base b LEFT JOIN {t} t ON t.pk = b.pk AND t.sk = b.sk "
+                f"WHERE b.tbl = ? AND (t.item IS NULL OR t.item <> b.item) "
+                f"UNION ALL "
+                f"SELECT NULL, t.item FROM {t} t WHERE NOT EXISTS "
+                f"(SELECT 1 FROM _base b WHERE b.tbl = ? AND b.pk = t.pk AND b.sk = t.sk)",
+                (name, name),
+            ).fetchall()
+        return [(decode(b) if b else None, decode(t) if t else None) for b, t in rows]
@@ -0,0 +1,322 @@
+"""
+Concurrency stress harness for the mutation paths.
+
+Replays a mixed race-weekend workload (log_miles, update_part,
+replace_part, upload_spreadsheet plus list_parts / reports reads) from
+many threads against the in-memory DynamoDB stand-in, then checks the
+invariants the handlers are supposed to maintain:
+
+  1. miles: every active part's miles_used equals its miles at install
+     plus the sum of the sessions logged on its car since install.
+     Sessions that overlapped the part's creation may count either way.
+  2. retired parts: a part with a history row is no longer active, has
+     exactly one history row, and its miles_at_retirement equals its
+     final miles_used (no session landed after it was retired).
+  3. extra_fields: every key written by a successful update_part is still
+     on the part (concurrent merges must not drop each other's keys).
+
+A small random delay is injected before every DynamoDB request (like a
+network round trip) so the threads interleave inside the handlers, and
+--write-capacity makes parts writes beyond that many per second fail
+with ProvisionedThroughputExceededException to exercise the write
+scheduler. Requests that raise count as errors (API Gateway's 502).
+Parts a log_miles call reports as pending are excluded from its session.
+
+Throughput and p50/p95/p99 latency are reported per endpoint. The exit
+status is 1 when any invariant is violated.
+
+Usage:
+    python backend/tools/stress.py
+    python backend/tools/stress.py --threads 32 --ops 4000 --latency-ms 2
+    python backend/tools/stress.py --threads 4 --write-capacity 500
+"""
+import argparse
+import base64
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+import local
+from fleet import seed_fleet
+from memory_dynamodb import TABLE_ENV
+
+WORKLOAD = [
+    # (endpoint, weight)
+    ("log_miles", 30),
+    ("update_part", 25),
+    ("replace_part", 12),
+    ("upload_spreadsheet", 3),
+    ("list_parts", 18),
+    ("car_reports", 12),
+]
+HOT_PARTS = 20  # per car; writers pick from these so they collide
+
+
+class Recorder:
+    """Thread-safe log of what the workload did, for latency stats and invariant checks."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sessions = []        # (car_id, miles, start, end, part ids left pending)
+        self.installs = {}        # part_id -> (start, end) of the request that created it
+        self.upload_names = {}    # part_name -> (start, end) of the upload that created it
+        self.extra_keys = defaultdict(set)  # part_id -> keys written by successful update_part
+
+    def latency(self, endpoint, ms, ok):
+        with self.lock:
+            self.latencies[endpoint].append(ms)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Worker(threading.Thread):
+    def __init__(self, n, car_ids, hot_parts, recorder, ops, seed):
+        super().__init__(name=f"worker-{n}", daemon=True)
+        self.n = n
+        self.car_ids = car_ids
+        self.hot_parts = hot_parts
+        self.recorder = recorder
+        self.ops = ops
+        self.rng = random.Random(seed)
+        self.seq = 0
+
+    def run(self):
+        endpoints = [e for e, _ in WORKLOAD]
+        weights = [w for _, w in WORKLOAD]
+        for _ in range(self.ops):
+            endpoint = self.rng.choices(endpoints, weights)[0]
+            car_id = self.rng.choice(self.car_ids)
+            getattr(self, endpoint)(car_id)
+
+    def _call(self, endpoint, rel, **kwargs):
+        start = time.monotonic()
+        try:
+            resp = local.invoke(rel, **kwargs)
+        except Exception:
+            resp = {"statusCode": 502}
+        end = time.monotonic()
+        ok = resp["statusCode"] < 400
+        self.recorder.latency(endpoint, (end - start) * 1000, ok)
+        return resp, start, end
+
+    def _hot_part(self, car_id):
+        with self.recorder.lock:
+            return self.rng.choice(self.hot_parts[car_id])
+
+    def log_miles(self, car_id):
+        miles = Decimal(self.rng.randint(1, 300)) / 10
+        resp, start, end = self._call("log_miles", "miles/log_miles.py", method="POST",
+                                      path={"car_id": car_id}, body={"miles": str(miles)})
+        if resp["statusCode"] < 400:
+            pending = frozenset(local.body(resp).get("parts_pending", ()))
+            with self.recorder.lock:
+                self.recorder.sessions.append((car_id, miles, start, end, pending))
+
+    def update_part(self, car_id):
+        part_id = self._hot_part(car_id)
+        self.seq += 1
+        key = f"stress_{self.n}_{self.seq}"
+        resp, _, _ = self._call("update_part", "parts/update_part.py", method="PUT",
+                                path={"car_id": car_id, "part_id": part_id},
+                                body={"extra_fields": {key: "x"}})
+        if resp["statusCode"] < 400:
+            with self.recorder.lock:
+                self.recorder.extra_keys[part_id].add(key)
+
+    def replace_part(self, car_id):
+        part_id = self._hot_part(car_id)
+        resp, start, end = self._call("replace_part", "parts/replace_part.py", method="POST",
+                                      path={"car_id": car_id, "part_id": part_id},
+                                      body={"reason": "failure", "replace_with_same": True})
+        if resp["statusCode"] < 400:
+            new_part = local.body(resp).get("new_part")
+            if new_part:
+                with self.recorder.lock:
+                    self.recorder.installs[new_part["part_id"]] = (start, end)
+                    hot = self.hot_parts[car_id]
+                    if part_id in hot:
+                        hot[hot.index(part_id)] = new_part["part_id"]
+
+    def upload_spreadsheet(self, car_id):
+        self.seq += 1
+        names = [f"Upload {self.n}-{self.seq}-{row}" for row in range(5)]
+        csv = "part_number,part_name,part_group,part_location,miles_used\n" + "".join(
+            f"PN-UP,{name},brakes,front_left,0\n" for name in names
+        )
+        content = base64.b64encode(csv.encode()).decode()
+        resp, start, end = self._call("upload_spreadsheet", "upload/upload_spreadsheet.py",
+                                      method="POST", path={"car_id": car_id},
+                                      body={"filename": "stress.csv", "content": content})
+        if resp["statusCode"] < 400:
+            with self.recorder.lock:
+                for name in names:
+                    self.recorder.upload_names[name] = (start, end)
+
+    def list_parts(self, car_id):
+        self._call("list_parts", "parts/list_parts.py", path={"car_id": car_id},
+                   qs={"fields": "part_name,miles_used"})
+
+    def car_reports(self, car_id):
+        self._call("car_reports", "reports/car_reports.py", path={"car_id": car_id})
+
+
+def check_invariants(initial_miles: dict, recorder: Recorder) -> list:
+    """Return (kind, message) for every violated invariant."""
+    db = local.dynamodb
+    parts = {p["part_id"]: p for p in db.Table(TABLE_ENV["PARTS_TABLE"]).items.values()}
+    history = list(db.Table(TABLE_ENV["PART_HISTORY_TABLE"]).items.values())
+    installs = dict(recorder.installs)
+    for part in parts.values():
+        window = recorder.upload_names.get(part.get("part_name"))
+        if window:
+            installs[part["part_id"]] = window
+
+    sessions_by_car = defaultdict(list)
+    for car_id, miles, start, end, pending in recorder.sessions:
+        sessions_by_car[car_id].append((miles, start, end, pending))
+
+    violations = []
+    history_by_part = defaultdict(list)
+    for h in history:
+        if h["part_id"] in parts:
+            history_by_part[h["part_id"]].append(h)
+
+    for part_id, part in parts.items():
+        if part_id not in initial_miles and part_id not in installs:
+            continue
+        base = initial_miles.get(part_id, Decimal(0))
+        installed_start, installed_end = installs.get(part_id, (float("-inf"), float("-inf")))
+        must = maybe = Decimal(0)
+        for miles, start, end, pending in sessions_by_car[part["car_id"]]:
+            if part_id in pending:
+                continue
+            if start > installed_end:
+                must += miles
+            elif end >= installed_start:
+                maybe += miles
+        gained = Decimal(part["miles_used"]) - base
+
+        rows = history_by_part.get(part_id, [])
+        if part.get("active", True):
+            if rows:
+                violations.append(("active with history", f"part {part_id} is active but has {len(rows)} history row(s)"))
+            if not must <= gained <= must + maybe:
+                violations.append(("lost miles", (
+                    f"part {part_id}: gained {gained} miles, expected {must}"
+                    + (f" (+ up to {maybe} from overlapping sessions)" if maybe else "")
+                )))
+        else:
+            if len(rows) != 1:
+                violations.append(("duplicate history", f"retired part {part_id} has {len(rows)} history rows"))
+            for h in rows:
+                if Decimal(h["miles_at_retirement"]) != Decimal(part["miles_used"]):
+                    violations.append(("miles after retirement", (
+                        f"retired part {part_id}: miles_at_retirement {h['miles_at_retirement']} "
+                        f"but miles_used {part['miles_used']}"
+                    )))
+
+        missing = recorder.extra_keys.get(part_id, set()) - set(part.get("extra_fields", {}))
+        if missing:
+            violations.append(("lost extra_fields", f"part {part_id} lost {len(missing)} extra_fields update(s)"))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent mixed-workload stress test.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=2000, help="total operations across all threads")
+    parser.add_argument("--cars", type=int, default=3)
+    parser.add_argument("--parts", type=int, default=200, help="parts per car")
+    parser.add_argument("--latency-ms", type=float, default=1.0,
+                        help="mean injected delay before each DynamoDB request")
+    parser.add_argument("--write-capacity", type=float, default=0.0,
+                        help="parts writes per second before DynamoDB throttles (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-violations", type=int, default=20, help="how many violations to print")
+    args = parser.parse_args()
+
+    car_ids = seed_fleet(local.dynamodb, TABLE_ENV, cars=args.cars, parts_per_car=args.parts,
+                         history_rows=args.cars * 50, sessions_per_car=10, seed=args.seed)
+    parts_table = local.dynamodb.Table(TABLE_ENV["PARTS_TABLE"])
+    initial_miles = {p["part_id"]: p["miles_used"] for p in parts_table.items.values()}
+    hot_parts = defaultdict(list)
+    for p in parts_table.items.values():
+        if len(hot_parts[p["car_id"]]) < HOT_PARTS:
+            hot_parts[p["car_id"]].append(p["part_id"])
+
+    rng = random.Random(args.seed)
+    mean = args.latency_ms / 1000
+
+    parts_name = TABLE_ENV["PARTS_TABLE"]
+    capacity = {"tokens": args.write_capacity, "at": time.monotonic()}
+    capacity_lock = threading.Lock()
+
+    def over_capacity():
+        with capacity_lock:
+            now = time.monotonic()
+            capacity["tokens"] = min(args.write_capacity,
+                                     capacity["tokens"] + (now - capacity["at"]) * args.write_capacity)
+            capacity["at"] = now
+            if capacity["tokens"] < 1:
+                return True
+            capacity["tokens"] -= 1
+            return False
+
+    def network_delay(op, table):
+        time.sleep(rng.expovariate(1 / mean) if mean else 0)
+        if (args.write_capacity and table == parts_name and op in ("PutItem", "UpdateItem")
+                and over_capacity()):
+            raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException",
+                                         "Message": "Rate of requests exceeds capacity"}}, op)
+
+    local.dynamodb.fault = network_delay
+    sys.setswitchinterval(0.0005)
+
+    recorder = Recorder()
+    per_thread = max(1, args.ops // args.threads)
+    workers = [Worker(n, car_ids, hot_parts, recorder, per_thread, args.seed + n)
+               for n in range(args.threads)]
+    start = time.monotonic()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.monotonic() - start
+    local.dynamodb.fault = None
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    print(f"{total} requests from {args.threads} threads in {elapsed:.1f}s "
+          f"({total / elapsed:.0f} req/s, {args.latency_ms} ms injected per DynamoDB call)\n")
+    print(f"{'endpoint':<22}{'count':>8}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, _ in WORKLOAD:
+        lat = recorder.latencies.get(endpoint)
+        if not lat:
+            continue
+        print(f"{endpoint:<22}{len(lat):>8}{recorder.errors[endpoint]:>8}{len(lat) / elapsed:>8.0f}"
+              f"{percentile(lat, 50):>9.1f}{percentile(lat, 95):>9.1f}{percentile(lat, 99):>9.1f}")
+
+    violations = check_invariants(initial_miles, recorder)
+    print(f"\nInvariant violations: {len(violations)}")
+    for kind, count in sorted(Counter(kind for kind, _ in violations).items()):
+        print(f"  {kind:<24}{count:>6}")
+    for _, message in violations[:args.max_violations]:
+        print("  " + message)
+    if len(violations) > args.max_violations:
+        print(f"  ... {len(violations) - args.max_violations} more")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
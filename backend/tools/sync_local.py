@@ -0,0 +1,238 @@
+"""
+Take a deployment's data offline into a SQLite file and merge what was
+changed there back into DynamoDB.
+
+  1. With connectivity, copy the tables down:
+         python backend/tools/sync_local.py pull --env prod --db trackside.db
+  2. At the track, run the handlers against the file (LOCAL_DB=trackside.db
+     with local.py; see sqlite_dynamodb.py).
+  3. Back online, see what changed and merge it:
+         python backend/tools/sync_local.py status --db trackside.db
+         python backend/tools/sync_local.py push --env prod --db trackside.db
+
+push is a three-way merge of each changed item against the copy pulled
+(the base) and what DynamoDB holds now, attribute by attribute:
+  - an attribute changed on one side only takes that side's value;
+  - a number changed on both sides takes both changes (remote + local - base),
+    so miles logged in the cloud and at the track add up;
+  - anything else changed on both sides takes the local value, and an
+    item deleted on one side but changed on the other is kept;
+the last two are listed as conflicts. Writes are conditioned on the item
+being as read and re-merged if it moved meanwhile. Every car that
+received changes gets a new data_version with changes_floor raised to it,
+so cached reports are recomputed and open dashboards reload instead of
+replaying a change log that never saw the offline edits.
+
+The report cache, change log and push connections are not synced; the
+tools read and write the per-entity tables, so a deployment on the
+single-table layout needs DataLayout=dual while syncing. Talks to AWS
+with the usual credentials and region.
+"""
+import argparse
+import os
+import sys
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdas", "shared"))
+
+import boto3  # noqa: E402
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+
+from memory_dynamodb import TABLE_ENV  # noqa: E402
+from sqlite_dynamodb import SQLiteDynamoDB  # noqa: E402
+from versions import bump_car_version  # noqa: E402
+
+# Table environment variable -> table name prefix, for the tables synced
+SYNCED = {
+    "USERS_TABLE": "calsol-users",
+    "CARS_TABLE": "calsol-cars",
+    "PARTS_TABLE": "calsol-parts",
+    "PART_HISTORY_TABLE": "calsol-part-history",
+    "MILES_LOG_TABLE": "calsol-miles-log",
+    "PART_FIELDS_TABLE": "calsol-part-fields",
+    "COUNTERS_TABLE": "calsol-counters",
+    "SEARCH_INDEX_TABLE": "calsol-search-index",
+    "FIELD_INDEX_TABLE": "calsol-field-index",
+    "FAILURE_STATS_TABLE": "calsol-failure-stats",
+    "ALERTS_TABLE": "calsol-alerts",
+    "BOM_TEMPLATES_TABLE": "calsol-bom-templates",
+    "BOM_TEMPLATE_PARTS_TABLE": "calsol-bom-template-parts",
+}
+MAX_ATTEMPTS = 5
+# Users local.token() signs tokens for; they only exist offline
+LOCAL_USER_PREFIX = "local-"
+
+_MISSING = object()
+
+
+def scan_all(table, **kwargs):
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def merge(base: dict | None, local: dict | None, remote: dict | None) -> tuple:
+    """(merged item or None for deleted, attributes in conflict) - see the module docstring."""
+    if remote == base or local == remote:
+        return local, []
+    if local == base:
+        return remote, []
+    if local is None or remote is None:
+        return local if local is not None else remote, ["(deleted)"]
+    base = base or {}
+    merged, conflicts = {}, []
+    for attr in dict.fromkeys([*remote, *local]):
+        b, l, r = (side.get(attr, _MISSING) for side in (base, local, remote))
+        if l == b:
+            value = r
+        elif r == b or l == r:
+            value = l
+        elif isinstance(l, Decimal) and isinstance(r, Decimal) and (b is _MISSING or isinstance(b, Decimal)):
+            value = r + l - (0 if b is _MISSING else b)
+        else:
+            value = l
+            conflicts.append(attr)
+        if value is not _MISSING:
+            merged[attr] = value
+    return merged, conflicts
+
+
+def _as_read(remote: dict | None, key: dict):
+    """A condition that the remote item is still what was read."""
+    first = next(iter(key))
+    if remote is None:
+        return Attr(first).not_exists()
+    condition = Attr(first).exists()
+    for attr, value in remote.items():
+        condition &= Attr(attr).eq(value)
+    return condition
+
+
+def push_item(remote_table, key: dict, base, local) -> tuple:
+    """Merge one changed item into DynamoDB; returns (merged item, conflicts)."""
+    for _ in range(MAX_ATTEMPTS):
+        remote = remote_table.get_item(Key=key, ConsistentRead=True).get("Item")
+        merged, conflicts = merge(base, local, remote)
+        if merged == remote:
+            return merged, conflicts
+        try:
+            if merged is None:
+                remote_table.delete_item(Key=key, ConditionExpression=_as_read(remote, key))
+            else:
+                remote_table.put_item(Item=merged, ConditionExpression=_as_read(remote, key))
+            return merged, conflicts
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+    raise RuntimeError(f"{key} kept changing; gave up after {MAX_ATTEMPTS} attempts")
+
+
+def changes(local: SQLiteDynamoDB, env_name: str) -> list:
+    """local.pending() for a synced table, less the users local.token() made."""
+    pending = local.pending(TABLE_ENV[env_name])
+    if env_name == "USERS_TABLE":
+        pending = [(b, i) for b, i in pending if not (i or b)["user_id"].startswith(LOCAL_USER_PREFIX)]
+    return pending
+
+
+def pull(local: SQLiteDynamoDB, dynamodb, env: str):
+    for env_name, prefix in SYNCED.items():
+        count = local.load(TABLE_ENV[env_name], scan_all(dynamodb.Table(f"{prefix}-{env}")))
+        print(f"{prefix}-{env}: {count} items")
+
+
+def push(local: SQLiteDynamoDB, dynamodb, env: str, dry_run: bool = False):
+    cars = set()
+    for env_name, prefix in SYNCED.items():
+        name = TABLE_ENV[env_name]
+        table = local.Table(name)
+        remote_table = dynamodb.Table(f"{prefix}-{env}")
+        pending = changes(local, env_name)
+        for base, item in pending:
+            key = {k: (item or base)[k] for k in (table.hash_key, table.range_key) if k}
+            if dry_run:
+                remote = remote_table.get_item(Key=key, ConsistentRead=True).get("Item")
+                merged, conflicts = merge(base, item, remote)
+            else:
+                merged, conflicts = push_item(remote_table, key, base, item)
+                if merged is None:
+                    table.delete_item(Key=key)
+                else:
+                    table.put_item(Item=merged)
+                local.synced(name, merged, key)
+            if conflicts:
+                print(f"  {name} {key}: conflict on {', '.join(conflicts)}")
+            car_id = (merged or base or item).get("car_id")
+            if car_id and env_name != "USERS_TABLE":
+                cars.add(car_id)
+        if pending:
+            print(f"{prefix}-{env}: {len(pending)} changed items{' (dry run)' if dry_run else ''}")
+
+    if dry_run:
+        return
+    cars_table = dynamodb.Table(f"calsol-cars-{env}")
+    local_cars = local.Table(TABLE_ENV["CARS_TABLE"])
+    for car_id in sorted(cars):
+        version = bump_car_version(cars_table, car_id)
+        if version is None:
+            continue
+        try:
+            cars_table.update_item(
+                Key={"car_id": car_id},
+                UpdateExpression="SET changes_floor = :f",
+                ConditionExpression="attribute_not_exists(changes_floor) OR changes_floor < :f",
+                ExpressionAttributeValues={":f": version},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        car = cars_table.get_item(Key={"car_id": car_id}, ConsistentRead=True)["Item"]
+        local_cars.put_item(Item=car)
+        local.synced(TABLE_ENV["CARS_TABLE"], car)
+        print(f"car {car_id}: data_version {version}, clients reload")
+
+
+def status(local: SQLiteDynamoDB) -> int:
+    total = 0
+    for env_name in SYNCED:
+        pending = changes(local, env_name)
+        added = sum(base is None for base, _ in pending)
+        deleted = sum(item is None for _, item in pending)
+        if pending:
+            print(f"{TABLE_ENV[env_name]}: {added} added, {len(pending) - added - deleted} changed, {deleted} deleted")
+        total += len(pending)
+    if not total:
+        print("Nothing to push.")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync a SQLite copy of a deployment's data with DynamoDB.")
+    parser.add_argument("command", choices=["pull", "status", "push"])
+    parser.add_argument("--db", required=True, help="SQLite file (LOCAL_DB)")
+    parser.add_argument("--env", choices=["dev", "prod"], help="deployment to pull from / push to")
+    parser.add_argument("--force", action="store_true", help="pull: discard changes not pushed yet")
+    parser.add_argument("--dry-run", action="store_true", help="push: show the merge without writing")
+    args = parser.parse_args()
+    if args.command != "status" and not args.env:
+        parser.error(f"{args.command} needs --env")
+
+    local = SQLiteDynamoDB(args.db)
+    if args.command == "status":
+        status(local)
+        return
+    dynamodb = boto3.resource("dynamodb")
+    if args.command == "pull":
+        if not args.force and any(changes(local, e) for e in SYNCED):
+            raise SystemExit("The file has changes that were not pushed; push them or pass --force.")
+        pull(local, dynamodb, args.env)
+    else:
+        push(local, dynamodb, args.env, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
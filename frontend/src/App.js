@@ -11,6 +11,7 @@ import ReportsPage from './pages/ReportsPage';
 import UploadPage from './pages/UploadPage';
 import AdminPage from './pages/AdminPage';
 import CarsPage from './pages/CarsPage';
+import SearchPage from './pages/SearchPage';
 
 function RequireAuth({ children }) {
   const { user } = useAuth();
@@ -39,6 +40,7 @@ export default function App() {
       >
         <Route index element={<DashboardPage />} />
         <Route path="cars" element={<CarsPage />} />
+        <Route path="search" element={<SearchPage />} />
         <Route path="cars/:carId/parts" element={<PartsPage />} />
         <Route path="cars/:carId/parts/:partId" element={<PartDetailPage />} />
         <Route path="cars/:carId/miles" element={<MilesPage />} />
@@ -53,6 +53,11 @@ export const updateCar = (carId, data) =>
 export const deleteCar = (carId) =>
   client.delete(`/cars/${carId}`).then((r) => r.data);
 
+// Changes to the car's parts, history and miles log after params.since
+// (omit since to get the current cursor). See hooks/useCarSync.js.
+export const getCarChanges = (carId, params = {}) =>
+  client.get(`/cars/${carId}/changes`, { params }).then((r) => r.data);
+
 // ─── Parts ────────────────────────────────────────────────────────────────────
 export const listParts = (carId, params = {}) =>
   client.get(`/cars/${carId}/parts`, { params }).then((r) => r.data);
@@ -82,14 +87,46 @@ export const listPartFields = () =>
 export const createPartField = (data) =>
   client.post('/part-fields', data).then((r) => r.data);
 
+// ─── BOM Templates ────────────────────────────────────────────────────────────
+export const listTemplates = () =>
+  client.get('/templates').then((r) => r.data);
+
+// data: { car_id, name, description? }
+export const saveTemplate = (data) =>
+  client.post('/templates', data).then((r) => r.data);
+
+export const deleteTemplate = (templateId) =>
+  client.delete(`/templates/${templateId}`).then((r) => r.data);
+
+// data: { template_id, line_ids? }
+export const applyTemplate = (carId, data) =>
+  client.post(`/cars/${carId}/apply-template`, data).then((r) => r.data);
+
+// data: { source_car_id, part_ids? }
+export const cloneCar = (carId, data) =>
+  client.post(`/cars/${carId}/clone`, data).then((r) => r.data);
+
 // ─── Miles ────────────────────────────────────────────────────────────────────
+// data: { miles, note?, test_date? }, or { log_id, part_ids? } to finish a session
 export const logMiles = (carId, data) =>
   client.post(`/cars/${carId}/miles`, data).then((r) => r.data);
 
 export const getMilesLog = (carId, params = {}) =>
   client.get(`/cars/${carId}/miles`, { params }).then((r) => r.data);
 
+// data: { miles, note? }
+export const updateMilesEntry = (carId, logId, data) =>
+  client.put(`/cars/${carId}/miles/${logId}`, data).then((r) => r.data);
+
+export const deleteMilesEntry = (carId, logId) =>
+  client.delete(`/cars/${carId}/miles/${logId}`).then((r) => r.data);
+
 // ─── Reports ──────────────────────────────────────────────────────────────────
+// Fetches several reports from one read of the car's parts + history.
+// include: comma-separated subset of 'high_miles,mbf,likely_to_fail' (default all)
+export const getReports = (carId, params = {}) =>
+  client.get(`/cars/${carId}/reports`, { params }).then((r) => r.data);
+
 export const reportHighMiles = (carId, params = {}) =>
   client.get(`/cars/${carId}/reports/high-miles`, { params }).then((r) => r.data);
 
@@ -99,6 +136,11 @@ export const reportMBF = (carId) =>
 export const reportLikelyToFail = (carId) =>
   client.get(`/cars/${carId}/reports/likely-to-fail`).then((r) => r.data);
 
+// ─── Search ───────────────────────────────────────────────────────────────────
+// params: q (required), car_id, active ('true' / 'false'), limit, offset, fields
+export const searchParts = (params) =>
+  client.get('/search', { params }).then((r) => r.data);
+
 // ─── Upload ───────────────────────────────────────────────────────────────────
 export const uploadSpreadsheet = (carId, filename, base64Content) =>
   client
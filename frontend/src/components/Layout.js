@@ -1,6 +1,7 @@
 import { Outlet, NavLink, useNavigate, useParams } from 'react-router-dom';
 import { useState, useEffect } from 'react';
 import { useAuth } from '../hooks/useAuth';
+import { useCarPush } from '../hooks/useCarSync';
 import { listCars } from '../api/client';
 import { useQuery } from '@tanstack/react-query';
 
@@ -38,6 +39,7 @@ export default function Layout() {
   };
 
   const carId = selectedCarId;
+  useCarPush(carId);
 
   return (
     <div className="layout">
@@ -49,6 +51,7 @@ export default function Layout() {
         <nav className="sidebar-nav">
           <NavLink to="/" end>🏠 Dashboard</NavLink>
           <NavLink to="/cars">🚗 Cars</NavLink>
+          <NavLink to="/search">🔍 Search</NavLink>
 
           {carId && (
             <>
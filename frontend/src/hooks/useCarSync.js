@@ -0,0 +1,203 @@
+import { useCallback, useEffect } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { getCarChanges } from '../api/client';
+
+const PUSH_URL = process.env.REACT_APP_PUSH_URL;
+const MAX_RECONNECT_MS = 30_000;
+
+// carId -> cursor of the cached parts / history / miles queries.
+// Shared by every page so a change is only fetched once.
+const cursors = new Map();
+// carId -> the sync in progress; syncs run one at a time so no change is applied twice
+const running = new Map();
+
+const byName = (a, b) => (a.part_name || '').toLowerCase().localeCompare((b.part_name || '').toLowerCase());
+
+function upsertPart(data, key, part) {
+  const [, , group, location] = key;
+  const parts = data.parts.filter((p) => p.part_id !== part.part_id);
+  const keep = part.active !== false &&
+    (!group || part.part_group === group) &&
+    (!location || part.part_location === location);
+  if (keep) {
+    parts.push(part);
+    parts.sort(byName);
+  }
+  return { ...data, parts, count: parts.length };
+}
+
+function removePart(data, partId) {
+  const parts = data.parts.filter((p) => p.part_id !== partId);
+  return { ...data, parts, count: parts.length };
+}
+
+function addMiles(data, miles, except) {
+  const skip = new Set(except || []);
+  const parts = data.parts.map((p) => (skip.has(p.part_id) ? p : {
+    ...p, miles_used: parseFloat(p.miles_used || 0) + parseFloat(miles),
+  }));
+  return { ...data, parts };
+}
+
+function applyChanges(qc, carId, changes) {
+  const patch = (prefix, fn) => {
+    qc.getQueriesData({ queryKey: [prefix, carId] }).forEach(([key, data]) => {
+      if (data) qc.setQueryData(key, fn(data, key));
+    });
+  };
+
+  changes.forEach((c) => {
+    if (c.entity === 'part' && c.op === 'upsert') {
+      patch('parts', (d, key) => upsertPart(d, key, c.item));
+      qc.setQueryData(['part', carId, c.id], (d) => (d ? { ...d, part: c.item } : d));
+    } else if (c.entity === 'part' && c.op === 'delete') {
+      patch('parts', (d) => removePart(d, c.id));
+      qc.removeQueries({ queryKey: ['part', carId, c.id] });
+    } else if (c.entity === 'part' && c.op === 'add_miles') {
+      patch('parts', (d) => addMiles(d, c.miles, c.except));
+      qc.invalidateQueries({ queryKey: ['part', carId] });
+    } else if (c.entity === 'history' && c.op === 'upsert') {
+      patch('history', (d, [, , reason]) => {
+        if (reason && c.item.reason !== reason) return d;
+        const existing = d.history.find((h) => h.history_id === c.id);
+        return existing ? {
+          ...d,
+          history: d.history.map((h) => (h.history_id === c.id ? c.item : h)),
+        } : {
+          ...d,
+          history: [c.item, ...d.history],
+          count: (d.count || 0) + 1,
+        };
+      });
+    } else if (c.entity === 'miles' && c.op === 'upsert') {
+      const entry = { ...c.item, miles: parseFloat(c.item.miles) };
+      ['miles', 'miles-log'].forEach((prefix) => patch(prefix, (d) => (
+        d.log.some((l) => l.log_id === c.id) ? {
+          ...d,
+          log: d.log.map((l) => (l.log_id === c.id ? entry : l)),
+        } : {
+          ...d,
+          log: [entry, ...d.log],
+          count: (d.count || 0) + 1,
+        })));
+    } else if (c.entity === 'miles' && c.op === 'delete') {
+      ['miles', 'miles-log'].forEach((prefix) => patch(prefix, (d) => (
+        d.log.some((l) => l.log_id === c.id) ? {
+          ...d,
+          log: d.log.filter((l) => l.log_id !== c.id),
+          count: Math.max(0, (d.count || 0) - 1),
+        } : d)));
+    }
+  });
+}
+
+function refetchAll(qc, carId) {
+  ['parts', 'part', 'history', 'miles', 'miles-log'].forEach((prefix) =>
+    qc.invalidateQueries({ queryKey: [prefix, carId] })
+  );
+}
+
+/**
+ * Keeps the car's cached parts, history and miles queries up to date from
+ * GET /cars/{carId}/changes instead of refetching them after every edit.
+ * Call the returned sync() after a mutation (or to poll).
+ */
+export function useCarSync(carId) {
+  const qc = useQueryClient();
+
+  useEffect(() => {
+    if (carId && !cursors.has(carId)) {
+      getCarChanges(carId).then((r) => {
+        if (!cursors.has(carId)) cursors.set(carId, r.cursor);
+      }).catch(() => {});
+    }
+  }, [carId]);
+
+  const syncOnce = useCallback(async () => {
+    // Reports are computed server-side from the whole car
+    qc.invalidateQueries({ queryKey: ['reports', carId] });
+    qc.invalidateQueries({ queryKey: ['likely-fail', carId] });
+
+    try {
+      if (!cursors.has(carId)) {
+        const r = await getCarChanges(carId);
+        cursors.set(carId, r.cursor);
+        refetchAll(qc, carId);
+        return;
+      }
+      let more = true;
+      while (more) {
+        const r = await getCarChanges(carId, { since: cursors.get(carId) });
+        cursors.set(carId, r.cursor);
+        if (r.reset) {
+          refetchAll(qc, carId);
+          return;
+        }
+        applyChanges(qc, carId, r.changes);
+        more = r.has_more;
+      }
+    } catch {
+      cursors.delete(carId);
+      refetchAll(qc, carId);
+    }
+  }, [carId, qc]);
+
+  return useCallback(() => {
+    if (!carId) return Promise.resolve();
+    const next = (running.get(carId) || Promise.resolve()).then(syncOnce);
+    running.set(carId, next);
+    return next;
+  }, [carId, syncOnce]);
+}
+
+/**
+ * Listens on the push WebSocket (REACT_APP_PUSH_URL) for the car's change
+ * events and syncs when one arrives, so open pages update without
+ * polling. Reconnects with backoff; a no-op when push is not configured.
+ */
+export function useCarPush(carId) {
+  const sync = useCarSync(carId);
+
+  useEffect(() => {
+    if (!PUSH_URL || !carId) return undefined;
+    let socket;
+    let timer;
+    let delay = 1000;
+    let stopped = false;
+
+    const open = () => {
+      const token = localStorage.getItem('calsol_token') || '';
+      socket = new WebSocket(
+        `${PUSH_URL}?token=${encodeURIComponent(token)}&car_id=${encodeURIComponent(carId)}`
+      );
+      socket.onopen = () => {
+        delay = 1000;
+        // Catch up on anything that changed while disconnected
+        if (cursors.has(carId)) sync();
+      };
+      socket.onmessage = (e) => {
+        let msg;
+        try {
+          msg = JSON.parse(e.data);
+        } catch {
+          return;
+        }
+        if (msg.type === 'changes' && msg.car_id === carId && msg.cursor > (cursors.get(carId) ?? -1)) {
+          sync();
+        }
+      };
+      socket.onclose = () => {
+        if (stopped) return;
+        timer = setTimeout(open, delay);
+        delay = Math.min(delay * 2, MAX_RECONNECT_MS);
+      };
+    };
+
+    open();
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+      if (socket) socket.close();
+    };
+  }, [carId, sync]);
+}
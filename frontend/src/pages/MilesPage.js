@@ -1,14 +1,15 @@
 import { useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useMutation } from '@tanstack/react-query';
 import { logMiles, getMilesLog } from '../api/client';
 import { useAuth } from '../hooks/useAuth';
+import { useCarSync } from '../hooks/useCarSync';
 import toast from 'react-hot-toast';
 
 export default function MilesPage() {
   const { carId } = useParams();
   const { canWrite } = useAuth();
-  const qc = useQueryClient();
+  const sync = useCarSync(carId);
   const [miles, setMiles] = useState('');
   const [note, setNote] = useState('');
   const [testDate, setTestDate] = useState(new Date().toISOString().slice(0, 10));
@@ -38,8 +39,7 @@ export default function MilesPage() {
       toast.success(result.message);
       setMiles('');
       setNote('');
-      qc.invalidateQueries(['miles-log', carId]);
-      qc.invalidateQueries(['parts', carId]);
+      sync();
     } catch (err) {
       toast.error(err?.response?.data?.error || 'Failed to log miles');
     } finally {
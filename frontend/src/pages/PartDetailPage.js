@@ -1,8 +1,9 @@
 import { useState } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useMutation } from '@tanstack/react-query';
 import { getPart, updatePart, listPartFields } from '../api/client';
 import { useAuth } from '../hooks/useAuth';
+import { useCarSync } from '../hooks/useCarSync';
 import toast from 'react-hot-toast';
 
 const GROUPS = ['suspension', 'drivetrain', 'engine', 'body', 'electrical', 'brakes', 'other'];
@@ -14,7 +15,7 @@ const LOCATIONS = [
 export default function PartDetailPage() {
   const { carId, partId } = useParams();
   const { canWrite } = useAuth();
-  const qc = useQueryClient();
+  const sync = useCarSync(carId);
   const navigate = useNavigate();
   const [editing, setEditing] = useState(false);
   const [form, setForm] = useState(null);
@@ -51,8 +52,7 @@ export default function PartDetailPage() {
     setSaving(true);
     try {
       await updatePart(carId, partId, { ...form, extra_fields: extraFields });
-      qc.invalidateQueries(['part', carId, partId]);
-      qc.invalidateQueries(['parts', carId]);
+      await sync();
       toast.success('Part updated!');
       setEditing(false);
     } catch (err) {
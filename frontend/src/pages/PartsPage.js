@@ -1,10 +1,11 @@
 import { useState } from 'react';
 import { useParams, Link, useSearchParams } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useMutation } from '@tanstack/react-query';
 import {
   listParts, createPart, deletePart, listPartFields, replacePart
 } from '../api/client';
 import { useAuth } from '../hooks/useAuth';
+import { useCarSync } from '../hooks/useCarSync';
 import toast from 'react-hot-toast';
 
 const GROUPS = ['suspension', 'drivetrain', 'engine', 'body', 'electrical', 'brakes', 'other'];
@@ -17,7 +18,7 @@ const REPLACE_REASONS = ['failure', 'upgrade', 'routine_maintenance', 'other'];
 export default function PartsPage() {
   const { carId } = useParams();
   const { canWrite, isAdmin } = useAuth();
-  const qc = useQueryClient();
+  const sync = useCarSync(carId);
   const [searchParams] = useSearchParams();
   const [groupFilter, setGroupFilter] = useState(searchParams.get('group') || '');
   const [locationFilter, setLocationFilter] = useState('');
@@ -48,7 +49,7 @@ export default function PartsPage() {
   const deleteMutation = useMutation({
     mutationFn: (partId) => deletePart(carId, partId),
     onSuccess: () => {
-      qc.invalidateQueries(['parts', carId]);
+      sync();
       toast.success('Part deleted');
     },
     onError: (e) => toast.error(e?.response?.data?.error || 'Delete failed'),
@@ -174,7 +175,7 @@ export default function PartsPage() {
           fields={fieldsData?.fields || []}
           onClose={() => setShowAddModal(false)}
           onSaved={() => {
-            qc.invalidateQueries(['parts', carId]);
+            sync();
             setShowAddModal(false);
           }}
         />
@@ -186,7 +187,7 @@ export default function PartsPage() {
           part={replaceTarget}
           onClose={() => setReplaceTarget(null)}
           onSaved={() => {
-            qc.invalidateQueries(['parts', carId]);
+            sync();
             setReplaceTarget(null);
           }}
         />
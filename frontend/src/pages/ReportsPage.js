@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { useQuery } from '@tanstack/react-query';
-import { reportHighMiles, reportMBF, reportLikelyToFail } from '../api/client';
+import { getReports } from '../api/client';
 import {
   BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, Cell,
 } from 'recharts';
@@ -13,6 +13,16 @@ const TAB_LABELS = {
   'mbf': '🔁 Miles Between Failures',
 };
 
+// All three tabs share one request; switching tabs reads from the query cache.
+function useReport(carId, name) {
+  return useQuery({
+    queryKey: ['reports', carId],
+    queryFn: () => getReports(carId, { limit: 30 }),
+    enabled: !!carId,
+    select: (data) => data.reports[name],
+  });
+}
+
 const RISK_COLORS = {
   CRITICAL: '#e53e3e',
   HIGH: '#dd6b20',
@@ -63,11 +73,7 @@ export default function ReportsPage() {
 
 // ─── Likely to Fail ────────────────────────────────────────────────────────────
 function LikelyToFailReport({ carId }) {
-  const { data, isLoading } = useQuery({
-    queryKey: ['report-likely-fail', carId],
-    queryFn: () => reportLikelyToFail(carId),
-    enabled: !!carId,
-  });
+  const { data, isLoading } = useReport(carId, 'likely_to_fail');
 
   const parts = data?.parts || [];
 
@@ -161,11 +167,7 @@ function LikelyToFailReport({ carId }) {
 
 // ─── High Miles ────────────────────────────────────────────────────────────────
 function HighMilesReport({ carId }) {
-  const { data, isLoading } = useQuery({
-    queryKey: ['report-high-miles', carId],
-    queryFn: () => reportHighMiles(carId, { limit: 30 }),
-    enabled: !!carId,
-  });
+  const { data, isLoading } = useReport(carId, 'high_miles');
 
   const parts = data?.parts || [];
 
@@ -227,11 +229,7 @@ function HighMilesReport({ carId }) {
 
 // ─── Miles Between Failures ────────────────────────────────────────────────────
 function MBFReport({ carId }) {
-  const { data, isLoading } = useQuery({
-    queryKey: ['report-mbf', carId],
-    queryFn: () => reportMBF(carId),
-    enabled: !!carId,
-  });
+  const { data, isLoading } = useReport(carId, 'mbf');
 
   const mbfData = data?.data || [];
 
@@ -0,0 +1,160 @@
+import { useEffect, useState } from 'react';
+import { Link } from 'react-router-dom';
+import { useQuery, keepPreviousData } from '@tanstack/react-query';
+import { listCars, searchParts } from '../api/client';
+
+const PAGE_SIZE = 25;
+
+export default function SearchPage() {
+  const [text, setText] = useState('');
+  const [query, setQuery] = useState('');
+  const [carFilter, setCarFilter] = useState('');
+  const [activeFilter, setActiveFilter] = useState('true');
+  const [offset, setOffset] = useState(0);
+
+  // Search once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => { setQuery(text.trim()); setOffset(0); }, 250);
+    return () => clearTimeout(timer);
+  }, [text]);
+
+  const { data: carsData } = useQuery({ queryKey: ['cars'], queryFn: listCars });
+  const carNames = Object.fromEntries((carsData?.cars || []).map((c) => [c.car_id, c.name]));
+
+  const { data, isLoading, isError, error } = useQuery({
+    queryKey: ['search', query, carFilter, activeFilter, offset],
+    queryFn: () => searchParts({
+      q: query,
+      ...(carFilter && { car_id: carFilter }),
+      ...(activeFilter && { active: activeFilter }),
+      limit: PAGE_SIZE,
+      offset,
+    }),
+    enabled: !!query,
+    placeholderData: keepPreviousData,
+  });
+
+  const results = data?.results || [];
+
+  return (
+    <div>
+      <div className="page-header">
+        <h2>🔍 Search Parts</h2>
+      </div>
+
+      <div className="filter-bar">
+        <input
+          className="form-control"
+          style={{ maxWidth: 320 }}
+          placeholder="Name, part #, supplier, custom fields…"
+          value={text}
+          onChange={(e) => setText(e.target.value)}
+          autoFocus
+        />
+        <select
+          className="form-control"
+          style={{ maxWidth: 200 }}
+          value={carFilter}
+          onChange={(e) => { setCarFilter(e.target.value); setOffset(0); }}
+        >
+          <option value="">All Cars</option>
+          {(carsData?.cars || []).map((c) => (
+            <option key={c.car_id} value={c.car_id}>{c.name}</option>
+          ))}
+        </select>
+        <select
+          className="form-control"
+          style={{ maxWidth: 160 }}
+          value={activeFilter}
+          onChange={(e) => { setActiveFilter(e.target.value); setOffset(0); }}
+        >
+          <option value="true">Active</option>
+          <option value="false">Retired</option>
+          <option value="">Active + Retired</option>
+        </select>
+        {data && (
+          <span style={{ color: 'var(--text-muted)', fontSize: '0.8rem' }}>
+            {data.total} match{data.total !== 1 ? 'es' : ''}
+          </span>
+        )}
+      </div>
+
+      {!query ? (
+        <div className="empty-state">
+          <h3>Search the whole fleet</h3>
+          <p>e.g. "m8 wheel bearing" or a supplier name. The last word matches as a prefix.</p>
+        </div>
+      ) : isError ? (
+        <div className="empty-state">
+          <h3>Search failed</h3>
+          <p>{error.response?.data?.error || error.message}</p>
+        </div>
+      ) : isLoading ? (
+        <div className="loading">Searching…</div>
+      ) : results.length === 0 ? (
+        <div className="empty-state">
+          <h3>No parts match "{query}"</h3>
+        </div>
+      ) : (
+        <div className="card" style={{ padding: 0 }}>
+          <div className="table-wrapper">
+            <table>
+              <thead>
+                <tr>
+                  <th>Car</th>
+                  <th>Part #</th>
+                  <th>Part Name</th>
+                  <th>Group</th>
+                  <th>Supplier</th>
+                  <th>Miles</th>
+                  <th>Status</th>
+                </tr>
+              </thead>
+              <tbody>
+                {results.map((p) => (
+                  <tr key={p.part_id}>
+                    <td>{carNames[p.car_id] || p.car_id}</td>
+                    <td style={{ fontFamily: 'monospace', fontSize: '0.8rem' }}>{p.part_number}</td>
+                    <td>
+                      <Link to={`/cars/${p.car_id}/parts/${p.part_id}`}>{p.part_name}</Link>
+                    </td>
+                    <td><span className="badge badge-unknown">{p.part_group}</span></td>
+                    <td>{p.purchased_from || '—'}</td>
+                    <td>{parseFloat(p.miles_used || 0).toFixed(1)}</td>
+                    <td>
+                      <span className={`badge ${p.active === false ? 'badge-unknown' : 'badge-low'}`}>
+                        {p.active === false ? 'retired' : 'active'}
+                      </span>
+                    </td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </div>
+        </div>
+      )}
+
+      {data && data.total > PAGE_SIZE && (
+        <div className="filter-bar" style={{ marginTop: 12 }}>
+          <button
+            className="btn btn-outline btn-sm"
+            disabled={offset === 0}
+            onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
+          >
+            ← Previous
+          </button>
+          <span style={{ color: 'var(--text-muted)', fontSize: '0.8rem' }}>
+            {offset + 1}–{offset + results.length} of {data.total}
+          </span>
+          <button
+            className="btn btn-outline btn-sm"
+            disabled={data.next_offset == null}
+            onClick={() => setOffset(data.next_offset)}
+          >
+            Next →
+          </button>
+        </div>
+      )}
+    </div>
+  );
+}
@@ -1,15 +1,15 @@
 import { useState, useCallback } from 'react';
 import { useParams } from 'react-router-dom';
 import { useDropzone } from 'react-dropzone';
-import { useQueryClient } from '@tanstack/react-query';
 import { uploadSpreadsheet } from '../api/client';
 import { useAuth } from '../hooks/useAuth';
+import { useCarSync } from '../hooks/useCarSync';
 import toast from 'react-hot-toast';
 
 export default function UploadPage() {
   const { carId } = useParams();
   const { canWrite } = useAuth();
-  const qc = useQueryClient();
+  const sync = useCarSync(carId);
   const [uploading, setUploading] = useState(false);
   const [result, setResult] = useState(null);
 
@@ -24,7 +24,7 @@ export default function UploadPage() {
       const base64 = await fileToBase64(file);
       const data = await uploadSpreadsheet(carId, file.name, base64);
       setResult(data);
-      qc.invalidateQueries(['parts', carId]);
+      sync();
       if (data.imported_count > 0) {
         toast.success(`Imported ${data.imported_count} parts!`);
       } else {
@@ -35,7 +35,7 @@ export default function UploadPage() {
     } finally {
       setUploading(false);
     }
-  }, [carId, qc]);
+  }, [carId, sync]);
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
@@ -147,8 +147,23 @@ export default function UploadPage() {
                   </div>
                   <div className="stat-label">Errors</div>
                 </div>
+                {result.pending_count > 0 && (
+                  <div className="stat-card">
+                    <div className="stat-value" style={{ color: 'var(--warning)' }}>
+                      {result.pending_count}
+                    </div>
+                    <div className="stat-label">Pending</div>
+                  </div>
+                )}
               </div>
 
+              {result.pending?.length > 0 && (
+                <p style={{ marginBottom: 16, color: 'var(--warning)' }}>
+                  The import ran out of time at row {result.pending[0].row}. Re-upload rows{' '}
+                  {result.pending[0].row}–{result.pending[result.pending.length - 1].row} to finish it.
+                </p>
+              )}
+
               {result.errors?.length > 0 && (
                 <>
                   <h4 style={{ marginBottom: 8, color: 'var(--danger)' }}>Errors</h4>
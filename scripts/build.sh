@@ -1,11 +1,11 @@
 #!/usr/bin/env bash
 # ─────────────────────────────────────────────────────────────────────────────
-# build.sh  –  Copy shared utils.py into every Lambda package before SAM build
+# build.sh  –  Copy shared modules into every Lambda package before SAM build
 # Usage: ./scripts/build.sh
 # ─────────────────────────────────────────────────────────────────────────────
 set -euo pipefail
 
-SHARED="backend/lambdas/shared/utils.py"
+SHARED_DIR="backend/lambdas/shared"
 LAMBDA_DIRS=(
   backend/lambdas/auth
   backend/lambdas/cars
@@ -13,18 +13,29 @@ LAMBDA_DIRS=(
   backend/lambdas/miles
   backend/lambdas/reports
   backend/lambdas/upload
+  backend/lambdas/search
+  backend/lambdas/push
+  backend/lambdas/telemetry
+  backend/lambdas/templates
 )
 
-echo "Distributing shared utils.py to all Lambda packages..."
+echo "Distributing shared modules to all Lambda packages..."
 for dir in "${LAMBDA_DIRS[@]}"; do
-  cp "$SHARED" "$dir/utils.py"
-  echo "  → $dir/utils.py"
+  for module in "$SHARED_DIR"/*.py; do
+    cp "$module" "$dir/"
+    echo "  → $dir/$(basename "$module")"
+  done
 done
 
 echo ""
 echo "Installing Python dependencies for upload Lambda (openpyxl)..."
 pip3 install openpyxl -t backend/lambdas/upload/ --quiet
 
+echo ""
+echo "Installing Python dependencies for telemetry Lambda (numpy)..."
+pip3 install numpy -t backend/lambdas/telemetry/ --quiet \
+  --platform manylinux2014_x86_64 --only-binary=:all: --python-version 3.12
+
 echo ""
 echo "Running sam build..."
 sam build